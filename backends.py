@@ -0,0 +1,422 @@
+# Compute backends for the time-step math: the spatial grid behind
+# sensing and eating/mating contacts, the batched MLP (think) and the
+# heading/velocity/position integration. settings['backend'] picks one:
+#
+#   'numpy'  pure NumPy reference
+#   'numba'  Numba-compiled kernels; think and integration fused into a
+#            single pass over the population (falls back to 'numpy' with a
+#            warning when Numba is not installed). Sensing and the
+#            eating/mating contacts stay separate passes over the grid
+#            kernels: they need the whole step's positions first.
+#   'auto'   'numba' when available, else 'numpy'
+#
+#   python backends.py --backend numba --pop 1000 --steps 50
+
+import argparse
+import sys
+import warnings
+
+from math import ceil
+
+import numpy as np
+
+from spatial import UniformGrid
+
+BACKENDS = ('numpy', 'numba', 'auto')
+
+# backend instances by name (see get_backend)
+_backends = {}
+
+
+class NumpyBackend():
+    '''
+    Reference backend: UniformGrid queries and Population array math.
+    '''
+    name = 'numpy'
+    grid = UniformGrid      # spatial grid class used for contacts and sensing
+
+    def think(self, organisms, inputs: np.ndarray = None) -> None:
+        '''
+        MLP response of every organism.
+        :param organisms: Population.
+        :param inputs: (N, inner_nodes) input matrix (None for the target heading).
+        :returns: None
+        '''
+        organisms.think(inputs)
+
+
+    def integrate(self, settings: dict, organisms) -> None:
+        '''
+        Advance heading, velocity, position and age by one time step.
+        :param settings: simulation configurations.
+        :param organisms: Population.
+        :returns: None
+        '''
+        organisms.integrate(settings)
+
+
+    def advance(self, settings: dict, organisms, inputs: np.ndarray = None) -> None:
+        '''
+        think() followed by integrate().
+        :param settings: simulation configurations.
+        :param organisms: Population.
+        :param inputs: (N, inner_nodes) input matrix (None for the target heading).
+        :returns: None
+        '''
+        self.think(organisms, inputs)
+        self.integrate(settings, organisms)
+
+
+def within_kernel(qx, qy, exclude, cx, cy, reach, nx, ny, starts, px, py, index, radius, out_q, out_i, out_d):
+    # pairs within radius, scanning the (2 reach + 1)^2 block of cells
+    # around each query; called with empty outputs to count them first
+    count = 0
+    fill = len(out_q) > 0
+    for q in range(len(qx)):
+        for dy in range(-reach, reach + 1):
+            y = cy[q] + dy
+            if y < 0 or y >= ny:
+                continue
+            for dx in range(-reach, reach + 1):
+                x = cx[q] + dx
+                if x < 0 or x >= nx:
+                    continue
+                key = y * nx + x
+                for p in range(starts[key], starts[key + 1]):
+                    if index[p] == exclude[q]:
+                        continue
+                    dx_p = px[p] - qx[q]
+                    dy_p = py[p] - qy[q]
+                    d = np.sqrt(dx_p * dx_p + dy_p * dy_p)
+                    if d <= radius:
+                        if fill:
+                            out_q[count] = q
+                            out_i[count] = index[p]
+                            out_d[count] = d
+                        count += 1
+    return count
+
+
+def nearest_kernel(qx, qy, exclude, cx, cy, cell_size, nx, ny, starts, px, py, index, best_d, best_i):
+    # rings of cells outwards until no unvisited cell can hold anything closer
+    for q in range(len(qx)):
+        for k in range(max(nx, ny)):
+            for dy in range(-k, k + 1):
+                y = cy[q] + dy
+                if y < 0 or y >= ny:
+                    continue
+                for dx in range(-k, k + 1):
+                    if max(abs(dx), abs(dy)) != k:
+                        continue
+                    x = cx[q] + dx
+                    if x < 0 or x >= nx:
+                        continue
+                    key = y * nx + x
+                    for p in range(starts[key], starts[key + 1]):
+                        if index[p] == exclude[q]:
+                            continue
+                        dx_p = px[p] - qx[q]
+                        dy_p = py[p] - qy[q]
+                        d = np.sqrt(dx_p * dx_p + dy_p * dy_p)
+                        if d < best_d[q] or (d == best_d[q] and index[p] < best_i[q]):
+                            best_d[q] = d
+                            best_i[q] = index[p]
+            if best_d[q] < k * cell_size * (1 - 1e-9):
+                break
+
+
+def think_kernel(n, wih, who, inputs, nn_dv, nn_dr):
+    # MLP of every organism (see Population.think)
+    for i in range(n):
+        dv = 0.0
+        dr = 0.0
+        for j in range(wih.shape[1]):
+            h = wih[i, j, 0] * inputs[i, 0]
+            for k in range(1, wih.shape[2]):
+                h += wih[i, j, k] * inputs[i, k]
+            h = np.tanh(h)
+            dv += who[i, 0, j] * h
+            dr += who[i, 1, j] * h
+        nn_dv[i] = np.tanh(dv)
+        nn_dr[i] = np.tanh(dr)
+
+
+def integrate_kernel(n, nn_dv, nn_dr, r, v, x, y, age, dr_max, dv_max, v_max, dt, x_min, x_max, y_min, y_max):
+    # heading, velocity, position and age (see Population.integrate)
+    for i in range(n):
+        r[i] = (r[i] + nn_dr[i] * dr_max * dt) % 360
+        v[i] = min(max(v[i] + nn_dv[i] * dv_max * dt, 0.0), v_max)
+        theta = r[i] * (np.pi / 180.0)
+        x[i] = min(max(x[i] + v[i] * np.cos(theta) * dt, x_min), x_max)
+        y[i] = min(max(y[i] + v[i] * np.sin(theta) * dt, y_min), y_max)
+        age[i] += 1
+
+
+def advance_kernel(n, wih, who, inputs, nn_dv, nn_dr, r, v, x, y, age, dr_max, dv_max, v_max, dt, x_min, x_max, y_min, y_max):
+    # think_kernel and integrate_kernel fused: one pass, no temporaries
+    for i in range(n):
+        dv = 0.0
+        dr = 0.0
+        for j in range(wih.shape[1]):
+            h = wih[i, j, 0] * inputs[i, 0]
+            for k in range(1, wih.shape[2]):
+                h += wih[i, j, k] * inputs[i, k]
+            h = np.tanh(h)
+            dv += who[i, 0, j] * h
+            dr += who[i, 1, j] * h
+        nn_dv[i] = np.tanh(dv)
+        nn_dr[i] = np.tanh(dr)
+
+        r[i] = (r[i] + nn_dr[i] * dr_max * dt) % 360
+        v[i] = min(max(v[i] + nn_dv[i] * dv_max * dt, 0.0), v_max)
+        theta = r[i] * (np.pi / 180.0)
+        x[i] = min(max(x[i] + v[i] * np.cos(theta) * dt, x_min), x_max)
+        y[i] = min(max(y[i] + v[i] * np.sin(theta) * dt, y_min), y_max)
+        age[i] += 1
+
+
+class KernelGrid(UniformGrid):
+    '''
+    UniformGrid whose queries run compiled loop kernels over the cell
+    list instead of building candidate pair arrays. Answers are the same
+    as UniformGrid's.
+    '''
+    kernels = None      # dict of compiled kernels, set by NumbaBackend
+
+    def build(self, x: np.ndarray, y: np.ndarray, index: np.ndarray = None) -> None:
+        super().build(x, y, index)
+        self._offsets()
+
+
+    def remove(self, ids: np.ndarray, x: np.ndarray, y: np.ndarray) -> None:
+        super().remove(ids, x, y)
+        self._offsets()
+
+
+    def insert(self, ids: np.ndarray, x: np.ndarray, y: np.ndarray) -> None:
+        super().insert(ids, x, y)
+        self._offsets()
+
+
+    def _offsets(self) -> None:
+        # first sorted position of every cell (cell key k spans starts[k]:starts[k+1])
+        self.starts = np.searchsorted(self.keys, np.arange(self.nx * self.ny + 1))
+        self.index = np.ascontiguousarray(self.index, dtype=np.int64)
+
+
+    def _exclude(self, qx: np.ndarray, exclude: np.ndarray) -> np.ndarray:
+        if exclude is None:
+            return np.full(len(qx), -1, dtype=np.int64)
+        return np.ascontiguousarray(exclude, dtype=np.int64)
+
+
+    def within(self, qx: np.ndarray, qy: np.ndarray, radius: float, exclude: np.ndarray = None) -> tuple:
+        reach = int(ceil(radius / self.cell_size))
+        exclude = self._exclude(qx, exclude)
+        qcx, qcy = self.cells(qx, qy)
+        args = (qx, qy, exclude, qcx, qcy, reach, self.nx, self.ny, self.starts, self.x, self.y, self.index, radius)
+
+        empty = np.zeros(0, dtype=np.int64)
+        count = self.kernels['within'](*args, empty, empty, np.zeros(0))
+        q, ids, d = np.zeros(count, dtype=np.int64), np.zeros(count, dtype=np.int64), np.zeros(count)
+        self.kernels['within'](*args, q, ids, d)
+
+        order = np.lexsort((ids, q))
+        return q[order], ids[order], d[order]
+
+
+    def nearest(self, qx: np.ndarray, qy: np.ndarray, exclude: np.ndarray = None) -> tuple:
+        best_d = np.full(len(qx), np.inf)
+        best_i = np.full(len(qx), -1, dtype=np.int64)
+        if len(self.keys) == 0:
+            return best_d, best_i
+
+        qcx, qcy = self.cells(qx, qy)
+        self.kernels['nearest'](qx, qy, self._exclude(qx, exclude), qcx, qcy, self.cell_size, self.nx, self.ny,
+                                self.starts, self.x, self.y, self.index, best_d, best_i)
+        return best_d, best_i
+
+
+class NumbaBackend(NumpyBackend):
+    '''
+    Numba backend: loop kernels compiled on first use (and cached on disk).
+    advance() runs think and integration as one fused kernel; grid queries
+    (sensing, contacts) use the within and nearest kernels.
+    '''
+    name = 'numba'
+
+    def __init__(self, jit=None):
+        if jit is None:
+            from numba import njit
+
+            jit = njit(cache=True)
+        self.kernels = {
+            'within': jit(within_kernel),
+            'nearest': jit(nearest_kernel),
+            'think': jit(think_kernel),
+            'integrate': jit(integrate_kernel),
+            'advance': jit(advance_kernel),
+        }
+        self.grid = type('NumbaGrid', (KernelGrid,), {'kernels': self.kernels})
+
+
+    def think(self, organisms, inputs: np.ndarray = None) -> None:
+        n = len(organisms)
+        if n == 0:
+            return
+        if inputs is None:
+            inputs = organisms.target()[:, None]
+        self.kernels['think'](n, organisms.wih, organisms.who, np.ascontiguousarray(inputs), organisms.nn_dv, organisms.nn_dr)
+
+
+    def integrate(self, settings: dict, organisms) -> None:
+        self.kernels['integrate'](len(organisms), organisms.nn_dv, organisms.nn_dr, organisms.r, organisms.v,
+                                  organisms.x, organisms.y, organisms.age, *self._constants(settings))
+
+
+    def advance(self, settings: dict, organisms, inputs: np.ndarray = None) -> None:
+        n = len(organisms)
+        if n == 0:
+            return
+        if inputs is None:
+            inputs = organisms.target()[:, None]
+        self.kernels['advance'](n, organisms.wih, organisms.who, np.ascontiguousarray(inputs),
+                                organisms.nn_dv, organisms.nn_dr, organisms.r, organisms.v, organisms.x, organisms.y,
+                                organisms.age, *self._constants(settings))
+
+
+    def _constants(self, settings: dict) -> tuple:
+        return (float(settings['dr_max']), float(settings['dv_max']), float(settings['v_max']), float(settings['dt']),
+                float(settings['x_min']), float(settings['x_max']), float(settings['y_min']), float(settings['y_max']))
+
+
+def get_backend(name: str) -> NumpyBackend:
+    '''
+    Backend for a settings['backend'] value, created once per process so
+    kernels are compiled only once.
+    :param name: 'numpy', 'numba' or 'auto'.
+    :returns: backend instance.
+    '''
+    if name not in BACKENDS:
+        raise ValueError('backend must be one of '+str(BACKENDS)+', not '+repr(name))
+    if name not in _backends:
+        if name == 'numpy':
+            _backends[name] = NumpyBackend()
+        else:
+            try:
+                _backends[name] = NumbaBackend()
+            except ImportError:
+                if name == 'numba':
+                    warnings.warn('numba is not installed; using the numpy backend')
+                _backends[name] = get_backend('numpy')
+    return _backends[name]
+
+
+def copy_population(settings: dict, organisms):
+    '''
+    Independent copy of a population (state and weights).
+    '''
+    from checkpoint import pack_organisms
+    from checkpoint import unpack_organisms
+    from population import Population
+
+    return Population(unpack_organisms(settings, pack_organisms(settings, list(organisms))), organisms.elitism, dtype=organisms.dtype)
+
+
+def compare_backends(settings: dict, backend: NumpyBackend, pop_size: int = 1000, steps: int = 50, seed: int = 0) -> dict:
+    '''
+    Check a backend against the NumPy reference along a seeded run. Before
+    every reference step the backend answers the same contact and nearest
+    queries (must match exactly) and advances a copy of the population
+    (largest deviation reported per state column).
+    :param settings: simulation configurations.
+    :param backend: backend to check.
+    :param pop_size: number of organisms.
+    :param steps: time steps to check.
+    :param seed: seed of the run.
+    :returns: dict with mismatching queries and the deviation of each column.
+    '''
+    from evo_sim import CONTACT_RADIUS
+    from evo_sim import Simulation
+    from evo_sim import new_world
+    from sensors import SensorStage
+
+    settings = dict(settings, pop_size=pop_size, max_pop=None, backend='numpy', render=False, record=False)
+    reference = NumpyBackend()
+    rng = np.random.default_rng(seed)
+    organisms, foods = new_world(settings, rng)
+    sim = Simulation(settings, organisms, foods, 0, rng)
+    sensors = SensorStage(settings)
+
+    columns = ('x', 'y', 'r', 'v', 'nn_dv', 'nn_dr', 'age')
+    result = {'steps': 0, 'mismatches': 0, 'deviation': {name: 0.0 for name in columns}}
+    for t in range(steps):
+        pop = sim.organisms
+        n = len(pop)
+        food_x, food_y = foods.positions()
+
+        # contacts and nearest neighbours
+        answers = []
+        for grids in (reference.grid, backend.grid):
+            contacts = grids(settings['x_min'], settings['x_max'], settings['y_min'], settings['y_max'], CONTACT_RADIUS)
+            contacts.build(pop.x[:n], pop.y[:n])
+            nearest = grids.for_points(settings, len(food_x))
+            nearest.build(food_x, food_y)
+            mates = grids.for_points(settings, n)
+            mates.build(pop.x[:n], pop.y[:n])
+            answers.append(contacts.within(food_x, food_y, CONTACT_RADIUS) + contacts.within(pop.x[:n], pop.y[:n], CONTACT_RADIUS, np.arange(n))
+                           + nearest.nearest(pop.x[:n], pop.y[:n]) + mates.nearest(pop.x[:n], pop.y[:n], np.arange(n)))
+        if any(len(a) != len(b) or not np.array_equal(a, b) for a, b in zip(*answers)):
+            result['mismatches'] += 1
+
+        # think and integration
+        inputs = sensors.inputs(pop, foods, pop.fitness_threshold)
+        copies = [copy_population(settings, pop), copy_population(settings, pop)]
+        reference.advance(settings, copies[0], inputs)
+        backend.advance(settings, copies[1], inputs)
+        for name in columns:
+            a, b = getattr(copies[0], name)[:n], getattr(copies[1], name)[:n]
+            result['deviation'][name] = max(result['deviation'][name], float(np.abs(a - b).max()) if n else 0.0)
+
+        result['steps'] += 1
+        if not sim.step():
+            break
+    return result
+
+
+def main(argv: list = None) -> int:
+    from config import settings
+
+    parser = argparse.ArgumentParser(description='Check a compute backend against the NumPy reference.')
+    parser.add_argument('--backend', choices=BACKENDS, default='numba', help='backend to check')
+    parser.add_argument('--pop', type=int, default=1000, help='population size')
+    parser.add_argument('--steps', type=int, default=50, help='time steps')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the run')
+    parser.add_argument('--precision', default=settings['precision'], help="'float64' or 'float32'")
+    parser.add_argument('--tolerance', type=float, default=None, help='allowed deviation of the state columns (default 1e-9, 1e-4 for float32)')
+    args = parser.parse_args(argv)
+
+    settings = dict(settings, precision=args.precision)
+    tolerance = args.tolerance
+    if tolerance is None:
+        tolerance = 1e-4 if args.precision == 'float32' else 1e-9
+
+    backend = get_backend(args.backend)
+    if args.backend != 'numpy' and backend.name == 'numpy':
+        # the fallback would only be compared with itself
+        print('BACKEND '+args.backend.upper()+' UNAVAILABLE (numba is not installed)')
+        return 2
+    result = compare_backends(settings, backend, args.pop, args.steps, args.seed)
+    print('BACKEND:', backend.name, 'STEPS:', result['steps'], 'QUERY MISMATCHES:', result['mismatches'])
+    for name, deviation in result['deviation'].items():
+        print('  %-6s max deviation %.3g' % (name, deviation))
+
+    if result['mismatches'] or max(result['deviation'].values()) > tolerance:
+        print('BACKENDS DIFFER')
+        return 1
+    print('BACKENDS MATCH')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+# Benchmarks: headless time steps over a pop_size x food_num matrix, plus
+# breeding, the elite fitness threshold and frame rendering on their own.
+# Every case is built from a fixed seed so numbers compare across commits.
+#
+#   python bench.py --out bench.json
+#   python bench.py --compare bench.json --threshold 0.15
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+POP_SIZES = [64, 256, 1024, 4096, 10000]
+FOOD_NUMS = [100, 1000, 10000, 100000]
+BENCHES = ['step', 'breed', 'threshold', 'render']
+
+
+def bench_settings(settings: dict) -> dict:
+    '''
+    Headless copy of the settings that never ends a generation early.
+    :param settings: simulation configurations.
+    :returns: dict
+    '''
+    return dict(settings, render=False, record=False, checkpoint_every=0, instrument=False, profile=False, metrics_dir=None, max_pop=None)
+
+
+def build(settings: dict, pop_size: int, food_num: int, seed: int) -> tuple:
+    '''
+    Seeded initial organisms and food of a benchmark case.
+    :param settings: simulation configurations.
+    :param pop_size: number of organisms.
+    :param food_num: number of food particles.
+    :param seed: seed of the case.
+    :returns: list of organisms, FoodField, random stream
+    '''
+    from evo_sim import new_organism
+    from food import FoodField
+
+    rng = np.random.default_rng(seed)
+    foods = FoodField(settings, rng, food_num)
+    organisms = [new_organism(settings, i, rng) for i in range(pop_size)]
+    return organisms, foods, rng
+
+
+def timed(setup, work, repeat: int = 3) -> tuple:
+    '''
+    Time work on a fresh state (best of repeat runs), then run both once
+    more under tracemalloc for the peak memory of the case (state included).
+    :param setup: callable building the state.
+    :param work: callable doing the work on the state; returns the number of operations.
+    :param repeat: number of timed runs.
+    :returns: operations per second, peak memory (MB)
+    '''
+    rate = 0
+    for i in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        ops = work(state)
+        rate = max(rate, ops / (time.perf_counter() - start))
+        del state
+
+    tracemalloc.start()
+    work(setup())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return rate, peak / 2**20
+
+
+def bench_step(settings: dict, pop_size: int, food_num: int, steps: int, seed: int) -> dict:
+    '''
+    Headless Simulation.step() throughput.
+    :returns: result record.
+    '''
+    from evo_sim import Simulation
+
+    def setup():
+        organisms, foods, rng = build(settings, pop_size, food_num, seed)
+        sim = Simulation(settings, organisms, foods, 0, rng)
+        sim.step()      # warm-up
+        return sim
+
+    def work(sim):
+        done = 0
+        while done < steps:
+            done += 1
+            if not sim.step():
+                break
+        return done
+
+    rate, peak = timed(setup, work)
+    return {'bench': 'step', 'pop_size': pop_size, 'food_num': food_num, 'rate': rate, 'unit': 'steps/s', 'peak_mb': peak}
+
+
+def bench_breed(settings: dict, pop_size: int, repeats: int, seed: int) -> dict:
+    '''
+    evolve_gen() throughput on a scored population.
+    :returns: result record.
+    '''
+    from evo_sim import evolve_gen
+
+    def setup():
+        organisms, foods, rng = build(settings, pop_size, 0, seed)
+        for organism, fitness in zip(organisms, rng.integers(0, 50, pop_size)):
+            organism.fitness = int(fitness)
+        return organisms, rng
+
+    # the next generation is sized from pop_size: breed the benchmark's size
+    breed_settings = dict(settings, pop_size=pop_size)
+
+    def work(state):
+        organisms, rng = state
+        for i in range(repeats):
+            evolve_gen(breed_settings, organisms, 0, rng)
+        return repeats
+
+    rate, peak = timed(setup, work)
+    return {'bench': 'breed', 'pop_size': pop_size, 'food_num': 0, 'rate': rate, 'unit': 'gens/s', 'peak_mb': peak}
+
+
+def bench_threshold(settings: dict, pop_size: int, repeats: int, seed: int) -> dict:
+    '''
+    Elite fitness threshold throughput: one fitness change followed by a
+    threshold lookup, as done every time step.
+    :returns: result record.
+    '''
+    from population import Population
+
+    def setup():
+        organisms, foods, rng = build(settings, pop_size, 0, seed)
+        for organism, fitness in zip(organisms, rng.integers(0, 50, pop_size)):
+            organism.fitness = int(fitness)
+        return Population(organisms, settings['elitism']), rng.integers(0, pop_size, (repeats, 1))
+
+    def work(state):
+        population, rows = state
+        one = np.ones(1, dtype=np.int64)
+        for row in rows:
+            population.add_fitness(row, one)
+            population.fitness_threshold
+        return repeats
+
+    rate, peak = timed(setup, work)
+    return {'bench': 'threshold', 'pop_size': pop_size, 'food_num': 0, 'rate': rate, 'unit': 'calls/s', 'peak_mb': peak}
+
+
+def bench_render(settings: dict, pop_size: int, food_num: int, frames: int, seed: int) -> dict:
+    '''
+    Renderer.frame() throughput (drawing only, no GIF encoding).
+    :returns: result record.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+
+    from plotting import Renderer
+    from population import Population
+
+    def setup():
+        organisms, foods, rng = build(settings, pop_size, food_num, seed)
+        return Renderer(settings, 0), Population(organisms), foods
+
+    def work(state):
+        renderer, population, foods = state
+        for i in range(frames):
+            renderer.frame(population, foods)
+        renderer.path = None
+        renderer.close()
+        return frames
+
+    rate, peak = timed(setup, work)
+    return {'bench': 'render', 'pop_size': pop_size, 'food_num': food_num, 'rate': rate, 'unit': 'frames/s', 'peak_mb': peak}
+
+
+def run_benchmarks(settings: dict, pop_sizes: list = POP_SIZES, food_nums: list = FOOD_NUMS, benches: list = BENCHES, steps: int = 20, seed: int = 0, verbose: bool = True) -> dict:
+    '''
+    Run the benchmark matrix. Time steps are measured for every
+    (pop_size, food_num) pair; breeding and the threshold only depend on
+    pop_size; rendering uses the smallest food_num.
+    :param settings: simulation configurations.
+    :param pop_sizes: population sizes.
+    :param food_nums: food counts.
+    :param benches: benchmarks to run.
+    :param steps: time steps (and rendered frames) per case.
+    :param seed: seed of every case.
+    :param verbose: print each result.
+    :returns: dict with run metadata and the list of results.
+    '''
+    settings = bench_settings(settings)
+    cases = []
+    for pop_size in pop_sizes:
+        if 'step' in benches:
+            for food_num in food_nums:
+                cases.append((bench_step, (settings, pop_size, food_num, steps, seed)))
+        if 'breed' in benches:
+            cases.append((bench_breed, (settings, pop_size, 5, seed)))
+        if 'threshold' in benches:
+            cases.append((bench_threshold, (settings, pop_size, 1000, seed)))
+        if 'render' in benches:
+            cases.append((bench_render, (settings, pop_size, min(food_nums), steps, seed)))
+
+    results = []
+    for bench, args in cases:
+        result = bench(*args)
+        results.append(result)
+        if verbose:
+            print('%-9s pop_size=%-6d food_num=%-7d %12.2f %-9s %9.1f MB' % (
+                result['bench'], result['pop_size'], result['food_num'], result['rate'], result['unit'], result['peak_mb']))
+
+    meta = {'seed': seed, 'steps': steps, 'backend': settings['backend'], 'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine()}
+    return {'meta': meta, 'results': results}
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.10) -> list:
+    '''
+    Compare results with a stored baseline. A case regresses when its rate
+    drops, or its peak memory grows, by more than the threshold.
+    :param results: output of run_benchmarks().
+    :param baseline: earlier output of run_benchmarks().
+    :param threshold: allowed relative change.
+    :returns: list of regression messages.
+    '''
+    key = lambda result: (result['bench'], result['pop_size'], result['food_num'])
+    base = {key(result): result for result in baseline['results']}
+
+    regressions = []
+    for result in results['results']:
+        old = base.get(key(result))
+        if old is None:
+            continue
+        name = '%s pop_size=%d food_num=%d' % key(result)
+        if result['rate'] < old['rate'] * (1 - threshold):
+            regressions.append('%s: %.2f -> %.2f %s' % (name, old['rate'], result['rate'], result['unit']))
+        if result['peak_mb'] > old['peak_mb'] * (1 + threshold):
+            regressions.append('%s: %.1f -> %.1f MB' % (name, old['peak_mb'], result['peak_mb']))
+
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    from config import settings
+
+    parser = argparse.ArgumentParser(description='Benchmark the NEOS simulation, breeding and rendering paths.')
+    parser.add_argument('--pop', type=int, nargs='+', default=POP_SIZES, help='population sizes')
+    parser.add_argument('--food', type=int, nargs='+', default=FOOD_NUMS, help='food counts')
+    parser.add_argument('--bench', nargs='+', choices=BENCHES, default=BENCHES, help='benchmarks to run')
+    parser.add_argument('--steps', type=int, default=20, help='time steps (and frames) per case')
+    parser.add_argument('--seed', type=int, default=0, help='seed of every case')
+    parser.add_argument('--backend', default=settings['backend'], help="compute backend ('numpy', 'numba' or 'auto')")
+    parser.add_argument('--out', default=None, help='write results as json')
+    parser.add_argument('--compare', default=None, help='baseline json to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed relative regression')
+    args = parser.parse_args(argv)
+
+    settings = dict(settings, backend=args.backend)
+    results = run_benchmarks(settings, args.pop, args.food, args.bench, args.steps, args.seed)
+
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            return 1
+        print('NO REGRESSIONS')
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
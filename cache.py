@@ -0,0 +1,152 @@
+# Content-addressed cache of simulated generations. A generation's result
+# (its stats, the surviving organisms, the food field and the random
+# stream after it) depends only on the settings that affect the
+# simulation, the generation index, the incoming organisms, the food field
+# and the random stream state (which carries the seed). The hash of those
+# is the key, so runs that share a prefix (same seed and settings up to
+# some generation) skip re-simulating it.
+#
+# Entries are .npz files in settings['cache_dir']. The directory is kept
+# under settings['cache_size_mb'] by evicting the least recently used
+# entries (hits refresh an entry's modification time).
+
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from checkpoint import pack_organisms
+from checkpoint import unpack_organisms
+
+# settings that never change a generation's result
+IGNORED = (
+    'gens', 'render', 'render_gens', 'frame_stride', 'record', 'trajectory_dir',
+    'metrics_dir', 'instrument', 'instrument_path', 'profile',
+    'checkpoint_every', 'checkpoint_path', 'tile_processes', 'cache_dir', 'cache_size_mb',
+    'islands', 'migration_interval', 'migration_rate', 'migration_topology', 'lineage_dir', 'lineage_genomes',
+)
+
+
+def pack_foods(foods) -> dict:
+    '''
+    Food field as arrays.
+    :param foods: FoodField.
+    :returns: dict of arrays.
+    '''
+    return {'food_x': foods.x, 'food_y': foods.y, 'food_energy': foods.energy}
+
+
+class ResultCache():
+    '''
+    On-disk LRU cache of simulated generations.
+    '''
+    def __init__(self, path: str, size_mb: float):
+        self.path = path
+        self.max_bytes = int(size_mb * 2**20)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+
+    def key(self, settings: dict, gen: int, organisms: list, foods, rng: np.random.Generator) -> str:
+        '''
+        Hash of everything a generation's result depends on.
+        :param settings: simulation configurations.
+        :param gen: generation number.
+        :param organisms: organisms entering the generation.
+        :param foods: food field at its start.
+        :param rng: random stream at its start.
+        :returns: hex digest.
+        '''
+        relevant = {key: value for key, value in settings.items() if key not in IGNORED}
+        h = hashlib.sha256()
+        h.update(json.dumps([relevant, gen, rng.bit_generator.state], sort_keys=True, default=str).encode())
+
+        arrays = pack_organisms(settings, organisms)
+        arrays.update(pack_foods(foods))
+        for name in sorted(arrays):
+            arr = np.ascontiguousarray(arrays[name])
+            h.update((name + str(arr.dtype) + str(arr.shape)).encode())
+            h.update(arr.tobytes())
+        return h.hexdigest()
+
+
+    def file(self, key: str) -> str:
+        return os.path.join(self.path, key + '.npz')
+
+
+    def get(self, key: str, settings: dict, foods, rng: np.random.Generator):
+        '''
+        Look up a generation. On a hit the food field and the random stream
+        are moved to their state after the generation, in place.
+        :param key: key().
+        :param settings: simulation configurations.
+        :param foods: food field to update.
+        :param rng: random stream to update.
+        :returns: (surviving organisms, generation stats), or None on a miss.
+        '''
+        path = self.file(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        foods.set(arrays['food_x'], arrays['food_y'], arrays['food_energy'])
+        rng.bit_generator.state = json.loads(str(arrays['rng']))
+
+        self.hits += 1
+        return unpack_organisms(settings, arrays), json.loads(str(arrays['stats']))
+
+
+    def put(self, key: str, settings: dict, organisms: list, foods, rng: np.random.Generator, stats: dict) -> None:
+        '''
+        Store the result of a generation, then evict least recently used
+        entries beyond the size limit.
+        :param key: key() of the generation's inputs.
+        :param settings: simulation configurations.
+        :param organisms: surviving organisms.
+        :param foods: food field after the generation.
+        :param rng: random stream after the generation.
+        :param stats: generation stats.
+        :returns: None
+        '''
+        arrays = pack_organisms(settings, organisms)
+        arrays.update(pack_foods(foods))
+        arrays['rng'] = np.array(json.dumps(rng.bit_generator.state))
+        arrays['stats'] = np.array(json.dumps(stats))
+
+        # unique temporary name: several runs may share the directory
+        tmp = self.file(key) + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self.file(key))
+        self.evict()
+
+
+    def evict(self) -> None:
+        '''
+        Remove least recently used entries until the cache fits its limit.
+        :returns: None
+        '''
+        entries = []
+        for path in glob.glob(os.path.join(self.path, '*.npz')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
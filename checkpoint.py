@@ -0,0 +1,116 @@
+import json
+import os
+
+import numpy as np
+
+from NEOS import NEOS
+from food import FoodField
+from population import Population
+
+
+def pack_organisms(settings: dict, organisms: list) -> dict:
+    '''
+    State of organisms as plain arrays: one org_<field> column per
+    population field, colors and names as strings, and contiguous
+    (N, hidden, inner) and (N, outer, hidden) weight blocks.
+    :param settings: simulation configurations.
+    :param organisms: list of NEOS.
+    :returns: dict of arrays.
+    '''
+    arrays = {}
+    for name, dtype in Population.fields:
+        if name != 'color':
+            arrays['org_'+name] = np.array([getattr(organism, name) for organism in organisms], dtype=dtype)
+    arrays['org_color'] = np.array([organism.color for organism in organisms], dtype=str)
+    arrays['org_name'] = np.array([organism.name for organism in organisms], dtype=str)
+
+    hidden, inner, outer = settings['hidden_nodes'], settings['inner_nodes'], settings['outer_nodes']
+    arrays['wih'] = np.array([organism.wih for organism in organisms], dtype=np.float64).reshape(-1, hidden, inner)
+    arrays['who'] = np.array([organism.who for organism in organisms], dtype=np.float64).reshape(-1, outer, hidden)
+    return arrays
+
+
+def unpack_organisms(settings: dict, arrays: dict) -> list:
+    '''
+    Rebuild organisms packed by pack_organisms().
+    :param settings: simulation configurations.
+    :param arrays: dict of arrays.
+    :returns: list of NEOS.
+    '''
+    # NEOS draws its heading and velocity on creation; use a scratch stream
+    # so the caller's stream is untouched (the state is overwritten below).
+    scratch = np.random.default_rng(0)
+    organisms = []
+    for i in range(len(arrays['wih'])):
+        organism = NEOS(settings, color=str(arrays['org_color'][i]), wih=arrays['wih'][i].copy(), who=arrays['who'][i].copy(), name=str(arrays['org_name'][i]), rng=scratch)
+        for name, _ in Population.fields:
+            if name != 'color' and 'org_'+name in arrays:
+                setattr(organism, name, arrays['org_'+name][i].item())
+        organisms.append(organism)
+    return organisms
+
+
+def save_checkpoint(path: str, settings: dict, organisms: list, foods: FoodField, gen: int, rng: np.random.Generator, history: list = None) -> None:
+    '''
+    Save the state of a run at a generation boundary as one .npz file of
+    plain arrays: per-organism state columns, contiguous (N, hidden, inner)
+    and (N, outer, hidden) weight blocks, the food field, the generation
+    counter and the random stream state. The file is replaced atomically.
+    :param path: checkpoint file.
+    :param settings: simulation configurations.
+    :param organisms: organisms of the next generation to simulate.
+    :param foods: food field.
+    :param gen: next generation to simulate.
+    :param rng: random stream of the run.
+    :param history: per-generation stats so far.
+    :returns: None
+    '''
+    arrays = pack_organisms(settings, organisms)
+    arrays['food_x'] = foods.x
+    arrays['food_y'] = foods.y
+    arrays['food_energy'] = foods.energy
+
+    arrays['gen'] = np.array(gen)
+    arrays['rng'] = np.array(json.dumps(rng.bit_generator.state))
+    arrays['settings'] = np.array(json.dumps(settings))
+    arrays['history'] = np.array(json.dumps(history or []))
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str, settings: dict) -> dict:
+    '''
+    Load a checkpoint written by save_checkpoint().
+    :param path: checkpoint file.
+    :param settings: simulation configurations to rebuild organisms with
+    (may differ from the saved ones, e.g. to fork an experiment).
+    :returns: dict with organisms, foods, gen, rng, history and the saved settings.
+    '''
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+
+    wih, who = arrays['wih'], arrays['who']
+    expected = ((settings['hidden_nodes'], settings['inner_nodes']), (settings['outer_nodes'], settings['hidden_nodes']))
+    if len(wih) and (wih.shape[1:], who.shape[1:]) != expected:
+        raise ValueError('checkpoint weights '+str(wih.shape[1:])+'/'+str(who.shape[1:])+' do not match the network in settings '+str(expected))
+
+    state = json.loads(str(arrays['rng']))
+    rng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+    rng.bit_generator.state = state
+
+    organisms = unpack_organisms(settings, arrays)
+
+    foods = FoodField(settings, np.random.default_rng(0), 0)
+    foods.set(arrays['food_x'], arrays['food_y'], arrays['food_energy'])
+
+    return {
+        'organisms': organisms,
+        'foods': foods,
+        'gen': int(arrays['gen']),
+        'rng': rng,
+        'history': json.loads(str(arrays['history'])),
+        'settings': json.loads(str(arrays['settings'])),
+    }
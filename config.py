@@ -0,0 +1,282 @@
+# Settings of a NEOS run: the defaults below, optionally updated from a
+# TOML or JSON config file and KEY=VALUE overrides, then validated before
+# anything is simulated.
+#
+#   python main.py --config run.toml --set gens=20 --set max_pop=null
+
+import difflib
+import json
+
+settings = {}
+
+# Evolution Settings
+settings['pop_size'] = 64       # initial number of organisms
+settings['food_num'] = 100      # number of food particles
+settings['gens'] = 10            # number of generations
+settings['elitism'] = 0.20      # elitism (selection bias)
+settings['mutate'] = 0.10       # mutation rate
+settings['mature'] = 200        # time for organism to mature (in total time steps)
+settings['lifespan_lower'] = 500      # starting lifespan lower bound (in total time steps)
+settings['lifespan_upper'] = 600      # starting lifespan upper bound (in total time steps)
+settings['max_pop'] = 150      # population cap (None for uncapped)
+settings['cap_policy'] = 'stop' # at the cap: 'stop' the generation, 'block' births or 'cull' the least fit
+
+# Food Settings (food.py)
+settings['regrowth'] = 'instant'    # eaten food: 'instant' respawn, 'fixed_rate' regrowth or 'patchy' respawn
+settings['regrowth_rate'] = 20.0    # 'fixed_rate': eaten particles regrowing per second (on average)
+settings['food_patches'] = 4        # 'patchy': dense patches of the food density map
+settings['patch_width'] = 0.4       # 'patchy': spread of each patch (units)
+settings['patch_seed'] = 0          # 'patchy': seed of the patch centres
+
+# Simulation Setitngs
+settings['precision'] = 'float64'   # dtype of MLP weights and kinematics ('float32' halves their memory)
+settings['backend'] = 'numpy'   # step math: 'numpy', 'numba' (compiled, fused) or 'auto' (numba if installed)
+settings['gen_time'] = 50       # generation length         (seconds)
+settings['dt'] = 0.04           # simulation time step      (dt)
+
+settings['total_time_steps'] = int(settings['gen_time'] / settings['dt']) # total time steps of simulation (1250)
+
+settings['dr_max'] = 720        # max rotational speed      (degrees per second)
+settings['v_max'] = 0.5         # max velocity              (units per second)
+settings['dv_max'] =  0.25      # max acceleration (+/-)    (units per second^2)
+
+settings['x_min'] = -2.0        # experiment western border
+settings['x_max'] =  2.0        # experiment eastern border
+settings['y_min'] = -2.0        # experiment southern border
+settings['y_max'] =  2.0        # experiment northern border
+
+# Island Settings (island.py)
+settings['islands'] = 4                 # number of sub-populations (one process each)
+settings['migration_interval'] = 5      # generations between migrations
+settings['migration_rate'] = 0.05       # fraction of pop_size sent by each island
+settings['migration_topology'] = 'ring' # 'ring', 'all' or 'random'
+
+# Domain Decomposition Settings (domain.py)
+settings['tiles'] = None        # (tx, ty) tiles, one worker process each (None for a single process)
+settings['halo'] = 0.25         # width of the border strip shared with neighbouring tiles (>= contact radius)
+settings['tile_processes'] = True   # run tiles in worker processes (False: in this process)
+
+# Render Settings
+settings['render'] = True       # save generations as gen_N.gif (False for headless runs)
+settings['render_gens'] = 'all' # generations to render ('all', 'first', 'last', 'first_last' or a list)
+settings['frame_stride'] = 1    # render every k-th time step
+settings['record'] = False      # log frames to gen_N.traj for offline rendering (render.py)
+settings['trajectory_dir'] = '.'    # directory of the trajectory logs
+
+# Metrics Settings
+settings['metrics_dir'] = None  # append steps.csv and generations.csv to this directory (None to disable)
+
+# Instrumentation Settings
+settings['instrument'] = False  # time each phase of every step
+settings['instrument_path'] = 'instrument.jsonl'    # JSON lines output of the timings (None to only call hooks)
+settings['profile'] = False     # cProfile each generation into gen_N.prof (in trajectory_dir)
+
+# Checkpoint Settings
+settings['checkpoint_every'] = 0    # save a checkpoint every k generations (0 to disable)
+settings['checkpoint_path'] = 'checkpoint.npz'  # checkpoint file (overwritten each time)
+
+# Result Cache Settings (cache.py)
+settings['cache_dir'] = None    # reuse generations simulated from identical inputs (None to disable)
+settings['cache_size_mb'] = 512 # size limit of the cache directory (least recently used entries are evicted)
+
+# Lineage Settings (lineage.py)
+settings['lineage_dir'] = None      # record every organism born in this directory (None to disable; not for tiled or island runs)
+settings['lineage_genomes'] = False # also record the weights of every organism at birth
+
+# Organism Neural Net Settings
+settings['sensors'] = ['target']     # neural net inputs, in order (see sensors.py)
+settings['food_k'] = 3               # nearest foods seen by the 'food' sensor
+settings['inner_nodes'] = 1          # number of input nodes (follows the sensors unless set)
+settings['hidden_nodes'] = 5          # number of hidden nodes
+settings['outer_nodes'] = 2          # number of output nodes
+
+# settings that may be None (TOML has no null: use the string "none")
+NULLABLE = ('max_pop', 'tiles', 'metrics_dir', 'instrument_path', 'cache_dir', 'lineage_dir')
+
+# named generation sets of settings['render_gens']
+RENDER_GENS = ('all', 'first', 'last', 'first_last')
+
+
+def load_config(path: str) -> dict:
+    '''
+    Read settings from a .toml or .json file (a flat table of settings).
+    :param path: config file.
+    :returns: dict
+    '''
+    if path.endswith('.toml'):
+        import tomllib
+
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    if path.endswith('.json'):
+        with open(path) as f:
+            return json.load(f)
+    raise ValueError('config file must be .toml or .json: '+path)
+
+
+def parse_overrides(items: list) -> dict:
+    '''
+    Parse KEY=VALUE overrides. Values are read as JSON when possible
+    (numbers, true/false, null, [lists]) and as plain strings otherwise.
+    :param items: list of KEY=VALUE strings.
+    :returns: dict
+    '''
+    overrides = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep or not key:
+            raise ValueError('override must look like KEY=VALUE, not '+repr(item))
+        try:
+            overrides[key.strip()] = json.loads(value)
+        except ValueError:
+            overrides[key.strip()] = value
+    return overrides
+
+
+def normalize(config: dict) -> dict:
+    '''
+    Convert loaded values to the types the simulation uses.
+    :param config: settings read from a file or overrides.
+    :returns: dict
+    '''
+    config = dict(config)
+    for key, value in config.items():
+        if key in NULLABLE and isinstance(value, str) and value.lower() == 'none':
+            config[key] = None
+        elif key == 'tiles' and isinstance(value, list):
+            config[key] = tuple(value)
+        elif key == 'sensors' and isinstance(value, str):
+            config[key] = [sensor.strip() for sensor in value.split(',')]
+    return config
+
+
+def validate(settings: dict, islands: bool = False) -> None:
+    '''
+    Check every setting before a run, reporting all problems at once.
+    :param settings: simulation configurations.
+    :param islands: the settings are for an island run (see island.py).
+    :returns: None
+    '''
+    from backends import BACKENDS
+    from evo_sim import CAP_POLICIES
+    from evo_sim import CONTACT_RADIUS
+    from food import REGROWTH
+    from island import TOPOLOGIES
+    from population import PRECISIONS
+    from sensors import LOCAL_SENSORS
+    from sensors import SENSORS
+    from sensors import sensor_count
+
+    errors = []
+    for key in settings:
+        if key not in defaults:
+            close = difflib.get_close_matches(key, defaults, 1)
+            errors.append('unknown setting '+repr(key)+(' (did you mean '+repr(close[0])+'?)' if close else ''))
+
+    # types follow the defaults
+    bad = set()
+    for key, default in defaults.items():
+        value = settings.get(key)
+        found = len(errors)
+        if key not in settings:
+            errors.append('missing setting '+repr(key))
+        elif value is None:
+            if key not in NULLABLE and default is not None:
+                errors.append(key+' may not be null')
+        elif isinstance(default, bool) or isinstance(value, bool):
+            if type(value) is not type(default) and default is not None:
+                errors.append(key+' must be '+type(default).__name__+', not '+repr(value))
+        elif isinstance(default, float):
+            if not isinstance(value, (int, float)):
+                errors.append(key+' must be a number, not '+repr(value))
+        elif isinstance(default, int):
+            if not isinstance(value, int):
+                errors.append(key+' must be an integer, not '+repr(value))
+        elif isinstance(default, str) and key != 'render_gens':
+            if not isinstance(value, str):
+                errors.append(key+' must be a string, not '+repr(value))
+        elif key == 'sensors':
+            if not isinstance(value, list) or not all(isinstance(sensor, str) for sensor in value):
+                errors.append(key+' must be a list of sensor names, not '+repr(value))
+        if len(errors) > found:
+            bad.add(key)
+
+    def check(ok: bool, message: str) -> None:
+        if not ok:
+            errors.append(message)
+
+    # ranges and consistency, reading the defaults in place of missing or
+    # mistyped settings (already reported above)
+    s = dict(defaults, **{key: value for key, value in settings.items() if key in defaults and key not in bad})
+    for key in ('pop_size', 'total_time_steps', 'frame_stride', 'islands', 'hidden_nodes', 'food_k', 'food_patches'):
+        check(s[key] >= 1, key+' must be at least 1')
+    for key in ('food_num', 'gens', 'mature', 'migration_interval', 'checkpoint_every'):
+        check(s[key] >= 0, key+' must not be negative')
+    for key in ('gen_time', 'dt', 'cache_size_mb', 'patch_width'):
+        check(s[key] > 0, key+' must be positive')
+    for key in ('dr_max', 'v_max', 'dv_max', 'regrowth_rate'):
+        check(s[key] >= 0, key+' must not be negative')
+    check(0 < s['elitism'] <= 1, 'elitism must be in (0, 1]')
+    check(0 <= s['mutate'] <= 1, 'mutate must be in [0, 1]')
+    check(0 <= s['migration_rate'] <= 1, 'migration_rate must be in [0, 1]')
+    check(s['x_min'] < s['x_max'], 'x_min must be below x_max')
+    check(s['y_min'] < s['y_max'], 'y_min must be below y_max')
+    check(0 < s['lifespan_lower'] <= s['lifespan_upper'], 'lifespan bounds must satisfy 0 < lifespan_lower <= lifespan_upper')
+    check(s['max_pop'] is None or s['max_pop'] >= 1, 'max_pop must be at least 1 (or null)')
+    check(len(s['sensors']) > 0 and set(s['sensors']) <= set(SENSORS), 'sensors must be a non-empty list from '+str(SENSORS))
+    check(len(set(s['sensors'])) == len(s['sensors']), 'sensors may not repeat')
+    if s['food_k'] >= 1 and not bad & {'sensors', 'food_k', 'inner_nodes'}:
+        check(s['inner_nodes'] == sensor_count(s), 'inner_nodes must be '+str(sensor_count(s))+' (one per sensor input)')
+    check(s['outer_nodes'] == 2, 'outer_nodes must be 2 (velocity and heading)')
+
+    check(s['cap_policy'] in CAP_POLICIES, 'cap_policy must be one of '+str(CAP_POLICIES))
+    check(s['regrowth'] in REGROWTH, 'regrowth must be one of '+str(REGROWTH))
+    check(s['backend'] in BACKENDS, 'backend must be one of '+str(BACKENDS))
+    check(s['precision'] in PRECISIONS, 'precision must be one of '+str(PRECISIONS))
+    check(s['migration_topology'] in TOPOLOGIES, 'migration_topology must be one of '+str(TOPOLOGIES))
+    check(s['render_gens'] in RENDER_GENS or (isinstance(s['render_gens'], list) and all(isinstance(g, int) for g in s['render_gens'])),
+          'render_gens must be one of '+str(RENDER_GENS)+' or a list of generations')
+
+    tiles = s['tiles']
+    if tiles is not None:
+        check(isinstance(tiles, tuple) and len(tiles) == 2 and all(isinstance(t, int) and t >= 1 for t in tiles),
+              'tiles must be two positive integers (or null)')
+        check(s['halo'] >= CONTACT_RADIUS, 'halo must be at least the contact radius ('+str(CONTACT_RADIUS)+')')
+        check(s['max_pop'] is None or s['cap_policy'] == 'stop', "tiled runs only support cap_policy 'stop'")
+        check(set(s['sensors']) <= set(LOCAL_SENSORS), 'tiled runs only support the sensors '+str(LOCAL_SENSORS))
+        check(s['regrowth'] == 'instant', "tiled runs only support regrowth 'instant'")
+        check(s['lineage_dir'] is None, 'tiled runs do not record lineage (lineage_dir must be null)')
+    if islands:
+        check(s['lineage_dir'] is None, 'island runs do not record lineage (lineage_dir must be null)')
+
+    if errors:
+        raise ValueError('invalid settings:\n  ' + '\n  '.join(errors))
+
+
+def make_settings(path: str = None, overrides: dict = None) -> dict:
+    '''
+    Settings of a run: the defaults, updated from a config file and then
+    from overrides, validated. total_time_steps follows gen_time and dt
+    unless it is set explicitly, and so does inner_nodes with the sensors.
+    :param path: .toml or .json config file (None for the defaults).
+    :param overrides: dict of settings that take precedence over the file.
+    :returns: dict
+    '''
+    from sensors import SENSORS
+    from sensors import sensor_count
+
+    config = normalize(load_config(path)) if path else {}
+    config.update(normalize(overrides or {}))
+
+    run = dict(defaults)
+    run.update(config)
+    if 'total_time_steps' not in config and isinstance(run['gen_time'], (int, float)) and isinstance(run['dt'], (int, float)) and run['dt'] > 0:
+        run['total_time_steps'] = int(run['gen_time'] / run['dt'])
+    if 'inner_nodes' not in config and isinstance(run['sensors'], list) and set(run['sensors']) <= set(SENSORS) and isinstance(run['food_k'], int):
+        run['inner_nodes'] = sensor_count(run)
+    validate(run)
+    return run
+
+
+# pristine copy of the defaults (settings may be changed by scripts)
+defaults = dict(settings)
@@ -0,0 +1,754 @@
+# Domain decomposition: the arena is cut into settings['tiles'] = (tx, ty)
+# rectangular tiles, each owned by a worker process holding the organisms
+# and food inside it. Every step the tiles exchange halo strips (points
+# within settings['halo'] of their borders) through the coordinator, so
+# contacts are exact, and nearest food/mate queries that the halo cannot
+# settle fall back to a query over every tile. Organisms and respawned
+# food that leave a tile migrate to their new owner.
+#
+# Results follow the single-process rules, with one difference: when
+# several organisms touch the same food the lowest organism id eats it
+# (instead of the lowest population row). Random draws differ from a
+# single-process run, so seeded runs are reproducible per tiling only.
+
+from multiprocessing import Pipe
+from multiprocessing import Process
+
+import numpy as np
+
+from backends import get_backend
+from checkpoint import pack_organisms
+from checkpoint import unpack_organisms
+from evo_sim import CONTACT_RADIUS
+from evo_sim import crossover
+from evo_sim import mutate_genomes
+from NEOS import NEOS
+from population import Population
+from population import elite_threshold
+from population import precision
+from sensors import SensorStage
+from stats import StatsAccumulator
+from utils import calc_headings
+from utils import palette
+from utils import pick_colors
+
+# organism columns sent in halo strips
+HALO_FIELDS = ('x', 'y', 'id', 'fitness', 'age', 'lifespan', 'gen')
+
+
+def tile_of(settings: dict, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    '''
+    Tile owning each position.
+    :param settings: simulation configurations.
+    :param x: x positions.
+    :param y: y positions.
+    :returns: tile numbers (row-major over settings['tiles']).
+    '''
+    tx, ty = settings['tiles']
+    cx = np.floor((x - settings['x_min']) / (settings['x_max'] - settings['x_min']) * tx).astype(np.int64)
+    cy = np.floor((y - settings['y_min']) / (settings['y_max'] - settings['y_min']) * ty).astype(np.int64)
+    return np.clip(cy, 0, ty - 1) * tx + np.clip(cx, 0, tx - 1)
+
+
+def tile_bounds(settings: dict, index: int) -> tuple:
+    '''
+    Rectangle of a tile.
+    :param settings: simulation configurations.
+    :param index: tile number.
+    :returns: x_min, x_max, y_min, y_max
+    '''
+    tx, ty = settings['tiles']
+    width = (settings['x_max'] - settings['x_min']) / tx
+    height = (settings['y_max'] - settings['y_min']) / ty
+    i, j = index % tx, index // tx
+    x0 = settings['x_min'] + i * width
+    y0 = settings['y_min'] + j * height
+    x1 = settings['x_max'] if i == tx - 1 else x0 + width
+    y1 = settings['y_max'] if j == ty - 1 else y0 + height
+    return x0, x1, y0, y1
+
+
+def select(packet: dict, keep: np.ndarray) -> dict:
+    '''
+    Rows of a dict of equal-length arrays.
+    '''
+    return {key: value[keep] for key, value in packet.items()}
+
+
+def concat(packets: list) -> dict:
+    '''
+    Concatenate dicts of equal-length arrays key by key.
+    '''
+    return {key: np.concatenate([packet[key] for packet in packets]) for key in packets[0]}
+
+
+def rows_of(ids: np.ndarray, wanted: np.ndarray) -> tuple:
+    '''
+    Positions of ids in an array of unique ids.
+    :param ids: unique ids.
+    :param wanted: ids to look up.
+    :returns: positions (clipped, valid only where found) and found mask.
+    '''
+    if len(ids) == 0:
+        return np.zeros(len(wanted), dtype=np.int64), np.zeros(len(wanted), dtype=bool)
+    order = np.argsort(ids)
+    pos = order[np.searchsorted(ids, wanted, sorter=order).clip(0, len(ids) - 1)]
+    return pos, ids[pos] == wanted
+
+
+def pack_rows(population: Population, rows: np.ndarray) -> dict:
+    '''
+    State of population rows in the pack_organisms() layout.
+    :param population: population holding the rows.
+    :param rows: row numbers.
+    :returns: dict of arrays.
+    '''
+    arrays = {'org_'+name: getattr(population, name)[rows] for name, _ in Population.fields if name != 'color'}
+    arrays['org_color'] = np.array([palette[c] for c in population.color[rows].tolist()], dtype=str)
+    arrays['org_name'] = np.array([population.organisms[i].name for i in rows.tolist()], dtype=str)
+    arrays['wih'] = population.wih[rows]
+    arrays['who'] = population.who[rows]
+    return arrays
+
+
+class Tile():
+    '''
+    Organisms and food of one tile, stepped in phases by the coordinator.
+    Every public method takes and returns plain arrays so it can run in a
+    worker process.
+    '''
+    def __init__(self, settings: dict, index: int, organisms: dict, food: dict, gen: int, seed, id_start: int):
+        self.settings = settings
+        self.index = index
+        self.gen = gen
+        self.rng = np.random.default_rng(seed)
+        self.backend = get_backend(settings['backend'])
+        self.sensors = SensorStage(settings)    # local sensors only (see config.validate)
+        self.bounds = tile_bounds(settings, index)
+        self.halo = settings['halo']
+
+        # expanded rectangle covered by the tile and its halo
+        x0, x1, y0, y1 = self.bounds
+        h = self.halo
+        self.cover = (max(x0 - h, settings['x_min']), min(x1 + h, settings['x_max']),
+                      max(y0 - h, settings['y_min']), min(y1 + h, settings['y_max']))
+
+        self.organisms = Population(unpack_organisms(settings, organisms), settings['elitism'], dtype=precision(settings))
+        if self.organisms.wih is None:
+            self.organisms.wih = np.zeros((self.organisms.capacity,) + organisms['wih'].shape[1:], dtype=self.organisms.dtype)
+            self.organisms.who = np.zeros((self.organisms.capacity,) + organisms['who'].shape[1:], dtype=self.organisms.dtype)
+        self.food = food                # x, y, id and energy of the food in the tile
+        self.stats = StatsAccumulator()
+        self.next_id = id_start + index  # ids of births, strided by the tile count
+        self.threshold = 0
+
+
+    def strip(self, points: dict) -> np.ndarray:
+        '''
+        Points close enough to the tile border to be in a neighbour's halo.
+        '''
+        x0, x1, y0, y1 = self.bounds
+        h = self.halo
+        x, y = points['x'], points['y']
+        return (x - x0 <= h) | (x1 - x <= h) | (y - y0 <= h) | (y1 - y <= h)
+
+
+    def reach(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        '''
+        Distance from each point to the nearest edge of the halo coverage
+        that has unseen points behind it (arena borders do not count).
+        Anything not held by the tile or its halo is at least this far.
+        '''
+        settings = self.settings
+        x0, x1, y0, y1 = self.cover
+        reach = np.full(len(x), np.inf)
+        if x0 > settings['x_min']:
+            reach = np.minimum(reach, x - x0)
+        if x1 < settings['x_max']:
+            reach = np.minimum(reach, x1 - x)
+        if y0 > settings['y_min']:
+            reach = np.minimum(reach, y - y0)
+        if y1 < settings['y_max']:
+            reach = np.minimum(reach, y1 - y)
+        return reach
+
+
+    def grid(self, n: int, cell_size: float = None):
+        '''
+        Backend grid over the halo coverage, sized for n points unless a
+        cell size is given.
+        '''
+        x0, x1, y0, y1 = self.cover
+        if cell_size is None:
+            cell_size = np.sqrt((x1 - x0) * (y1 - y0) / max(n, 1))
+        return self.backend.grid(x0, x1, y0, y1, cell_size)
+
+
+    def contact_strip(self, arg=None) -> dict:
+        '''
+        Phase 1: positions of border organisms and food for the eat halo.
+        :returns: dict with 'org' and 'food' point arrays.
+        '''
+        pop = self.organisms
+        n = len(pop)
+        org = {'x': pop.x[:n].copy(), 'y': pop.y[:n].copy(), 'id': pop.id[:n].copy()}
+        return {'org': select(org, self.strip(org)), 'food': select(self.food, self.strip(self.food))}
+
+
+    def eat(self, halo: dict) -> dict:
+        '''
+        Phase 2: resolve eating of the tile's own food. Each food touched by
+        organisms (own or halo) goes to the lowest organism id and respawns
+        anywhere in the arena.
+        :param halo: organism points from neighbouring tiles.
+        :returns: dict with fitness credits for other tiles' organisms,
+        respawned food that left the tile and the number eaten.
+        '''
+        settings = self.settings
+        pop = self.organisms
+        n = len(pop)
+        x = np.concatenate([pop.x[:n], halo['x']])
+        y = np.concatenate([pop.y[:n], halo['y']])
+        ids = np.concatenate([pop.id[:n], halo['id']])
+        none = {'credits': {'id': np.zeros(0, dtype=np.int64), 'energy': np.zeros(0, dtype=np.int64)}, 'food': select(self.food, np.zeros(0, dtype=np.int64)), 'eaten': 0}
+        if len(x) == 0 or len(self.food['x']) == 0:
+            return none
+
+        grid = self.grid(0, CONTACT_RADIUS)
+        grid.build(x, y)
+        eaten, eater, _ = grid.within(self.food['x'], self.food['y'], CONTACT_RADIUS)
+        if len(eaten) == 0:
+            return none
+
+        # lowest organism id per food
+        order = np.lexsort((ids[eater], eaten))
+        eaten, eater = eaten[order], eater[order]
+        first = np.ones(len(eaten), dtype=bool)
+        first[1:] = eaten[1:] != eaten[:-1]
+        eaten, eater = eaten[first], eater[first]
+
+        # Update fitness function
+        own = eater < n
+        energy = self.food['energy'][eaten]
+        pop.add_fitness(eater[own], energy[own])
+        credits = {'id': ids[eater[~own]], 'energy': energy[~own]}
+
+        # respawn anywhere; food landing in another tile leaves
+        self.food['x'][eaten] = self.rng.uniform(settings['x_min'], settings['x_max'], len(eaten))
+        self.food['y'][eaten] = self.rng.uniform(settings['y_min'], settings['y_max'], len(eaten))
+        self.food['energy'][eaten] = 1
+        leaving = tile_of(settings, self.food['x'], self.food['y']) != self.index
+        gone = select(self.food, leaving)
+        self.food = select(self.food, ~leaving)
+
+        return {'credits': credits, 'food': gone, 'eaten': len(eaten)}
+
+
+    def settle(self, arrivals: dict) -> dict:
+        '''
+        Phase 3: apply other tiles' credits and take in arriving food.
+        :param arrivals: dict with 'credits' (organism ids of any tile and
+        the energy they ate) and 'food'.
+        :returns: dict with the sense halo strip and the fitness histogram.
+        '''
+        pop = self.organisms
+        n = len(pop)
+        credits = arrivals['credits']
+        if len(credits['id']) and n:
+            rows, mine = rows_of(pop.id[:n], credits['id'])
+            pop.add_fitness(rows[mine], credits['energy'][mine])
+        if len(arrivals['food']['x']):
+            self.food = concat([self.food, arrivals['food']])
+
+        org = {name: getattr(pop, name)[:n].copy() for name in HALO_FIELDS}
+        org['wih'] = pop.wih[:n].copy()
+        org['who'] = pop.who[:n].copy()
+        return {'org': select(org, self.strip(org)), 'food': select(self.food, self.strip(self.food)),
+                'counts': pop.fitness_counts, 'n': n}
+
+
+    def sense(self, arg: dict) -> dict:
+        '''
+        Phase 4: nearest food and mate from the tile and its halo. Queries
+        whose answer could lie beyond the halo are returned for a global
+        lookup.
+        :param arg: dict with the sense halo, the global threshold and population size.
+        :returns: dict with the unresolved 'food' and 'mate' queries.
+        '''
+        pop = self.organisms
+        n = len(pop)
+        self.threshold = arg['threshold']
+        self.halo_org = arg['halo']['org']
+        food = concat([self.food, arg['halo']['food']])
+        self.pending_food = np.zeros(0, dtype=np.int64)
+        self.pending_mate = np.zeros(0, dtype=np.int64)
+        empty = {'food': {'x': np.zeros(0), 'y': np.zeros(0)},
+                 'mate': {'x': np.zeros(0), 'y': np.zeros(0), 'exclude': np.zeros(0, dtype=np.int64)}}
+        if arg['food_total'] == 0:
+            return empty
+
+        # Reset distance and heading to nearest food
+        pop.d_food[:n] = 100
+        pop.r_food[:n] = 0
+
+        # A lone organism has nothing to compare against
+        if arg['n'] < 2 or n == 0:
+            return empty
+
+        x, y, r = pop.x[:n], pop.y[:n], pop.r[:n]
+        reach = self.reach(x, y)
+
+        # Nearest food particle
+        d, idx = np.full(n, np.inf), np.full(n, -1)
+        if len(food['x']):
+            grid = self.grid(len(food['x']))
+            grid.build(food['x'], food['y'], food['id'])
+            d, idx = grid.nearest(x, y)
+            idx, _ = rows_of(food['id'], idx)
+        found = d < reach
+        self.apply_food(np.flatnonzero(found), d[found], food['x'][idx[found]], food['y'][idx[found]])
+        self.pending_food = np.flatnonzero(~found)
+
+        # Nearest mate for organisms nearing the end of their lifespan
+        seekers = np.flatnonzero(pop.age[:n] > pop.lifespan[:n]*0.75)
+        org = concat([{name: getattr(pop, name)[:n] for name in ('x', 'y', 'id', 'fitness')},
+                      {name: self.halo_org[name] for name in ('x', 'y', 'id', 'fitness')}])
+        mates = np.flatnonzero(org['fitness'] > self.threshold)
+        if len(seekers):
+            d, idx = np.full(len(seekers), np.inf), np.full(len(seekers), -1)
+            if len(mates):
+                grid = self.grid(len(mates))
+                grid.build(org['x'][mates], org['y'][mates], mates)
+                d, idx = grid.nearest(x[seekers], y[seekers], exclude=seekers)
+            found = d < reach[seekers]
+            self.apply_mate(seekers[found], d[found], org['x'][idx[found]], org['y'][idx[found]])
+            self.pending_mate = seekers[~found]
+
+        return {'food': {'x': x[self.pending_food], 'y': y[self.pending_food]},
+                'mate': {'x': x[self.pending_mate], 'y': y[self.pending_mate], 'exclude': pop.id[self.pending_mate]}}
+
+
+    def apply_food(self, rows: np.ndarray, d: np.ndarray, fx: np.ndarray, fy: np.ndarray) -> None:
+        pop = self.organisms
+        closer = d < pop.d_food[rows]
+        rows, d = rows[closer], d[closer]
+        pop.d_food[rows] = d
+        pop.r_food[rows] = calc_headings(pop.x[rows], pop.y[rows], pop.r[rows], fx[closer], fy[closer])
+
+
+    def apply_mate(self, rows: np.ndarray, d: np.ndarray, mx: np.ndarray, my: np.ndarray) -> None:
+        pop = self.organisms
+        closer = d < pop.d_org[rows]
+        rows, d = rows[closer], d[closer]
+        pop.d_org[rows] = d
+        pop.r_org[rows] = calc_headings(pop.x[rows], pop.y[rows], pop.r[rows], mx[closer], my[closer])
+
+
+    def nearest(self, queries: dict) -> dict:
+        '''
+        Fallback lookup: nearest own food / mate for every tile's unresolved queries.
+        :param queries: 'food' and 'mate' queries of all tiles.
+        :returns: distance, id and position of the best local answer per query.
+        '''
+        pop = self.organisms
+        n = len(pop)
+        answers = {}
+
+        q = queries['food']
+        d, gid = np.full(len(q['x']), np.inf), np.full(len(q['x']), -1)
+        x, y = np.zeros(len(d)), np.zeros(len(d))
+        if len(self.food['x']) and len(q['x']):
+            grid = self.grid(len(self.food['x']))
+            grid.build(self.food['x'], self.food['y'], self.food['id'])
+            d, gid = grid.nearest(q['x'], q['y'])
+            rows, _ = rows_of(self.food['id'], gid)
+            x, y = self.food['x'][rows], self.food['y'][rows]
+        answers['food'] = {'d': d, 'id': gid, 'x': x, 'y': y}
+
+        q = queries['mate']
+        mates = np.flatnonzero(pop.fitness[:n] > self.threshold)
+        d, gid = np.full(len(q['x']), np.inf), np.full(len(q['x']), -1)
+        x, y = np.zeros(len(d)), np.zeros(len(d))
+        if len(mates) and len(q['x']):
+            grid = self.grid(len(mates))
+            grid.build(pop.x[mates], pop.y[mates], pop.id[mates])
+            d, gid = grid.nearest(q['x'], q['y'], exclude=q['exclude'])
+            rows, _ = rows_of(pop.id[mates], gid)
+            x, y = pop.x[mates[rows]], pop.y[mates[rows]]
+        answers['mate'] = {'d': d, 'id': gid, 'x': x, 'y': y}
+        return answers
+
+
+    def advance(self, answers: dict) -> dict:
+        '''
+        Phase 5: finish sensing, then mate, age out, think, move and hand
+        organisms that left the tile to the coordinator.
+        :param answers: global answers to the tile's unresolved queries.
+        :returns: dict with leaving organisms and the step's births and deaths.
+        '''
+        settings = self.settings
+        pop = self.organisms
+        rng = self.rng
+
+        if len(self.pending_food):
+            a = answers['food']
+            self.apply_food(self.pending_food, a['d'], a['x'], a['y'])
+        if len(self.pending_mate):
+            a = answers['mate']
+            self.apply_mate(self.pending_mate, a['d'], a['x'], a['y'])
+
+        births = self.mate()
+
+        # Old age organisms die off
+        n = len(pop)
+        deaths = np.flatnonzero(pop.age[:n] >= pop.lifespan[:n])
+        self.stats.record_deaths(pop.fitness[deaths])
+        self.stats.record_births(len(births))
+        pop.remove_rows(deaths)
+        pop.extend(births)
+
+        # Get organism response and move
+        self.backend.advance(settings, pop, self.sensors.inputs(pop, (), self.threshold))
+
+        # Organisms that crossed into another tile
+        n = len(pop)
+        leaving = np.flatnonzero(tile_of(settings, pop.x[:n], pop.y[:n]) != self.index)
+        packet = pack_rows(pop, leaving)
+        pop.remove_rows(leaving)
+        return {'leaving': packet, 'births': len(births), 'deaths': len(deaths)}
+
+
+    def mate(self) -> list:
+        '''
+        Children of every ordered pair of ready organisms in contact whose
+        first parent belongs to the tile (see evo_sim.mate()).
+        :returns: list of children.
+        '''
+        settings = self.settings
+        pop = self.organisms
+        rng = self.rng
+        halo = self.halo_org
+        n = len(pop)
+
+        fitness = np.concatenate([pop.fitness[:n], halo['fitness']])
+        age = np.concatenate([pop.age[:n], halo['age']])
+        ready = np.flatnonzero((fitness > self.threshold) & (age > settings['mature']))
+        own = ready[ready < n]
+        if len(own) == 0 or len(ready) < 2:
+            return []
+
+        x = np.concatenate([pop.x[:n], halo['x']])
+        y = np.concatenate([pop.y[:n], halo['y']])
+        ids = np.concatenate([pop.id[:n], halo['id']])
+        grid = self.grid(0, CONTACT_RADIUS)
+        grid.build(x[ready], y[ready], ids[ready])
+        q, partner, _ = grid.within(x[own], y[own], CONTACT_RADIUS, exclude=ids[own])
+        if len(q) == 0:
+            return []
+
+        # partner ids back to rows of the combined arrays
+        mate_1 = own[q]
+        mate_2 = ready[rows_of(ids[ready], partner)[0]]
+
+        # Reset distance and heading to nearest mate
+        pop.d_org[mate_1] = 100
+        pop.r_org[mate_1] = 0
+
+        # Crossover and mutation
+        wih = np.concatenate([pop.wih[:n], halo['wih']])
+        who = np.concatenate([pop.who[:n], halo['who']])
+        gen = np.concatenate([pop.gen[:n], halo['gen']])
+        weight = rng.random(len(mate_1))
+        wih_new, who_new = crossover(wih[mate_1], who[mate_1], wih[mate_2], who[mate_2], weight)
+        born = np.flatnonzero(mutate_genomes(settings, wih_new, who_new, rng))
+
+        # Mutate: Color and lifespan
+        next_gen = np.maximum(gen[mate_1[born]], gen[mate_2[born]]) + 1
+        colors = pick_colors(next_gen, rng)
+        lifespans = rng.integers(settings['lifespan_lower'], settings['lifespan_upper'] + 1, len(born))
+
+        children = []
+        for k, b in enumerate(born.tolist()):
+            parent = mate_1[b]
+            child = NEOS(settings, color=colors[k], lifespan=int(lifespans[k]), x=x[parent], y=y[parent],
+                         wih=wih_new[b], who=who_new[b], name='gen['+str(self.gen)+']-org['+str(self.next_id)+']',
+                         gen=int(next_gen[k]), rng=rng)
+            child.id = self.next_id
+            self.next_id += self.settings['tiles'][0] * self.settings['tiles'][1]
+            children.append(child)
+        return children
+
+
+    def arrive(self, packet: dict) -> int:
+        '''
+        Phase 6: take in organisms that moved into the tile.
+        :param packet: packed organisms.
+        :returns: number of organisms in the tile.
+        '''
+        if len(packet['wih']):
+            self.organisms.extend(unpack_organisms(self.settings, packet))
+        return len(self.organisms)
+
+
+    def collect(self, arg=None) -> dict:
+        '''
+        End of generation: survivors, food and stats of the tile.
+        :returns: dict with packed survivors, food and the stats accumulator.
+        '''
+        pop = self.organisms
+        n = len(pop)
+        self.stats.record_survivors(pop.fitness[:n])
+        return {'organisms': pack_rows(pop, np.arange(n)), 'food': self.food, 'stats': self.stats}
+
+
+def tile_worker(conn, args: tuple) -> None:
+    '''
+    Worker process serving one Tile: each message is (method, argument)
+    and is answered with the method's result, until ('stop', None).
+    '''
+    tile = Tile(*args)
+    while True:
+        name, arg = conn.recv()
+        if name == 'stop':
+            break
+        conn.send(getattr(tile, name)(arg))
+    conn.close()
+
+
+class TiledSimulation():
+    '''
+    Coordinator of a tiled generation: steps every tile phase by phase and
+    routes halos, credits, fallback queries and migrants between them.
+    With processes=False the tiles run in this process (same results).
+    '''
+    def __init__(self, settings: dict, organisms: list, foods, gen: int, rng: np.random.Generator, processes: bool = True):
+        if settings['halo'] < CONTACT_RADIUS:
+            raise ValueError('halo must be at least the contact radius ('+str(CONTACT_RADIUS)+')')
+        if settings['max_pop'] is not None and settings['cap_policy'] != 'stop':
+            raise ValueError("tiled runs only support cap_policy 'stop'")
+
+        self.settings = settings
+        self.foods = foods
+        self.gen = gen
+        self.count = settings['tiles'][0] * settings['tiles'][1]
+        self.covers = []
+        self.steps = 0
+
+        packed = pack_organisms(settings, organisms)
+        packed['org_id'] = np.arange(len(organisms), dtype=np.int64)
+        owner = tile_of(settings, packed['org_x'], packed['org_y'])
+        food = {'x': foods.x.copy(), 'y': foods.y.copy(), 'id': np.arange(len(foods), dtype=np.int64),
+                'energy': foods.energy.copy()}
+        food_owner = tile_of(settings, food['x'], food['y'])
+        seeds = rng.integers(0, 2**63, self.count)
+
+        self.tiles, self.conns, self.workers = [], [], []
+        for t in range(self.count):
+            args = (settings, t, select(packed, owner == t), select(food, food_owner == t), gen, int(seeds[t]), len(organisms))
+            if processes:
+                parent, child = Pipe()
+                worker = Process(target=tile_worker, args=(child, args), daemon=True)
+                worker.start()
+                child.close()
+                self.conns.append(parent)
+                self.workers.append(worker)
+            else:
+                self.tiles.append(Tile(*args))
+
+            x0, x1, y0, y1 = tile_bounds(settings, t)
+            h = settings['halo']
+            self.covers.append((x0 - h, x1 + h, y0 - h, y1 + h))
+
+
+    def call(self, name: str, args: list = None) -> list:
+        '''
+        Run a Tile method on every tile.
+        :param name: method name.
+        :param args: one argument per tile (None for none).
+        :returns: list of results.
+        '''
+        if args is None:
+            args = [None] * self.count
+        if self.tiles:
+            return [getattr(tile, name)(arg) for tile, arg in zip(self.tiles, args)]
+
+        for conn, arg in zip(self.conns, args):
+            conn.send((name, arg))
+        results = []
+        for t, conn in enumerate(self.conns):
+            try:
+                results.append(conn.recv())
+            except EOFError:
+                raise RuntimeError('tile '+str(t)+' worker exited') from None
+        return results
+
+
+    def route_halo(self, strips: list, key: str) -> list:
+        '''
+        Give each tile the points of the other tiles' strips that fall in
+        its halo coverage.
+        '''
+        halos = []
+        for t, (x0, x1, y0, y1) in enumerate(self.covers):
+            parts = []
+            for s, strip in enumerate(strips):
+                points = strip[key]
+                if s != t:
+                    inside = (points['x'] >= x0) & (points['x'] <= x1) & (points['y'] >= y0) & (points['y'] <= y1)
+                    parts.append(select(points, inside))
+            halos.append(concat(parts) if parts else select(strips[t][key], np.zeros(0, dtype=np.int64)))
+        return halos
+
+
+    def route_points(self, packets: list, x_key: str, y_key: str) -> list:
+        '''
+        Send every row of the packets to the tile owning its position.
+        '''
+        merged = concat(packets)
+        owner = tile_of(self.settings, merged[x_key], merged[y_key])
+        return [select(merged, owner == t) for t in range(self.count)]
+
+
+    def step(self) -> bool:
+        '''
+        Advance every tile by one time step.
+        :returns: False once the generation has ended early.
+        '''
+        settings = self.settings
+
+        # Eating, with contacts exact across tile borders
+        strips = self.call('contact_strip')
+        results = self.call('eat', self.route_halo(strips, 'org'))
+        credits = concat([result['credits'] for result in results])
+        food = self.route_points([result['food'] for result in results], 'x', 'y')
+        strips = self.call('settle', [{'credits': credits, 'food': food[t]} for t in range(self.count)])
+
+        # Global elite threshold from the tiles' fitness histograms
+        n = sum(strip['n'] for strip in strips)
+        size = max(len(strip['counts']) for strip in strips)
+        counts = np.zeros(size, dtype=np.int64)
+        for strip in strips:
+            counts[:len(strip['counts'])] += strip['counts']
+        threshold = elite_threshold(counts, n, settings['elitism'])
+
+        # Sensing, with a global lookup for what the halo cannot settle
+        org_halos = self.route_halo(strips, 'org')
+        food_halos = self.route_halo(strips, 'food')
+        args = [{'halo': {'org': org_halos[t], 'food': food_halos[t]}, 'threshold': threshold, 'n': n,
+                 'food_total': len(self.foods)} for t in range(self.count)]
+        queries = self.call('sense', args)
+        answers = self.answer(queries)
+
+        # Mating, deaths, movement and migration
+        results = self.call('advance', answers)
+        arrivals = self.route_points([result['leaving'] for result in results], 'org_x', 'org_y')
+        n = sum(self.call('arrive', arrivals))
+        self.steps += 1
+
+        # End simulation if all organisms are gone
+        if n == 0:
+            print("GEN "+str(self.gen)+" DID NOT SURVIVE...")
+            return False
+
+        # Too many NEOS
+        if settings['max_pop'] is not None and n > settings['max_pop']:
+            print("OVERPOPULATION - ENDING SIM...")
+            return False
+
+        return True
+
+
+    def answer(self, queries: list) -> list:
+        '''
+        Resolve unresolved sense queries against every tile: nearest
+        distance wins, ties go to the lowest id.
+        '''
+        sizes = {kind: [len(q[kind]['x']) for q in queries] for kind in ('food', 'mate')}
+        if not any(sum(size) for size in sizes.values()):
+            return [None] * self.count
+
+        merged = {kind: concat([q[kind] for q in queries]) for kind in ('food', 'mate')}
+        local = self.call('nearest', [merged] * self.count)
+
+        answers = [{} for t in range(self.count)]
+        for kind in ('food', 'mate'):
+            d = np.stack([a[kind]['d'] for a in local])
+            ids = np.stack([a[kind]['id'] for a in local])
+            best_d = d.min(axis=0)
+            ids = np.where((d == best_d) & (ids >= 0), ids, np.iinfo(np.int64).max)
+            best = ids.argmin(axis=0)
+            cols = np.arange(d.shape[1])
+            result = {'d': best_d,
+                      'x': np.stack([a[kind]['x'] for a in local])[best, cols],
+                      'y': np.stack([a[kind]['y'] for a in local])[best, cols]}
+
+            start = 0
+            for t, size in enumerate(sizes[kind]):
+                answers[t][kind] = select(result, slice(start, start + size))
+                start += size
+        return answers
+
+
+    def finish(self) -> tuple:
+        '''
+        Gather survivors, food and stats, and stop the workers.
+        :returns: list of surviving organisms, generation stats
+        '''
+        results = self.call('collect')
+        self.close()
+
+        stats = StatsAccumulator()
+        for result in results:
+            stats.merge(result['stats'])
+
+        # Food keeps its index in the caller's field
+        x, y, energy = self.foods.x.copy(), self.foods.y.copy(), self.foods.energy.copy()
+        for result in results:
+            food = result['food']
+            x[food['id']] = food['x']
+            y[food['id']] = food['y']
+            energy[food['id']] = food['energy']
+        self.foods.set(x, y, energy)
+
+        packed = concat([result['organisms'] for result in results])
+        order = np.argsort(packed['org_id'], kind='stable')
+        organisms = unpack_organisms(self.settings, select(packed, order))
+        for organism in organisms:
+            organism.id = -1
+        return organisms, stats.summary()
+
+
+    def close(self) -> None:
+        '''
+        Stop the worker processes.
+        '''
+        for conn in self.conns:
+            try:
+                conn.send(('stop', None))
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.join()
+        self.conns, self.workers = [], []
+
+
+def simulate_tiled(settings: dict, organisms: list, foods, gen: int, rng: np.random.Generator, processes: bool = True) -> tuple:
+    '''
+    Simulate a generation headless over settings['tiles'] worker processes.
+    Same contract as evo_sim.simulate(): foods are updated in place.
+    :param settings: contains dictionary of simulation config.
+    :param organisms: contains a list of organisms.
+    :param foods: contains the food field (a FoodField).
+    :param gen: integer of current generation.
+    :param rng: random stream (seeds the tiles).
+    :param processes: run tiles in worker processes (False: in this process).
+    :returns: list of surviving organisms, generation stats
+    '''
+    sim = TiledSimulation(settings, organisms, foods, gen, rng, processes)
+    try:
+        for t in range(settings['total_time_steps']):
+            if not sim.step():
+                break
+        return sim.finish()
+    finally:
+        sim.close()
@@ -0,0 +1,110 @@
+# Ensemble runner: R independent, seeded replicas of the full generation
+# loop spread over a process pool, with per-generation stats aggregated
+# as mean and 95% confidence interval across replicas.
+#
+#   python ensemble.py --replicas 16 --seed 42 --workers 8 --out ensemble.json
+
+import argparse
+import json
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from math import sqrt
+
+import numpy as np
+
+from evo_sim import run_generations
+
+# two-sided 95% t critical values for 1..30 degrees of freedom
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def run_replica(settings: dict, seed: np.random.SeedSequence, replica: int = 0) -> list:
+    '''
+    Run one headless replica of the generation loop on its own random stream.
+    With settings['lineage_dir'] set, the replica records its lineage in
+    its own replica_<i> subdirectory.
+    :param settings: simulation configurations.
+    :param seed: seed of the replica's stream.
+    :param replica: index of the replica.
+    :returns: list of per-generation stats.
+    '''
+    settings = dict(settings, render=False, record=False, checkpoint_every=0, instrument=False, profile=False, metrics_dir=None)
+    if settings['lineage_dir']:
+        settings['lineage_dir'] = os.path.join(settings['lineage_dir'], 'replica_'+str(replica))
+    return run_generations(settings, np.random.default_rng(seed), verbose=False)
+
+
+def aggregate(histories: list) -> list:
+    '''
+    Mean and 95% confidence interval of every stat across replicas, per
+    generation. Generations only count the replicas that reached them.
+    :param histories: per-replica lists of per-generation stats.
+    :returns: list (one entry per generation) of {stat: summary}.
+    '''
+    summary = []
+    for gen in range(max(len(history) for history in histories)):
+        reached = [history[gen] for history in histories if len(history) > gen]
+        n = len(reached)
+
+        gen_summary = {}
+        for key in reached[0]:
+            values = np.array([stats[key] for stats in reached], dtype=float)
+            mean = values.mean()
+            half = 0.0
+            if n > 1:
+                t = T_95[n - 2] if n - 1 <= len(T_95) else 1.96
+                half = t * values.std(ddof=1) / sqrt(n)
+            gen_summary[key] = {'mean': mean, 'ci_low': mean - half, 'ci_high': mean + half, 'n': n}
+        summary.append(gen_summary)
+
+    return summary
+
+
+def run_ensemble(settings: dict, replicas: int, seed: int = 0, workers: int = None) -> dict:
+    '''
+    Run independent replicas across a process pool. Replica i always uses
+    the i-th stream spawned from seed, regardless of the worker count.
+    :param settings: simulation configurations.
+    :param replicas: number of replicas.
+    :param seed: root seed of the ensemble.
+    :param workers: number of worker processes (defaults to CPU count).
+    :returns: dict with the per-replica histories and their summary.
+    '''
+    seeds = np.random.SeedSequence(seed).spawn(replicas)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        histories = list(pool.map(run_replica, [settings] * replicas, seeds, range(replicas)))
+
+    return {'seed': seed, 'replicas': histories, 'summary': aggregate(histories)}
+
+
+def main(argv: list = None) -> None:
+    from config import settings
+
+    parser = argparse.ArgumentParser(description='Run a seeded ensemble of NEOS evolution replicas.')
+    parser.add_argument('--replicas', type=int, default=8, help='number of replicas')
+    parser.add_argument('--seed', type=int, default=0, help='root seed')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--gens', type=int, default=settings['gens'], help='generations per replica')
+    parser.add_argument('--out', default=None, help='write results as json')
+    args = parser.parse_args(argv)
+
+    settings = dict(settings, gens=args.gens)
+    results = run_ensemble(settings, args.replicas, args.seed, args.workers)
+
+    for gen, stats in enumerate(results['summary']):
+        avg = stats['AVG']
+        print('> GEN:', gen, 'REPLICAS:', avg['n'],
+              'AVG: %.3f [%.3f, %.3f]' % (avg['mean'], avg['ci_low'], avg['ci_high']),
+              'BEST: %.3f' % stats['BEST']['mean'],
+              'FOOD EATEN: %.1f' % stats['SUM']['mean'])
+
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,253 +1,732 @@
-import operator
-from matplotlib.animation import PillowWriter
+import os
 
 from NEOS import *
+from backends import get_backend
 from food import *
+from population import Population
+from population import precision
+from sensors import SensorStage
+from spatial import UniformGrid
+from stats import MetricsLog
+from stats import StatsAccumulator
 from utils import *
-from plotting import *
 
 from math import floor
-from random import randint
-from random import random
-from random import sample
-from random import uniform
 
-def evolve_gen(settings: dict, organisms_old: list, gen: int) -> list:
+# distance at which organisms eat food and mate
+CONTACT_RADIUS = 0.075
+
+# what happens when a population reaches settings['max_pop']
+CAP_POLICIES = ('stop', 'block', 'cull')
+
+def new_organism(settings: dict, i: int, rng: np.random.Generator = None):
+    '''
+    Create a gen 0 NEOS with random weights and lifespan.
+    :param settings: contains dictionary of simulation config.
+    :param i: organism number (used in its name).
+    :param rng: random stream (defaults to the shared stream).
+    :returns: NEOS
+    '''
+    rng = get_rng(rng)
+    dtype = precision(settings)
+    wih_init = rng.uniform(-1, 1, (settings['hidden_nodes'], settings['inner_nodes'])).astype(dtype, copy=False)    # mlp weights (input -> hidden)
+    who_init = rng.uniform(-1, 1, (settings['outer_nodes'], settings['hidden_nodes'])).astype(dtype, copy=False)    # mlp weights (hidden -> output)
+    lifespan = int(rng.integers(settings['lifespan_lower'], settings['lifespan_upper'] + 1))
+    return NEOS(settings, 'lightgreen', lifespan, None, None, wih_init, who_init, name='gen[0]-org['+str(i)+']', gen=0, rng=rng)
+
+
+def new_world(settings: dict, rng: np.random.Generator = None) -> tuple:
+    '''
+    Initial food and gen 0 organisms of a run.
+    :param settings: contains dictionary of simulation config.
+    :param rng: random stream (defaults to the shared stream).
+    :returns: list of organisms, FoodField
+    '''
+    rng = get_rng(rng)
+
+    # init food to the environment
+    foods = FoodField(settings, rng)
+
+    # init organisms to the environemnt
+    organisms = []
+    for i in range(0,settings['pop_size']):
+        organisms.append(new_organism(settings, i, rng))
+
+    return organisms, foods
+
+
+def select_parents(elitism_num: int, num: int, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Truncation selection: draw num pairs of distinct parents from the top
+    elitism_num organisms.
+    :param elitism_num: number of elite organisms to choose from.
+    :param num: number of pairs.
+    :param rng: random stream.
+    :returns: (num, 2) array of elite ranks.
+    '''
+    if elitism_num < 2:
+        raise ValueError('need at least 2 elite organisms to select parents, got '+str(elitism_num))
+    first = rng.integers(0, elitism_num, num)
+    second = rng.integers(0, elitism_num - 1, num)
+    second += second >= first
+    return np.stack([first, second], axis=1)
+
+
+def crossover(wih_1: np.ndarray, who_1: np.ndarray, wih_2: np.ndarray, who_2: np.ndarray, weight: np.ndarray, out: tuple = None) -> tuple:
+    '''
+    Blend the genomes of parent pairs, one crossover weight per child.
+    :param wih_1: (C, hidden, inner) weights of the first parents.
+    :param who_1: (C, outer, hidden) weights of the first parents.
+    :param wih_2: (C, hidden, inner) weights of the second parents.
+    :param who_2: (C, outer, hidden) weights of the second parents.
+    :param weight: (C,) crossover weights.
+    :param out: preallocated (wih, who) rows to write the children into.
+    :returns: wih, who of the children.
+    '''
+    if out is None:
+        out = (np.empty_like(wih_1), np.empty_like(who_1))
+    wih, who = out
+    w = weight[:, None, None]
+    np.multiply(w, wih_1, out=wih)
+    wih += (1 - w) * wih_2
+    np.multiply(w, who_1, out=who)
+    who += (1 - w) * who_2
+    return wih, who
+
+
+def mutate_genomes(settings: dict, wih: np.ndarray, who: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Mutate children in place. With probability settings['mutate'] a child
+    has either one wih row or one who weight scaled by U(0.9, 1.1) and
+    clipped to [-1, 1].
+    :param settings: contains dictionary of simulation config.
+    :param wih: (C, hidden, inner) weights of the children.
+    :param who: (C, outer, hidden) weights of the children.
+    :param rng: random stream.
+    :returns: (C,) mask of the mutated children.
+    '''
+    num = len(wih)
+    mutated = rng.random(num) <= settings['mutate']
+    mat_pick = rng.integers(0, 2, num)
+    factor = rng.uniform(0.9, 1.1, num)
+
+    # Mutate: WIH Weights
+    k = np.flatnonzero(mutated & (mat_pick == 0))
+    rows = rng.integers(0, settings['hidden_nodes'], len(k))
+    wih[k, rows] = np.clip(wih[k, rows] * factor[k, None], -1, 1)
+
+    # Mutate: WHO Weights
+    k = np.flatnonzero(mutated & (mat_pick == 1))
+    rows = rng.integers(0, settings['outer_nodes'], len(k))
+    cols = rng.integers(0, settings['hidden_nodes'], len(k))
+    who[k, rows, cols] = np.clip(who[k, rows, cols] * factor[k], -1, 1)
+
+    return mutated
+
+
+def evolve_gen(settings: dict, organisms_old: list, gen: int, rng: np.random.Generator = None, archive=None) -> list:
     ''' 
     Evolve next generation of NEOS by crossing over genes
-    and then mutating them.
+    and then mutating them. The genomes of the new generation share one
+    contiguous arena: elites are copied into its first rows and all
+    children are bred at once into the rest.
     :param settings: contains dictionary of simulation config.
     :param organisms_old: contains a list of previous gen organisms.
     :param gen: integer of current generation.
-    :param count: number of organisms from previous gen.
-    :param sum: number of food eaten from previous gen.
+    :param rng: random stream (defaults to the shared stream).
+    :param archive: LineageArchive recording the new organisms (None to disable).
     :returns: list of new organisms.
     '''
+    rng = get_rng(rng)
+
     # Elitism (Keep the best performing organisms)
     elitism_num = int(floor(settings['elitism'] * settings['pop_size']))
-    orgs_sorted = sorted(organisms_old, key=operator.attrgetter('fitness'), reverse=True)
+    fitness = np.array([organism.fitness for organism in organisms_old])
+    orgs_sorted = [organisms_old[i] for i in np.argsort(-fitness, kind='stable')]
     organisms_new = []
     if len(organisms_old) < elitism_num:
         elitism_num = len(organisms_old)
 
     # Add a gen 0 NEOS to get pairs for new generation
     if elitism_num % 2 != 0:
-        wih_init = np.random.uniform(-1, 1, (settings['hidden_nodes'], settings['inner_nodes']))     # mlp weights (input -> hidden)
-        who_init = np.random.uniform(-1, 1, (settings['outer_nodes'], settings['hidden_nodes']))     # mlp weights (hidden -> output)
-        lifespan = randint(settings['lifespan_lower'], settings['lifespan_upper']) 
-        organisms_new.append(NEOS(settings, 'lightgreen', lifespan, None, None, wih_init, who_init, name='gen[0]-org['+str(0)+']', gen=0))
+        organisms_new.append(new_organism(settings, 0, rng))
+
+    # Genome arena of the new generation (elites, then children)
+    num_new_orgs = max(settings['pop_size'] - elitism_num, 0)
+    dtype = precision(settings)
+    wih_arena = np.empty((elitism_num + num_new_orgs, settings['hidden_nodes'], settings['inner_nodes']), dtype=dtype)
+    who_arena = np.empty((elitism_num + num_new_orgs, settings['outer_nodes'], settings['hidden_nodes']), dtype=dtype)
+    wih_elite, wih_new = wih_arena[:elitism_num], wih_arena[elitism_num:]
+    who_elite, who_new = who_arena[:elitism_num], who_arena[elitism_num:]
 
     # Add top surviving NEOS
     for i in range(0, elitism_num):
-        organisms_new.append(NEOS(settings, color=orgs_sorted[i].color, lifespan=orgs_sorted[i].lifespan, wih=orgs_sorted[i].wih, who=orgs_sorted[i].who, name=orgs_sorted[i].name, gen=orgs_sorted[i].gen))
+        wih_elite[i] = orgs_sorted[i].wih
+        who_elite[i] = orgs_sorted[i].who
+        organisms_new.append(NEOS(settings, color=orgs_sorted[i].color, lifespan=orgs_sorted[i].lifespan, wih=wih_elite[i], who=who_elite[i], name=orgs_sorted[i].name, gen=orgs_sorted[i].gen, rng=rng))
+
+    # Lineage records (elites descend from their record in this generation)
+    if archive is not None:
+        from lineage import ELITE
+        from lineage import FOUNDER
+        from lineage import record_organisms
+
+        elite_lineage = np.array([orgs_sorted[i].lineage for i in range(elitism_num)], dtype=np.int64)
+        filler = len(organisms_new) - elitism_num
+        record_organisms(archive, organisms_new[:filler], gen + 1, FOUNDER, -1)
+        record_organisms(archive, organisms_new[filler:], gen + 1, ELITE, elite_lineage)
 
     # Generate new organisms
-    num_new_orgs = settings['pop_size'] - elitism_num
+    if num_new_orgs <= 0:
+        return organisms_new
+
+    # Selection (Truncation Selection)
+    parents = select_parents(elitism_num, num_new_orgs, rng)
+
+    # Crossover
+    crossover_weight = rng.random(num_new_orgs)
+    crossover(wih_elite[parents[:, 0]], who_elite[parents[:, 0]], wih_elite[parents[:, 1]], who_elite[parents[:, 1]],
+              crossover_weight, out=(wih_new, who_new))
+
+    # Mutation
+    mutate_genomes(settings, wih_new, who_new, rng)
+
+    # Mutate: Color
+    next_gen = gen + 1
+    colors_new = pick_colors(np.full(num_new_orgs, next_gen), rng)
+
+    # Mutate: lifespan
+    lifespans = rng.integers(settings['lifespan_lower'], settings['lifespan_upper'] + 1, num_new_orgs)
+
     for w in range(0, num_new_orgs):
+        organisms_new.append(NEOS(settings, color=colors_new[w], lifespan=int(lifespans[w]), x=None, y=None, wih=wih_new[w], who=who_new[w], name='gen['+str(gen)+']-org['+str(w)+']', gen=next_gen, rng=rng))
 
-        # Selection (Truncation Selection)
-        candidates = range(0, elitism_num)
-        random_index = sample(candidates, 2)
-        org_1 = orgs_sorted[random_index[0]]
-        org_2 = orgs_sorted[random_index[1]]
+    if archive is not None:
+        from lineage import OFFSPRING
 
-        # Crossover
-        crossover_weight = random()
-        wih_new = (crossover_weight * org_1.wih) + ((1 - crossover_weight) * org_2.wih)
-        who_new = (crossover_weight * org_1.who) + ((1 - crossover_weight) * org_2.who)
+        record_organisms(archive, organisms_new[-num_new_orgs:], next_gen, OFFSPRING, elite_lineage[parents[:, 0]], elite_lineage[parents[:, 1]])
 
-        # Mutation
-        mutate = random()
-        if mutate <= settings['mutate']:
+    return organisms_new
 
-            # Pick which weight to mutate
-            mat_pick = randint(0,1)
 
-            # Mutate: WIH Weights
-            if mat_pick == 0:
-                index_row = randint(0,settings['hidden_nodes']-1)
-                wih_new[index_row] = wih_new[index_row] * uniform(0.9, 1.1)
-                if wih_new[index_row] >  1: wih_new[index_row] = 1
-                if wih_new[index_row] < -1: wih_new[index_row] = -1
+def contact_grid(settings: dict, x: np.ndarray, y: np.ndarray, index: np.ndarray = None, grid: type = UniformGrid) -> UniformGrid:
+    '''
+    Cell list with CONTACT_RADIUS cells, so every contact is found in the
+    3x3 block of cells around a query.
+    :param settings: dictionary of simulation settings.
+    :param x: x positions.
+    :param y: y positions.
+    :param index: ids reported for the points.
+    :param grid: grid class (from the compute backend).
+    :returns: UniformGrid
+    '''
+    grid = grid(settings['x_min'], settings['x_max'], settings['y_min'], settings['y_max'], CONTACT_RADIUS)
+    grid.build(x, y, index)
+    return grid
 
-            # Mutate: WHO Weights
-            if mat_pick == 1:
-                index_row = randint(0,settings['outer_nodes']-1)
-                index_col = randint(0,settings['hidden_nodes']-1)
-                who_new[index_row][index_col] = who_new[index_row][index_col] * uniform(0.9, 1.1)
-                if who_new[index_row][index_col] >  1: who_new[index_row][index_col] = 1
-                if who_new[index_row][index_col] < -1: who_new[index_row][index_col] = -1
 
-        # Mutate: Color
-        next_gen = gen + 1
-        color_new = pick_color(next_gen)
+def eat(settings: dict, organisms: Population, foods: FoodField, rng: np.random.Generator = None, grid: type = UniformGrid) -> int:
+    '''
+    Find every food/organism contact and let the first organism touching
+    each food particle eat it. Eaten food regrows (see FoodField).
+    :param settings: dictionary of simulation settings.
+    :param organisms: population of organisms.
+    :param foods: food field.
+    :param rng: random stream (defaults to the shared stream).
+    :param grid: grid class (from the compute backend).
+    :returns: number of food particles eaten.
+    '''
+    n = len(organisms)
+    if n == 0 or not foods:
+        return 0
 
-        # Mutate: lifespan
-        lifespan = randint(settings['lifespan_lower'], settings['lifespan_upper'])
+    # Food around every organism, ordered by food then organism: keep the first per food
+    eater, eaten, _ = foods.bins(grid).within(organisms.x[:n], organisms.y[:n], CONTACT_RADIUS)
+    order = np.lexsort((eater, eaten))
+    eater, eaten = eater[order], eaten[order]
+    first = np.ones(len(eaten), dtype=bool)
+    first[1:] = eaten[1:] != eaten[:-1]
+    eaten, eater = eaten[first], eater[first]
 
-        organisms_new.append(NEOS(settings, color=color_new, lifespan=lifespan, x=None, y=None, wih=wih_new, who=who_new, name='gen['+str(gen)+']-org['+str(w)+']', gen=next_gen))
+    # Update fitness function
+    organisms.add_fitness(eater, foods.energy[eaten].astype(organisms.fitness.dtype))
+    foods.consume(eaten, rng)
+    foods.regrow(rng)
 
-    return organisms_new
+    return len(eaten)
 
 
-def reproduce(settings: dict, organisms: list, organism1, organism2, gen: int, count: int) -> None:
+def mate(settings: dict, organisms: Population, threshold: int, gen: int, count: int, rng: np.random.Generator = None, grid: type = UniformGrid) -> tuple:
     '''
-    Reproduction of two organisms to create an organism with crossed 
-    genes of the parents.
-    :param settings: dictionary of simultation settings
-    :param organisms: list of organisms 
-    :param organism1: parent 1
-    :param organism2: parent 2
-    :param gen: current generation
-    :param count: new organism count
-    :return: None
+    Find every pair of mature organisms above the fitness threshold that
+    are in contact, and breed one child per ordered pair. Only mutated
+    offspring are born. Children are returned rather than added, so the
+    population is unchanged during the step.
+    :param settings: dictionary of simulation settings.
+    :param organisms: population of organisms.
+    :param threshold: boundary fitness of elite organisms.
+    :param gen: current generation.
+    :param count: new organism count.
+    :param rng: random stream (defaults to the shared stream).
+    :param grid: grid class (from the compute backend).
+    :returns: list of children, (k, 2) lineage record ids of their parents,
+    number of mating pairs
     '''
-    # Crossover
-    crossover_weight = random()
-    wih_new = (crossover_weight * organism1.wih) + ((1 - crossover_weight) * organism2.wih)
-    who_new = (crossover_weight * organism1.who) + ((1 - crossover_weight) * organism2.who)
+    rng = get_rng(rng)
+    n = len(organisms)
+    ready = np.flatnonzero((organisms.fitness[:n] > threshold) & (organisms.age[:n] > settings['mature']))
+    if len(ready) < 2:
+        return [], np.zeros((0, 2), dtype=np.int64), 0
+
+    x = organisms.x[:n]
+    y = organisms.y[:n]
+    grid = contact_grid(settings, x[ready], y[ready], ready, grid)
+    q, mate_2, _ = grid.within(x[ready], y[ready], CONTACT_RADIUS, exclude=ready)
+    mate_1 = ready[q]
+    pairs = len(mate_1)
+    if pairs == 0:
+        return [], np.zeros((0, 2), dtype=np.int64), 0
+
+    # Reset distance and heading to nearest mate
+    organisms.d_org[mate_1] = 100
+    organisms.r_org[mate_1] = 0
+
+    # Crossover and mutation
+    crossover_weight = rng.random(pairs)
+    wih_new, who_new = crossover(organisms.wih[mate_1], organisms.who[mate_1],
+                                 organisms.wih[mate_2], organisms.who[mate_2], crossover_weight)
+    born = np.flatnonzero(mutate_genomes(settings, wih_new, who_new, rng))
+
+    # Mutate: Color and lifespan
+    next_gen = np.maximum(organisms.gen[mate_1[born]], organisms.gen[mate_2[born]]) + 1
+    colors_new = pick_colors(next_gen, rng)
+    lifespans = rng.integers(settings['lifespan_lower'], settings['lifespan_upper'] + 1, len(born))
+
+    children = []
+    for k, b in enumerate(born.tolist()):
+        parent = mate_1[b]
+        children.append(NEOS(settings, color=colors_new[k], lifespan=int(lifespans[k]), x=x[parent], y=y[parent], wih=wih_new[b], who=who_new[b], name='gen['+str(gen)+']-org['+str(count + b)+']', gen=int(next_gen[k]), rng=rng))
+
+    parents = np.stack([organisms.lineage[mate_1[born]], organisms.lineage[mate_2[born]]], axis=1)
+    return children, parents, pairs
+
+
+def sense(settings: dict, organisms: Population, foods: FoodField, threshold: int, grid: type = UniformGrid) -> None:
+    '''
+    Update distance and heading to the nearest food particle for every
+    organism, and to the nearest mate (fitness above threshold) for
+    organisms past 75% of their lifespan. Unlike mate() and the 'mate'
+    sensor, mates here are not required to be older than
+    settings['mature'], as in the original model.
+    :param settings: dictionary of simulation settings.
+    :param organisms: population of organisms.
+    :param foods: food field.
+    :param threshold: boundary fitness of elite organisms.
+    :param grid: grid class (from the compute backend).
+    :returns: None
+    '''
+    n = len(organisms)
+    if not foods:
+        return
 
-    # Mutation
-    mutate = random()
-    if mutate <= settings['mutate']:
+    # Reset distance and heading to nearest food
+    organisms.d_food[:n] = 100
+    organisms.r_food[:n] = 0
 
-        # Pick which weight to mutate
-        mat_pick = randint(0,1)
+    # A lone organism has nothing to compare against
+    if n < 2:
+        return
 
-        # Mutate: WIH Weights
-        if mat_pick == 0:
-            index_row = randint(0,settings['hidden_nodes']-1)
-            wih_new[index_row] = wih_new[index_row] * uniform(0.9, 1.1)
-            if wih_new[index_row] >  1: wih_new[index_row] = 1
-            if wih_new[index_row] < -1: wih_new[index_row] = -1
+    x = organisms.x[:n]
+    y = organisms.y[:n]
+    r = organisms.r[:n]
 
-        # Mutate: WHO Weights
-        if mat_pick == 1:
-            index_row = randint(0,settings['outer_nodes']-1)
-            index_col = randint(0,settings['hidden_nodes']-1)
-            who_new[index_row][index_col] = who_new[index_row][index_col] * uniform(0.9, 1.1)
-            if who_new[index_row][index_col] >  1: who_new[index_row][index_col] = 1
-            if who_new[index_row][index_col] < -1: who_new[index_row][index_col] = -1
+    # Nearest food particle
+    d, idx = foods.bins(grid).nearest(x, y)
 
-        # Mutate: Color
-        next_gen = max([organism1.gen, organism2.gen]) + 1
-        color_new = pick_color(next_gen)
+    closer = np.flatnonzero(d < organisms.d_food[:n])
+    organisms.d_food[closer] = d[closer]
+    organisms.r_food[closer] = calc_headings(x[closer], y[closer], r[closer], foods.x[idx[closer]], foods.y[idx[closer]])
 
-        # Mutate: lifespan
-        lifespan = randint(settings['lifespan_lower'], settings['lifespan_upper'])
+    # Nearest mate for organisms nearing the end of their lifespan
+    seekers = np.flatnonzero(organisms.age[:n] > organisms.lifespan[:n]*0.75)
+    mates = np.flatnonzero(organisms.fitness[:n] > threshold)
+    if len(seekers) == 0 or len(mates) == 0:
+        return
 
-        organisms.append(NEOS(settings, color=color_new, lifespan=lifespan, x=organism1.x, y=organism1.y, wih=wih_new, who=who_new, name='gen['+str(gen)+']-org['+str(count)+']', gen=next_gen))
+    mate_grid = grid.for_points(settings, len(mates))
+    mate_grid.build(x[mates], y[mates], mates)
+    d, idx = mate_grid.nearest(x[seekers], y[seekers], exclude=seekers)
 
+    closer = d < organisms.d_org[seekers]
+    seekers, d, idx = seekers[closer], d[closer], idx[closer]
+    organisms.d_org[seekers] = d
+    organisms.r_org[seekers] = calc_headings(x[seekers], y[seekers], r[seekers], x[idx], y[idx])
 
-def simulate(settings: dict, organisms: list, foods: list, gen: int, fig, ax) -> tuple:
+
+class Simulation():
+    '''
+    Time-step engine for one generation of NEOS. Holds no rendering
+    state, so it can run headless or be driven by a renderer.
+    '''
+    def __init__(self, settings: dict, organisms: list, foods: FoodField, gen: int, rng: np.random.Generator = None, inst=None, metrics: MetricsLog = None, archive=None):
+        self.settings = settings
+        self.rng = get_rng(rng)
+        self.inst = inst            # Instrument (None when disabled)
+        self.metrics = metrics      # MetricsLog (None when disabled)
+        self.archive = archive      # LineageArchive (None when disabled)
+        self.backend = get_backend(settings['backend'])    # step math (backends.py)
+        self.sensors = SensorStage(settings, self.backend.grid)     # neural net inputs (sensors.py)
+        if settings['cap_policy'] not in CAP_POLICIES:
+            raise ValueError('cap_policy must be one of '+str(CAP_POLICIES)+', not '+repr(settings['cap_policy']))
+        self.organisms = Population(organisms, settings['elitism'], settings['max_pop'], precision(settings))
+        self.foods = foods
+        self.gen = gen
+
+        self.stats = StatsAccumulator()     # streaming fitness stats of the generation
+        self.count = 0              # new organism count
+        self.steps = 0              # time steps completed
+
+
+    def step(self) -> bool:
+        '''
+        Advance the generation by one time step.
+        :returns: False once the generation has ended early.
+        '''
+        settings = self.settings
+        organisms = self.organisms
+        foods = self.foods
+        gen = self.gen
+        inst = self.inst
+        if inst:
+            inst.mark()
+
+        # Update fitness function
+        eaten = eat(settings, organisms, foods, self.rng, self.backend.grid)
+        if inst:
+            inst.lap('eat')
+
+        # Fitness threshold (maintained by the population)
+        threshold = organisms.fitness_threshold
+
+        # Calculate heading to nearest food and mate
+        sense(settings, organisms, foods, threshold, self.backend.grid)
+        if inst:
+            inst.lap('sense')
+
+        # Organism reproduction
+        births, parents, pairs = mate(settings, organisms, threshold, gen, self.count, self.rng, self.backend.grid)
+        self.count += pairs
+        if inst:
+            inst.lap('mate')
+
+        # Old age organisms die off
+        deaths = np.flatnonzero(organisms.age[:len(organisms)] >= organisms.lifespan[:len(organisms)])
+
+        # Keep the population within its cap
+        births, deaths = self.admit(births, deaths)
+        parents = parents[:len(births)]
+        self.count += len(deaths)
+
+        # Apply deaths and births once all contacts are resolved
+        self.stats.record_deaths(organisms.fitness[deaths])
+        self.stats.record_births(len(births))
+        if self.archive is not None:
+            self.archive.died(organisms.lineage[deaths], self.steps, organisms.fitness[deaths])
+        organisms.remove_rows(deaths)
+        organisms.extend(births)
+        if self.archive is not None and births:
+            self.record_births(len(births), parents)
+        if inst:
+            inst.lap('birth_death')
+
+        # End simulation if all organisms are gone
+        if len(organisms) == 0:
+            if inst:
+                inst.end_step(gen, self.steps, 0, len(births), len(deaths))
+            if self.metrics:
+                self.metrics.step(gen, self.steps, organisms, len(births), len(deaths), eaten)
+            print("GEN "+str(gen)+" DID NOT SURVIVE...")
+            return False
+
+        # Get organism response and update position and velocity
+        inputs = self.sensors.inputs(organisms, foods, threshold)
+        if inst:
+            self.backend.think(organisms, inputs)
+            inst.lap('think')
+            self.backend.integrate(settings, organisms)
+            inst.lap('move')
+            inst.end_step(gen, self.steps, len(organisms), len(births), len(deaths))
+        else:
+            self.backend.advance(settings, organisms, inputs)
+        if self.metrics:
+            self.metrics.step(gen, self.steps, organisms, len(births), len(deaths), eaten)
+        self.steps += 1
+
+        # Too many NEOS
+        if settings['cap_policy'] == 'stop' and settings['max_pop'] is not None and len(organisms) > settings['max_pop']:
+            print("OVERPOPULATION - ENDING SIM...")
+            return False
+
+        return True
+
+
+    def admit(self, births: list, deaths: np.ndarray) -> tuple:
+        '''
+        Apply the cap policy to a step's births and deaths. With 'block'
+        births beyond the free rows are dropped; with 'cull' the organisms
+        with the lowest fitness (oldest id first on ties) die to make room.
+        With 'stop' (or no cap) nothing changes here and step() ends the
+        generation once the cap is exceeded.
+        :param births: children born this step.
+        :param deaths: rows of organisms dying this step.
+        :returns: admitted births, rows of all organisms dying
+        '''
+        cap = self.settings['max_pop']
+        policy = self.settings['cap_policy']
+        organisms = self.organisms
+        if cap is None or policy == 'stop':
+            return births, deaths
+
+        room = cap - (len(organisms) - len(deaths))
+        if len(births) <= room:
+            return births, deaths
+        if policy == 'block':
+            return births[:max(room, 0)], deaths
+
+        # cull: lowest fitness among organisms not already dying
+        living = np.ones(len(organisms), dtype=bool)
+        living[deaths] = False
+        living = np.flatnonzero(living)
+        order = np.lexsort((organisms.id[living], organisms.fitness[living]))
+        culled = living[order[:len(births) - room]]
+        return births[:cap], np.concatenate([deaths, culled])
+
+
+    def record_births(self, k: int, parents: np.ndarray) -> None:
+        '''
+        Record the children that took the last k rows in the lineage archive.
+        :param k: number of children.
+        :param parents: (k, 2) lineage record ids of their parents.
+        :returns: None
+        '''
+        from lineage import MATED
+
+        organisms = self.organisms
+        rows = slice(len(organisms) - k, len(organisms))
+        wih = who = None
+        if self.archive.genomes is not None:
+            wih, who = organisms.wih[rows], organisms.who[rows]
+        organisms.lineage[rows] = self.archive.born(parents[:, 0], parents[:, 1], self.gen, MATED, self.steps,
+                                                    organisms.lifespan[rows], wih, who)
+
+
+    def finish(self) -> dict:
+        '''
+        Add the survivors to the generation stats (and close their lineage
+        records).
+        :returns: generation stats.
+        '''
+        organisms = self.organisms
+        self.stats.record_survivors(organisms.fitness[:len(organisms)])
+        if self.archive is not None:
+            from lineage import SURVIVED
+
+            n = len(organisms)
+            self.archive.died(organisms.lineage[:n], self.steps, organisms.fitness[:n], SURVIVED)
+        stats = self.stats.summary()
+        if self.metrics:
+            self.metrics.generation(self.gen, stats)
+        return stats
+
+
+def simulate(settings: dict, organisms: list, foods: FoodField, gen: int, fig=None, ax=None, rng: np.random.Generator = None, inst=None, metrics: MetricsLog = None, sinks: list = (), archive=None) -> tuple:
     ''' 
-    Simulate current generation of NEOS through time steps and
-    saving plot frames into an animation.
+    Simulate current generation of NEOS through time steps. Every
+    settings['frame_stride']-th frame is saved into an animation when a
+    figure is given, and appended to a trajectory log when
+    settings['record'] is set. Without either the run is headless and
+    matplotlib is never imported.
     :param settings: contains dictionary of simulation config.
     :param organisms: contains a list of organisms.
-    :param foods: contains a list of foods.
+    :param foods: contains the food field.
     :param gen: integer of current generation.
-    :param fig: plot figure.
-    :param ax: plot ax.
-    :returns: list of organisms, list of organisms that died
+    :param fig: plot figure (None for no animation).
+    :param ax: plot ax (None for no animation).
+    :param rng: random stream (defaults to the shared stream).
+    :param inst: Instrument timing each phase (None to disable).
+    :param metrics: MetricsLog streaming per-step and per-generation rows (None to disable).
+    :param sinks: more frame sinks, as factories called with (settings, gen).
+    :param archive: LineageArchive recording births and deaths (None to disable).
+    :returns: list of surviving organisms, generation stats
     '''
-    metadata = dict(title='NEOS', artist='edng5')
-    writer = PillowWriter(fps=15, metadata=metadata)
-
-    
+    sim = Simulation(settings, organisms, foods, gen, rng, inst, metrics, archive)
+    if inst:
+        inst.begin_generation(gen)
     total_time_steps = settings['total_time_steps']
-    old_organisms = []
-    count = 0
-
-    # Save all frames into an animation
-    with writer.saving(fig, 'gen_'+str(gen)+'.gif', 100):
-        # Loop through the number of time steps
-        
-        for _ in range(0, total_time_steps, 1):
-
-            # Plot frames
-            plot_frame(settings, organisms, foods, gen, ax)
-
-            # Update fitness function
-            for food in foods:
-                for organism in organisms:
-                    food_org_dist = dist(organism.x, organism.y, food.x, food.y)
-
-                    # Update fitness function
-                    if food_org_dist <= 0.075:
-                        organism.fitness += food.energy
-                        food.respawn(settings)
-
-                    # Reset distance and heading to nearest food
-                    organism.d_food = 100
-                    organism.r_food = 0
-
-            # Calculate fitness threshold
-            threshold = boundary_fitness(organisms, settings['elitism'])
-
-            # Calculate heading to nearest food
-            for food in foods:
-                for organism1 in organisms:
-                    # Calculate distance to selected food particle
-                    food_org_dist = dist(organism1.x, organism1.y, food.x, food.y)
-                    for organism2 in organisms:
-                        # determine to go to food or find mate
-                        if organism1 != organism2:
-                            # Calculate distance to selected organism
-                            org_org_dist = dist(organism1.x, organism1.y, organism2.x, organism2.y)
-                            if organism1.age > organism1.lifespan*0.75 and organism2.fitness > threshold and org_org_dist < organism1.d_org:
-                                organism1.d_org = org_org_dist
-                                organism1.r_org = calc_heading(organism1, organism2)
-                            # Determine if this is the closest food particle
-                            elif food_org_dist < organism1.d_food:
-                                organism1.d_food = food_org_dist
-                                organism1.r_food = calc_heading(organism1, food)
-
-            # Organism reproduction
-            for organism1 in organisms:
-                for organism2 in organisms:
-                    if organism1 != organism2:
-                        org_org_dist = dist(organism1.x, organism1.y, organism2.x, organism2.y)
-
-                        if org_org_dist <= 0.075:
-                            if organism1.fitness > threshold and organism2.fitness > threshold and organism1.age > settings['mature'] and organism2.age > settings['mature']:
-                                reproduce(settings, organisms, organism1, organism2, gen, count)
-                                organism1.d_org = 100
-                                organism1.r_org = 0
-                                count += 1
-            
-            # Old age organisms die off
-            for organism in organisms:
-                if organism.too_old():
-                    old_organisms.append(organism)
-                    organisms.remove(organism)
-                    count += 1
-
-            # End simulation if all organisms are gone        
-            if len(organisms) == 0:
-                print("GEN "+str(gen)+" DID NOT SURVIVE...")
-                break
-
-            # Get organism response
-            for organism in organisms:
-                organism.think()
-
-            # Update organisms position and velocity
-            for organism in organisms:
-                organism.update_r(settings)
-                organism.update_vel(settings)
-                organism.update_pos(settings)
-                organism.update_age()
-
-
-            # Too many NEOS
-            if len(organisms) > 150:
-                print("OVERPOPULATION - ENDING SIM...")
-                break
-
-            # Grab current plot to compile into an animation
-            writer.grab_frame()
-            ax.clear()
-            ax.set_facecolor(plt.cm.Blues(.2))
-
-    return organisms, old_organisms
+    stride = settings['frame_stride']
+
+    # Frame sinks
+    sinks = [make(settings, gen) for make in sinks]
+    if settings['record']:
+        from trajectory import TrajectoryRecorder
+        sinks.append(TrajectoryRecorder(settings, gen, os.path.join(settings['trajectory_dir'], 'gen_'+str(gen)+'.traj')))
+    if fig is not None:
+        from plotting import Renderer
+        sinks.append(Renderer(settings, gen, fig, ax, path='gen_'+str(gen)+'.gif'))
+
+    # Loop through the number of time steps
+    for t in range(0, total_time_steps, 1):
+        if sinks and t % stride == 0:
+            if inst:
+                inst.mark()
+            for sink in sinks:
+                sink.frame(sim.organisms, foods)
+            if inst:
+                inst.lap('frame')
+
+        if not sim.step():
+            break
+
+    for sink in sinks:
+        sink.close()
+    if inst:
+        inst.end_generation(gen)
+
+    stats = sim.finish()
+    return list(sim.organisms), stats
+
+
+def run_generations(settings: dict, rng: np.random.Generator = None, verbose: bool = True, resume: str = None, hooks: list = (), sinks: list = ()) -> list:
+    '''
+    Run the full generation loop: simulate each generation, collect its
+    stats and evolve the next one. Every settings['checkpoint_every']
+    generations the state of the run is saved to settings['checkpoint_path'].
+    With settings['tiles'] set, generations run headless over spatial
+    tiles (see domain.py). With settings['cache_dir'] set, generations
+    already simulated from the same inputs are loaded from the result
+    cache (see cache.py) instead; generations that are rendered, recorded,
+    viewed live, instrumented or logged per step are always simulated, as
+    are all generations of runs that record lineage. With
+    settings['lineage_dir'] set, every organism born is recorded in a
+    lineage archive (see lineage.py).
+    :param settings: contains dictionary of simulation config.
+    :param rng: random stream (defaults to the shared stream).
+    :param verbose: print progress and stats.
+    :param resume: checkpoint to continue from (replaces rng).
+    :param hooks: callables receiving the per-step and per-generation
+    instrumentation records (see instrument.py).
+    :param sinks: frame sink factories for every simulated, untiled
+    generation (see viewer.py).
+    :returns: list of per-generation stats.
+    '''
+    inst = None
+    if settings['instrument'] or settings['profile'] or hooks:
+        from instrument import from_settings
+
+        inst = from_settings(settings, hooks)
+
+    metrics = None
+    if settings['metrics_dir']:
+        metrics = MetricsLog(settings['metrics_dir'])
+
+    cache = None
+    if settings['cache_dir'] and not (inst or metrics or settings['record'] or sinks or settings['lineage_dir']):
+        from cache import ResultCache
+
+        cache = ResultCache(settings['cache_dir'], settings['cache_size_mb'])
+
+    if resume is not None:
+        from checkpoint import load_checkpoint
+
+        state = load_checkpoint(resume, settings)
+        organisms, foods, start, rng, history = state['organisms'], state['foods'], state['gen'], state['rng'], state['history']
+        if verbose:
+            print("RESUMING FROM "+resume+" AT GEN "+str(start)+".\n")
+    else:
+        rng = get_rng(rng)
+        organisms, foods = new_world(settings, rng)
+        start = 0
+        history = []
+
+    archive = None
+    if settings['lineage_dir']:
+        from lineage import FOUNDER
+        from lineage import LineageArchive
+        from lineage import record_organisms
+
+        genome = (settings['hidden_nodes'], settings['inner_nodes'], settings['outer_nodes']) if settings['lineage_genomes'] else None
+        archive = LineageArchive(settings['lineage_dir'], genome, precision(settings))
+        archive.rewind(start if resume is not None else None)
+
+        # organisms without a record (new run, or saved before the archive was)
+        unrecorded = [organism for organism in organisms if not 0 <= organism.lineage < archive.next_id]
+        record_organisms(archive, unrecorded, start, FOUNDER, -1)
+
+    # Loop through each generation
+    for gen in range(start, settings['gens']):
+
+        # simulation
+        if verbose:
+            print("SIMULATING GEN "+str(gen)+". PLEASE WAIT...")
+
+        # look the generation up in the result cache
+        key, hit = None, None
+        if cache and not render_gen(settings, gen):
+            key = cache.key(settings, gen, organisms, foods, rng)
+            hit = cache.get(key, settings, foods, rng)
+
+        if hit is not None:
+            organisms, stats = hit
+            if verbose:
+                print("LOADED GEN "+str(gen)+" FROM THE RESULT CACHE.")
+        elif settings['tiles']:
+            from domain import simulate_tiled
+
+            organisms, stats = simulate_tiled(settings, organisms, foods, gen, rng, settings['tile_processes'])
+        elif render_gen(settings, gen):
+            from plotting import new_figure
+
+            fig, ax = new_figure()
+            organisms, stats = simulate(settings, organisms, foods, gen, fig, ax, rng, inst, metrics, sinks, archive)
+        else:
+            organisms, stats = simulate(settings, organisms, foods, gen, rng=rng, inst=inst, metrics=metrics, sinks=sinks, archive=archive)
+
+        if key is not None and hit is None:
+            cache.put(key, settings, organisms, foods, rng, stats)
+
+        # collect stats
+        history.append(stats)
+        if verbose:
+            print('> GEN:',gen,'BEST:',stats['BEST'],'AVG:',stats['AVG'],'WORST:',stats['WORST'],'SURVIVED:',stats['SURVIVED'],'DIED:',stats['DIED'],'TOTAL NEOS:',stats['COUNT'],'FOOD EATEN:',stats['SUM'])
+
+        # organisms died off
+        if len(organisms) == 0:
+            if verbose:
+                print("DONE SIMULATING GEN "+str(gen)+".\n")
+            break
+
+        # add next generation of organisms
+        organisms = evolve_gen(settings, organisms, gen, rng, archive)
+
+        # save the run so it can be resumed from the next generation
+        if settings['checkpoint_every'] and (gen + 1) % settings['checkpoint_every'] == 0:
+            from checkpoint import save_checkpoint
+
+            save_checkpoint(settings['checkpoint_path'], settings, organisms, foods, gen + 1, rng, history)
+            if archive is not None:
+                archive.flush()
+            if verbose:
+                print("SAVED CHECKPOINT "+settings['checkpoint_path']+".")
+
+        if verbose:
+            print("DONE SIMULATING GEN "+str(gen)+".\n")
+
+    if inst:
+        inst.close()
+    if metrics:
+        metrics.close()
+    if archive is not None:
+        archive.close()
+
+    return history
@@ -1,21 +1,202 @@
-from random import uniform
+from math import sqrt
+
+import numpy as np
+
+from utils import get_rng
+
+# regrowth models of eaten food (settings['regrowth'])
+#
+#   'instant'     respawns at once, uniformly over the arena
+#   'fixed_rate'  stays eaten; settings['regrowth_rate'] particles per second
+#                 regrow on average, uniformly
+#   'patchy'      respawns at once, drawn from a density map of
+#                 settings['food_patches'] patches (see patch_map)
+REGROWTH = ('instant', 'fixed_rate', 'patchy')
+
+# cells per side of the patchy density map
+PATCH_CELLS = 64
 
 class food():
     '''
     Class for food particles.
     '''
-    def __init__(self, settings):
-        self.x = uniform(settings['x_min'], settings['x_max'])
-        self.y = uniform(settings['y_min'], settings['y_max'])
+    __slots__ = ('x', 'y', 'energy')
+
+    def __init__(self, settings, rng=None):
+        rng = get_rng(rng)
+        self.x = rng.uniform(settings['x_min'], settings['x_max'])
+        self.y = rng.uniform(settings['y_min'], settings['y_max'])
         self.energy = 1
 
 
-    def respawn(self, settings: dict) -> None:
+    def respawn(self, settings: dict, rng=None) -> None:
         '''
         Respawn food in random location within experiment boundaries.
         :param settings: simulation configurations.
+        :param rng: random stream (defaults to the shared stream).
         :returns: None
         '''
-        self.x = uniform(settings['x_min'], settings['x_max'])
-        self.y = uniform(settings['y_min'], settings['y_max'])
+        rng = get_rng(rng)
+        self.x = rng.uniform(settings['x_min'], settings['x_max'])
+        self.y = rng.uniform(settings['y_min'], settings['y_max'])
         self.energy = 1
+
+
+def patch_map(settings: dict) -> np.ndarray:
+    '''
+    Density map of the 'patchy' regrowth model: settings['food_patches']
+    gaussian patches of width settings['patch_width'], centred at points
+    drawn from settings['patch_seed'] (the same map for every generation).
+    :param settings: simulation configurations.
+    :returns: (PATCH_CELLS, PATCH_CELLS) weights, rows along y.
+    '''
+    rng = np.random.default_rng(settings['patch_seed'])
+    px = rng.uniform(settings['x_min'], settings['x_max'], settings['food_patches'])
+    py = rng.uniform(settings['y_min'], settings['y_max'], settings['food_patches'])
+
+    cells = (np.arange(PATCH_CELLS) + 0.5) / PATCH_CELLS
+    x = settings['x_min'] + cells * (settings['x_max'] - settings['x_min'])
+    y = settings['y_min'] + cells * (settings['y_max'] - settings['y_min'])
+    d2 = (x[None, None, :] - px[:, None, None])**2 + (y[None, :, None] - py[:, None, None])**2
+    return np.exp(-d2 / (2 * settings['patch_width']**2)).sum(axis=0)
+
+
+class FoodField():
+    '''
+    Food particles as x, y and energy arrays. A particle with energy 0 has
+    been eaten and waits to regrow (only under the 'fixed_rate' model).
+    The uneaten particles are kept in a spatial grid that is updated as
+    they are eaten and regrow instead of being rebuilt every step.
+    '''
+    def __init__(self, settings: dict, rng=None, n: int = None, density: np.ndarray = None):
+        rng = get_rng(rng)
+        self.settings = settings
+        self.model = settings['regrowth']
+        if density is None and self.model == 'patchy':
+            density = patch_map(settings)
+        self.density = density      # regrowth density map (None for uniform)
+
+        n = settings['food_num'] if n is None else n
+        self.x, self.y = self.draw(n, rng)
+        self.energy = np.ones(n, dtype=np.int64)
+        self.grid = None            # spatial grid of the uneaten particles (see bins())
+
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+
+    def draw(self, n: int, rng: np.random.Generator) -> tuple:
+        '''
+        Random positions for n particles, uniform or from the density map.
+        Uniform draws take x then y per particle, like food.respawn().
+        :param n: number of particles.
+        :param rng: random stream.
+        :returns: x and y arrays.
+        '''
+        s = self.settings
+        if self.density is None:
+            xy = rng.uniform([s['x_min'], s['y_min']], [s['x_max'], s['y_max']], (n, 2))
+            return xy[:, 0].copy(), xy[:, 1].copy()
+
+        rows, cols = self.density.shape
+        p = self.density.ravel() / self.density.sum()
+        cell = rng.choice(len(p), n, p=p)
+        u = rng.random((n, 2))
+        x = s['x_min'] + (cell % cols + u[:, 0]) * ((s['x_max'] - s['x_min']) / cols)
+        y = s['y_min'] + (cell // cols + u[:, 1]) * ((s['y_max'] - s['y_min']) / rows)
+        return x, y
+
+
+    def positions(self) -> tuple:
+        '''
+        Positions of the uneaten particles.
+        :returns: x and y arrays.
+        '''
+        live = self.energy > 0
+        return self.x[live], self.y[live]
+
+
+    def bins(self, grid: type):
+        '''
+        Spatial grid of the uneaten particles (ids are particle indices),
+        built on first use. Cells hold about one particle each but are
+        never smaller than half the contact radius.
+        :param grid: grid class (from the compute backend).
+        :returns: UniformGrid
+        '''
+        from evo_sim import CONTACT_RADIUS
+
+        if type(self.grid) is not grid:
+            s = self.settings
+            cell_size = max(sqrt((s['x_max'] - s['x_min']) * (s['y_max'] - s['y_min']) / max(len(self), 1)), CONTACT_RADIUS / 2)
+            self.grid = grid(s['x_min'], s['x_max'], s['y_min'], s['y_max'], cell_size)
+            live = np.flatnonzero(self.energy > 0)
+            self.grid.build(self.x[live], self.y[live], live)
+        return self.grid
+
+
+    def consume(self, eaten: np.ndarray, rng=None) -> None:
+        '''
+        Particles were eaten: respawn them, or (under 'fixed_rate') leave
+        them to regrow.
+        :param eaten: sorted indices of the eaten particles.
+        :param rng: random stream (defaults to the shared stream).
+        :returns: None
+        '''
+        if self.model == 'fixed_rate':
+            if self.grid is not None:
+                self.grid.remove(eaten, self.x[eaten], self.y[eaten])
+            self.energy[eaten] = 0
+        else:
+            self.respawn(eaten, rng)
+
+
+    def regrow(self, rng=None) -> None:
+        '''
+        One time step of 'fixed_rate' regrowth: a Poisson number of eaten
+        particles (lowest indices first) regrow. Other models do nothing.
+        :param rng: random stream (defaults to the shared stream).
+        :returns: None
+        '''
+        if self.model != 'fixed_rate':
+            return
+        eaten = np.flatnonzero(self.energy == 0)
+        if len(eaten):
+            rng = get_rng(rng)
+            k = rng.poisson(self.settings['regrowth_rate'] * self.settings['dt'])
+            self.respawn(eaten[:k], rng)
+
+
+    def respawn(self, rows: np.ndarray, rng=None) -> None:
+        '''
+        Move particles to new random positions with one vectorized draw.
+        :param rows: sorted particle indices.
+        :param rng: random stream (defaults to the shared stream).
+        :returns: None
+        '''
+        if len(rows) == 0:
+            return
+        rng = get_rng(rng)
+        if self.grid is not None:
+            live = rows[self.energy[rows] > 0]
+            self.grid.remove(live, self.x[live], self.y[live])
+
+        self.x[rows], self.y[rows] = self.draw(len(rows), rng)
+        self.energy[rows] = 1
+        if self.grid is not None:
+            self.grid.insert(rows, self.x[rows], self.y[rows])
+
+
+    def set(self, x: np.ndarray, y: np.ndarray, energy: np.ndarray) -> None:
+        '''
+        Replace the state of every particle (e.g. from a checkpoint).
+        :param x: x positions.
+        :param y: y positions.
+        :param energy: energies.
+        :returns: None
+        '''
+        self.x = np.array(x, dtype=np.float64)
+        self.y = np.array(y, dtype=np.float64)
+        self.energy = np.array(energy, dtype=np.int64)
+        self.grid = None
@@ -0,0 +1,135 @@
+import cProfile
+import json
+import os
+import time
+
+# phases of a time step, in order
+PHASES = ('frame', 'eat', 'sense', 'mate', 'birth_death', 'think', 'move')
+
+
+class Instrument():
+    '''
+    Per-phase timing of the time-step loop. Phases are timed as laps: each
+    lap() charges the time since the previous mark to a phase. Every step
+    produces a record passed to the hooks (and optionally appended to a
+    JSON lines file); every generation produces a summary record.
+    Callers guard each call with `if inst:` so a disabled run pays only
+    for the check.
+    '''
+    def __init__(self, hooks: list = (), path: str = None, profile: bool = False, profile_dir: str = '.'):
+        self.hooks = list(hooks)    # callables taking a record dict
+        self.file = open(path, 'a') if path is not None else None
+        self.profile = profile      # cProfile each generation into gen_N.prof
+        self.profile_dir = profile_dir
+        self.profiler = None
+
+        self.t = time.perf_counter()
+        self.times = {}             # phase -> seconds in the current step
+        self.totals = {}            # phase -> seconds in the current generation
+        self.calls = {}             # phase -> laps in the current generation
+        self.steps = 0
+
+
+    def emit(self, record: dict) -> None:
+        '''
+        Pass a record to the hooks and the JSON lines file.
+        :param record: record to emit.
+        :returns: None
+        '''
+        for hook in self.hooks:
+            hook(record)
+        if self.file is not None:
+            self.file.write(json.dumps(record) + '\n')
+
+
+    def begin_generation(self, gen: int) -> None:
+        '''
+        Reset the generation totals and start profiling if enabled.
+        :param gen: generation number.
+        :returns: None
+        '''
+        self.times, self.totals, self.calls = {}, {}, {}
+        self.steps = 0
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.mark()
+
+
+    def mark(self) -> None:
+        '''
+        Start timing the next phase from now.
+        :returns: None
+        '''
+        self.t = time.perf_counter()
+
+
+    def lap(self, phase: str) -> None:
+        '''
+        Charge the time since the last mark to a phase.
+        :param phase: phase name.
+        :returns: None
+        '''
+        t = time.perf_counter()
+        self.times[phase] = self.times.get(phase, 0.0) + t - self.t
+        self.t = t
+
+
+    def end_step(self, gen: int, step: int, population: int, births: int, deaths: int) -> None:
+        '''
+        Emit the record of a finished time step.
+        :param gen: generation number.
+        :param step: time step number.
+        :param population: organisms alive after the step.
+        :param births: organisms born during the step.
+        :param deaths: organisms that died during the step.
+        :returns: None
+        '''
+        for phase, seconds in self.times.items():
+            self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+            self.calls[phase] = self.calls.get(phase, 0) + 1
+        self.steps += 1
+
+        self.emit({'type': 'step', 'gen': gen, 'step': step, 'times': self.times,
+                   'population': population, 'births': births, 'deaths': deaths})
+        self.times = {}
+
+
+    def end_generation(self, gen: int) -> dict:
+        '''
+        Emit the per-phase totals of a generation and save its profile.
+        :param gen: generation number.
+        :returns: the generation record.
+        '''
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(os.path.join(self.profile_dir, 'gen_'+str(gen)+'.prof'))
+            self.profiler = None
+
+        record = {'type': 'generation', 'gen': gen, 'steps': self.steps, 'totals': self.totals, 'calls': self.calls}
+        self.emit(record)
+        if self.file is not None:
+            self.file.flush()
+        return record
+
+
+    def close(self) -> None:
+        '''
+        Close the JSON lines file.
+        :returns: None
+        '''
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def from_settings(settings: dict, hooks: list = ()) -> Instrument:
+    '''
+    Instrument configured by settings['instrument'] (JSON lines output to
+    settings['instrument_path']) and settings['profile'].
+    :param settings: simulation configurations.
+    :param hooks: callables taking a record dict.
+    :returns: Instrument
+    '''
+    path = settings['instrument_path'] if settings['instrument'] else None
+    return Instrument(hooks, path, settings['profile'], settings['trajectory_dir'])
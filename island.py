@@ -0,0 +1,255 @@
+# Island model: K sub-populations evolve in their own worker processes
+# and every settings['migration_interval'] generations the fittest
+# genomes of each island migrate to its neighbours over pipes.
+#
+#   python island.py --islands 8 --interval 5 --rate 0.05 --topology ring --out islands.json
+
+import argparse
+import json
+
+from math import floor
+
+import numpy as np
+
+from NEOS import NEOS
+from evo_sim import evolve_gen
+from evo_sim import new_organism
+from evo_sim import new_world
+from evo_sim import simulate
+
+# how migrants travel between islands
+TOPOLOGIES = ('ring', 'all', 'random')
+
+
+def emigrants(organisms: list, k: int) -> dict:
+    '''
+    Genomes of the k fittest organisms of an island.
+    :param organisms: surviving organisms of a generation.
+    :param k: number of migrants.
+    :returns: dict of arrays (one row per migrant).
+    '''
+    fitness = np.array([organism.fitness for organism in organisms], dtype=np.int64)
+    top = [organisms[i] for i in np.argsort(-fitness, kind='stable')[:k]]
+    return {
+        'wih': np.array([organism.wih for organism in top]),
+        'who': np.array([organism.who for organism in top]),
+        'lifespan': np.array([organism.lifespan for organism in top], dtype=np.int64),
+        'gen': np.array([organism.gen for organism in top], dtype=np.int64),
+        'color': np.array([organism.color for organism in top], dtype=str),
+        'name': np.array([organism.name for organism in top], dtype=str),
+    }
+
+
+def immigrate(settings: dict, organisms: list, packets: list, elites: int, rng: np.random.Generator) -> list:
+    '''
+    Replace the bred (non elite) tail of a new generation with migrants.
+    :param settings: simulation configurations.
+    :param organisms: new generation from evolve_gen() (elites first).
+    :param packets: incoming emigrants() packets.
+    :param elites: number of leading organisms that are never replaced.
+    :param rng: random stream of the island.
+    :returns: list of organisms.
+    '''
+    arrivals = []
+    for packet in packets:
+        for i in range(len(packet['lifespan'])):
+            arrivals.append(NEOS(settings, color=str(packet['color'][i]), lifespan=int(packet['lifespan'][i]),
+                                 wih=packet['wih'][i].copy(), who=packet['who'][i].copy(),
+                                 name=str(packet['name'][i]), gen=int(packet['gen'][i]), rng=rng))
+
+    keep = max(len(organisms) - len(arrivals), min(elites, len(organisms)))
+    return organisms[:keep] + arrivals[:len(organisms) - keep]
+
+
+def route(packets: list, topology: str, rng: np.random.Generator) -> list:
+    '''
+    Destination of every island's emigrants.
+    :param packets: emigrants() packet of each island.
+    :param topology: 'ring' (to the next island), 'all' (to every other
+    island) or 'random' (to one other island drawn each migration).
+    :param rng: random stream of the coordinator.
+    :returns: list (per island) of incoming packets.
+    '''
+    k = len(packets)
+    incoming = [[] for i in range(k)]
+    if k < 2:
+        return incoming
+    for i, packet in enumerate(packets):
+        if topology == 'ring':
+            targets = [(i + 1) % k]
+        elif topology == 'all':
+            targets = [j for j in range(k) if j != i]
+        elif topology == 'random':
+            j = int(rng.integers(k - 1))
+            targets = [j + (j >= i)]
+        else:
+            raise ValueError('migration_topology must be one of '+str(TOPOLOGIES)+', not '+repr(topology))
+        for j in targets:
+            incoming[j].append(packet)
+    return incoming
+
+
+def island_worker(conn, settings: dict, seed: np.random.SeedSequence) -> None:
+    '''
+    Generation loop of one island, driven by the coordinator over a pipe.
+    Commands are ('run', stop_gen), answered with the stats of the
+    generations run and the emigrants of the last one, ('immigrants',
+    packets) and ('stop', None). An island left with fewer than 2
+    survivors is reseeded with gen 0 organisms.
+    :param conn: worker end of the pipe.
+    :param settings: simulation configurations.
+    :param seed: seed of the island's stream.
+    :returns: None
+    '''
+    rng = np.random.default_rng(seed)
+    organisms, foods = new_world(settings, rng)
+    elites = int(floor(settings['elitism'] * settings['pop_size']))
+    elites += elites % 2    # evolve_gen() adds a gen 0 organism to odd elites
+    k = max(int(round(settings['migration_rate'] * settings['pop_size'])), 1)
+    gen = 0
+
+    while True:
+        command, arg = conn.recv()
+        if command == 'stop':
+            break
+
+        if command == 'immigrants':
+            organisms = immigrate(settings, organisms, arg, elites, rng)
+            continue
+
+        history = []
+        packet = emigrants([], 0)
+        for gen in range(gen, arg):
+            organisms, stats = simulate(settings, organisms, foods, gen, rng=rng)
+            history.append(stats)
+            if gen == arg - 1:
+                packet = emigrants(organisms, k)
+
+            # too few survivors to breed from
+            if len(organisms) < 2:
+                organisms = [new_organism(settings, i, rng) for i in range(settings['pop_size'])]
+            else:
+                organisms = evolve_gen(settings, organisms, gen, rng)
+        gen = arg
+        conn.send((history, packet))
+
+    conn.close()
+
+
+def combine(stats: list) -> dict:
+    '''
+    Stats of one generation across islands.
+    :param stats: per-island generation stats.
+    :returns: dict with the same keys.
+    '''
+    count = sum(s['COUNT'] for s in stats)
+    total = sum(s['SUM'] for s in stats)
+    mean = total / count if count else 0.0
+    var = sum(s['COUNT'] * (s['VAR'] + (s['AVG'] - mean)**2) for s in stats) / count if count else 0.0
+    return {
+        'SURVIVED': sum(s['SURVIVED'] for s in stats),
+        'DIED': sum(s['DIED'] for s in stats),
+        'BEST': max(s['BEST'] for s in stats),
+        'WORST': min(s['WORST'] for s in stats),
+        'SUM': total,
+        'COUNT': count,
+        'AVG': mean,
+        'BORN': sum(s['BORN'] for s in stats),
+        'VAR': var,
+    }
+
+
+def run_islands(settings: dict, seed: int = 0, verbose: bool = True) -> dict:
+    '''
+    Evolve settings['islands'] sub-populations in parallel processes with
+    migration every settings['migration_interval'] generations. Island i
+    always uses the i-th stream spawned from seed.
+    :param settings: simulation configurations.
+    :param seed: root seed of the experiment.
+    :param verbose: print combined stats per generation.
+    :returns: dict with per-island histories and their combined stats.
+    '''
+    from multiprocessing import Pipe
+    from multiprocessing import Process
+
+    from config import validate
+
+    validate(settings, islands=True)
+    settings = dict(settings, render=False, record=False, checkpoint_every=0, instrument=False, profile=False, metrics_dir=None)
+    k = settings['islands']
+    interval = settings['migration_interval'] or settings['gens']
+
+    seeds = np.random.SeedSequence(seed).spawn(k + 1)
+    rng = np.random.default_rng(seeds[k])
+
+    conns, workers = [], []
+    for i in range(k):
+        parent, child = Pipe()
+        worker = Process(target=island_worker, args=(child, settings, seeds[i]), daemon=True)
+        worker.start()
+        child.close()
+        conns.append(parent)
+        workers.append(worker)
+
+    histories = [[] for i in range(k)]
+    try:
+        for start in range(0, settings['gens'], interval):
+            stop = min(start + interval, settings['gens'])
+            for conn in conns:
+                conn.send(('run', stop))
+            replies = []
+            for i, conn in enumerate(conns):
+                try:
+                    replies.append(conn.recv())
+                except EOFError:
+                    raise RuntimeError('island '+str(i)+' worker exited') from None
+
+            for i, (history, packet) in enumerate(replies):
+                histories[i].extend(history)
+            if verbose:
+                for gen in range(start, stop):
+                    stats = combine([history[gen] for history in histories])
+                    print('> GEN:', gen, 'ISLANDS:', k, 'BEST:', stats['BEST'], 'AVG: %.3f' % stats['AVG'], 'FOOD EATEN:', stats['SUM'])
+
+            # migrate between generations
+            if stop < settings['gens']:
+                incoming = route([packet for _, packet in replies], settings['migration_topology'], rng)
+                for conn, packets in zip(conns, incoming):
+                    conn.send(('immigrants', packets))
+    finally:
+        for conn in conns:
+            try:
+                conn.send(('stop', None))
+            except OSError:
+                pass
+        for worker in workers:
+            worker.join()
+
+    summary = [combine([history[gen] for history in histories]) for gen in range(settings['gens'])]
+    return {'seed': seed, 'islands': histories, 'summary': summary}
+
+
+def main(argv: list = None) -> None:
+    from config import settings
+
+    parser = argparse.ArgumentParser(description='Evolve NEOS on islands in parallel with migration.')
+    parser.add_argument('--islands', type=int, default=settings['islands'], help='number of islands (one process each)')
+    parser.add_argument('--interval', type=int, default=settings['migration_interval'], help='generations between migrations')
+    parser.add_argument('--rate', type=float, default=settings['migration_rate'], help='fraction of pop_size that migrates')
+    parser.add_argument('--topology', choices=TOPOLOGIES, default=settings['migration_topology'], help='migration topology')
+    parser.add_argument('--gens', type=int, default=settings['gens'], help='generations')
+    parser.add_argument('--seed', type=int, default=0, help='root seed')
+    parser.add_argument('--out', default=None, help='write results as json')
+    args = parser.parse_args(argv)
+
+    settings = dict(settings, islands=args.islands, migration_interval=args.interval, migration_rate=args.rate,
+                    migration_topology=args.topology, gens=args.gens)
+    results = run_islands(settings, args.seed)
+
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+# Lineage archive: one fixed-width record per organism ever born in a run
+# (settings['lineage_dir']), so genealogies can be analysed without
+# keeping any organism alive. Records are appended in birth order and the
+# record of organism id k is row k of records.bin; its death step, final
+# fitness and fate are filled in when it dies or its generation ends.
+# With settings['lineage_genomes'] row k of genomes.bin holds its weights
+# at birth (wih then who, flattened).
+#
+# Every generation starts with new records: elites carried over are
+# re-born with the previous record as their only parent.
+#
+#   python lineage.py LINEAGE_DIR --ancestors 1234
+#   python lineage.py LINEAGE_DIR --lineages 10
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+# how an organism was born
+FOUNDER = 0         # random gen 0 organism (or one with no recorded parents)
+OFFSPRING = 1       # bred between generations (evolve_gen)
+ELITE = 2           # elite carried into the next generation
+MATED = 3           # born by mating within a generation
+
+# how it left its generation
+ALIVE = 0
+DIED = 1
+SURVIVED = 2
+
+RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('parent1', '<i8'),     # -1 when none
+    ('parent2', '<i8'),     # -1 when none
+    ('gen', '<i4'),         # generation of the run it lived in
+    ('kind', '<i1'),        # FOUNDER, OFFSPRING, ELITE or MATED
+    ('fate', '<i1'),        # ALIVE, DIED or SURVIVED
+    ('birth', '<i4'),       # time step of birth (0 at the start of the generation)
+    ('death', '<i4'),       # time step of death or of the end of the generation (-1 while alive)
+    ('lifespan', '<i4'),
+    ('fitness', '<i4'),     # final fitness (-1 while alive)
+])
+
+
+class LineageArchive():
+    '''
+    Append-only writer of lineage records. New records are kept in a
+    growable NumPy chunk and appended to the file when it fills; deaths of
+    records already on disk are written through a memory map.
+    '''
+    def __init__(self, path: str, genome_shape: tuple = None, dtype: np.dtype = np.float64, chunk: int = 65536):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.records_path = os.path.join(path, 'records.bin')
+        self.genomes_path = os.path.join(path, 'genomes.bin')
+        self.genome_size = 0 if genome_shape is None else int(genome_shape[0] * genome_shape[1] + genome_shape[2] * genome_shape[0])
+        self.dtype = np.dtype(dtype)
+
+        self.buffer = np.empty(chunk, dtype=RECORD_DTYPE)
+        self.genomes = np.empty((chunk, self.genome_size), dtype=self.dtype) if self.genome_size else None
+        self.count = 0          # records in the buffer
+        self.flushed = 0        # records on disk
+        self.map = None         # memory map of the records on disk (opened on demand)
+        if os.path.exists(self.records_path):
+            self.flushed = os.path.getsize(self.records_path) // RECORD_DTYPE.itemsize
+
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'genome': list(genome_shape) if genome_shape else None, 'dtype': self.dtype.name}, f)
+
+
+    @property
+    def next_id(self) -> int:
+        return self.flushed + self.count
+
+
+    def rewind(self, gen: int = None) -> None:
+        '''
+        Drop the records a restarted run will write again. A fresh run
+        (gen None) drops everything; a run resumed at gen keeps the
+        records of earlier generations and of the organisms gen starts
+        with (bred before the checkpoint), which are marked alive again.
+        :param gen: generation the run resumes at (None for a fresh run).
+        :returns: None
+        '''
+        self.flush()
+        keep = 0
+        if gen is not None and self.flushed:
+            records = np.memmap(self.records_path, dtype=RECORD_DTYPE, mode='r', shape=(self.flushed,))
+            later = np.flatnonzero((records['gen'] > gen) | ((records['gen'] == gen) & (records['kind'] == MATED)))
+            keep = int(later[0]) if len(later) else self.flushed
+            del records
+
+        for path, size in ((self.records_path, RECORD_DTYPE.itemsize), (self.genomes_path, self.genome_size * self.dtype.itemsize)):
+            if os.path.exists(path):
+                os.truncate(path, keep * size)
+        self.flushed = keep
+
+        if keep:
+            records = self._records()
+            reset = np.flatnonzero(records['gen'] == gen)
+            records['fate'][reset] = ALIVE
+            records['death'][reset] = -1
+            records['fitness'][reset] = -1
+
+
+    def born(self, parent1: np.ndarray, parent2: np.ndarray, gen: int, kind, birth: int, lifespan: np.ndarray,
+             wih: np.ndarray = None, who: np.ndarray = None) -> np.ndarray:
+        '''
+        Append the records of a batch of births.
+        :param parent1: record ids of the first parents (-1 for none).
+        :param parent2: record ids of the second parents (-1 for none).
+        :param gen: generation of the run they live in.
+        :param kind: how they were born (one value or one per birth).
+        :param birth: time step of birth.
+        :param lifespan: lifespans.
+        :param wih: (N, hidden, inner) weights (needed with genomes).
+        :param who: (N, outer, hidden) weights (needed with genomes).
+        :returns: record ids of the births.
+        '''
+        m = len(lifespan)
+        ids = np.arange(self.next_id, self.next_id + m, dtype=np.int64)
+        if m == 0:
+            return ids
+        if self.count + m > len(self.buffer):
+            self.flush()
+            if m > len(self.buffer):
+                self.buffer = np.empty(m, dtype=RECORD_DTYPE)
+                if self.genomes is not None:
+                    self.genomes = np.empty((m, self.genome_size), dtype=self.dtype)
+
+        records = self.buffer[self.count:self.count + m]
+        records['id'] = ids
+        records['parent1'] = parent1
+        records['parent2'] = parent2
+        records['gen'] = gen
+        records['kind'] = kind
+        records['fate'] = ALIVE
+        records['birth'] = birth
+        records['death'] = -1
+        records['lifespan'] = lifespan
+        records['fitness'] = -1
+        if self.genomes is not None:
+            genomes = self.genomes[self.count:self.count + m]
+            split = wih[0].size
+            genomes[:, :split] = np.reshape(wih, (m, -1))
+            genomes[:, split:] = np.reshape(who, (m, -1))
+
+        self.count += m
+        return ids
+
+
+    def died(self, ids: np.ndarray, step: int, fitness: np.ndarray, fate: int = DIED) -> None:
+        '''
+        Complete the records of organisms leaving their generation.
+        :param ids: record ids (negative ids are ignored).
+        :param step: time step of death or of the end of the generation.
+        :param fitness: final fitness.
+        :param fate: DIED or SURVIVED.
+        :returns: None
+        '''
+        ids = np.asarray(ids, dtype=np.int64)
+        fitness = np.broadcast_to(fitness, ids.shape)
+        known = ids >= 0
+        ids, fitness = ids[known], fitness[known]
+
+        buffered = ids >= self.flushed
+        for records, rows, values in ((self.buffer, ids[buffered] - self.flushed, fitness[buffered]),
+                                      (None, ids[~buffered], fitness[~buffered])):
+            if len(rows) == 0:
+                continue
+            if records is None:
+                records = self._records()
+            records['fate'][rows] = fate
+            records['death'][rows] = step
+            records['fitness'][rows] = values
+
+
+    def _records(self) -> np.memmap:
+        # writable map of the records on disk
+        if self.map is None or len(self.map) != self.flushed:
+            self.map = np.memmap(self.records_path, dtype=RECORD_DTYPE, mode='r+', shape=(self.flushed,))
+        return self.map
+
+
+    def flush(self) -> None:
+        '''
+        Append the buffered records to disk and sync the memory map.
+        :returns: None
+        '''
+        if self.map is not None:
+            self.map.flush()
+            self.map = None
+        if self.count == 0:
+            return
+        with open(self.records_path, 'ab') as f:
+            self.buffer[:self.count].tofile(f)
+        if self.genomes is not None:
+            with open(self.genomes_path, 'ab') as f:
+                self.genomes[:self.count].tofile(f)
+        self.flushed += self.count
+        self.count = 0
+
+
+    def close(self) -> None:
+        self.flush()
+
+
+def record_organisms(archive: LineageArchive, organisms: list, gen: int, kind, parent1, parent2=-1) -> None:
+    '''
+    Record the births of unbound organisms and give them their record ids.
+    :param archive: LineageArchive.
+    :param organisms: list of NEOS.
+    :param gen: generation of the run they live in.
+    :param kind: how they were born (one value or one per organism).
+    :param parent1: record ids of the first parents (-1 for none).
+    :param parent2: record ids of the second parents (-1 for none).
+    :returns: None
+    '''
+    if not organisms:
+        return
+    lifespan = np.array([organism.lifespan for organism in organisms])
+    wih = who = None
+    if archive.genomes is not None:
+        wih = np.array([organism.wih for organism in organisms])
+        who = np.array([organism.who for organism in organisms])
+    ids = archive.born(parent1, parent2, gen, kind, 0, lifespan, wih, who)
+    for organism, lineage in zip(organisms, ids.tolist()):
+        organism.lineage = lineage
+
+
+class Lineage():
+    '''
+    Read-only, memory-mapped view of a lineage archive with genealogy
+    queries. Queries walk the records with array operations, one level of
+    the family tree at a time.
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        size = os.path.getsize(os.path.join(path, 'records.bin')) // RECORD_DTYPE.itemsize
+        self.records = np.memmap(os.path.join(path, 'records.bin'), dtype=RECORD_DTYPE, mode='r', shape=(size,))
+        self._children = None
+
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+    def genome(self, lineage: int) -> tuple:
+        '''
+        Weights of an organism at birth (archives written with genomes).
+        :param lineage: record id.
+        :returns: wih, who
+        '''
+        if self.meta['genome'] is None:
+            raise ValueError('archive was recorded without genomes')
+        if not 0 <= lineage < len(self):
+            raise ValueError('no record '+str(lineage)+' in an archive of '+str(len(self)))
+        hidden, inner, outer = self.meta['genome']
+        dtype = np.dtype(self.meta['dtype'])
+        size = hidden * inner + outer * hidden
+        row = np.fromfile(os.path.join(self.path, 'genomes.bin'), dtype=dtype, count=size, offset=lineage * size * dtype.itemsize)
+        return row[:hidden * inner].reshape(hidden, inner), row[hidden * inner:].reshape(outer, hidden)
+
+
+    def ancestors(self, lineage: int, depth: int = None) -> np.ndarray:
+        '''
+        Every ancestor of an organism (parents, their parents, ...).
+        :param lineage: record id.
+        :param depth: generations of parents to follow (None for all).
+        :returns: sorted record ids.
+        '''
+        seen = np.zeros(len(self), dtype=bool)
+        frontier = np.array([lineage])
+        level = 0
+        while len(frontier) and (depth is None or level < depth):
+            parents = np.concatenate([self.records['parent1'][frontier], self.records['parent2'][frontier]])
+            parents = np.unique(parents[parents >= 0])
+            frontier = parents[~seen[parents]]
+            seen[frontier] = True
+            level += 1
+        return np.flatnonzero(seen)
+
+
+    def children(self) -> tuple:
+        '''
+        Child index of the archive (built once): the children of record k
+        are kids[starts[k]:starts[k + 1]].
+        :returns: starts, kids
+        '''
+        if self._children is None:
+            rows = np.arange(len(self), dtype=np.int64)
+            parent = np.concatenate([self.records['parent1'], self.records['parent2']])
+            kid = np.concatenate([rows, rows])
+            both = self.records['parent2'] == self.records['parent1']
+            keep = (parent >= 0) & np.concatenate([np.ones(len(self), dtype=bool), ~both])
+            parent, kid = parent[keep], kid[keep]
+            order = np.argsort(parent, kind='stable')
+            starts = np.searchsorted(parent[order], np.arange(len(self) + 1))
+            self._children = (starts, kid[order])
+        return self._children
+
+
+    def descendants(self, lineage: int, depth: int = None) -> np.ndarray:
+        '''
+        Every descendant of an organism.
+        :param lineage: record id.
+        :param depth: generations of children to follow (None for all).
+        :returns: sorted record ids.
+        '''
+        starts, kids = self.children()
+        seen = np.zeros(len(self), dtype=bool)
+        frontier = np.array([lineage])
+        level = 0
+        while len(frontier) and (depth is None or level < depth):
+            counts = starts[frontier + 1] - starts[frontier]
+            firsts = np.cumsum(counts) - counts
+            found = kids[np.arange(counts.sum()) + np.repeat(starts[frontier] - firsts, counts)]
+            found = np.unique(found)
+            frontier = found[~seen[found]]
+            seen[frontier] = True
+            level += 1
+        return np.flatnonzero(seen)
+
+
+    def founders(self) -> np.ndarray:
+        '''
+        Founding record of every record, following first parents back
+        (by pointer jumping: each pass doubles the distance covered).
+        :returns: record id of the founder per record.
+        '''
+        root = np.where(self.records['parent1'] >= 0, self.records['parent1'], np.arange(len(self)))
+        while True:
+            jumped = root[root]
+            if np.array_equal(jumped, root):
+                return root
+            root = jumped
+
+
+    def fitness_by_lineage(self) -> dict:
+        '''
+        Fitness of every founding lineage: all records descending from the
+        founder along first parents, the founder included.
+        :returns: dict of arrays (founder, count, total, mean and best
+        fitness), largest total first.
+        '''
+        root = self.founders()
+        fitness = np.maximum(self.records['fitness'], 0).astype(np.int64)
+        founder, group = np.unique(root, return_inverse=True)
+        count = np.bincount(group)
+        total = np.bincount(group, weights=fitness).astype(np.int64)
+        best = np.zeros(len(founder), dtype=np.int64)
+        np.maximum.at(best, group, fitness)
+
+        order = np.lexsort((founder, -total))
+        return {'founder': founder[order], 'count': count[order], 'total': total[order],
+                'mean': (total / count)[order], 'best': best[order]}
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='Query a NEOS lineage archive.')
+    parser.add_argument('path', help='lineage directory (settings lineage_dir)')
+    parser.add_argument('--ancestors', type=int, default=None, metavar='ID', help='list the ancestors of a record')
+    parser.add_argument('--descendants', type=int, default=None, metavar='ID', help='list the descendants of a record')
+    parser.add_argument('--lineages', type=int, default=None, metavar='N', help='show the N fittest founding lineages')
+    args = parser.parse_args(argv)
+
+    lineage = Lineage(args.path)
+    print('RECORDS:', len(lineage))
+    if args.ancestors is not None:
+        print('ANCESTORS:', lineage.ancestors(args.ancestors).tolist())
+    if args.descendants is not None:
+        print('DESCENDANTS:', lineage.descendants(args.descendants).tolist())
+    if args.lineages is not None:
+        table = lineage.fitness_by_lineage()
+        for i in range(min(args.lineages, len(table['founder']))):
+            print('  founder %-8d records %-8d total %-8d mean %-8.2f best %d'
+                  % (table['founder'][i], table['count'][i], table['total'][i], table['mean'][i], table['best'][i]))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,92 +6,81 @@
 # each generation sim, the fittest NEOS will carry the genes 
 # for the next generation.
 # 4/17/2023
+#
+#   python main.py                                  (default settings)
+#   python main.py --config run.toml --set gens=20  (config file + overrides)
+#   python main.py --headless --print-config        (show the resolved settings)
+#   python main.py --live                           (watch the run as it simulates)
 
-from NEOS import *
-from food import *
-from evo_sim import *
-from utils import *
-
-from random import randint
-
-settings = {}
-
-# Evolution Settings
-settings['pop_size'] = 64       # initial number of organisms
-settings['food_num'] = 100      # number of food particles
-settings['gens'] = 10            # number of generations
-settings['elitism'] = 0.20      # elitism (selection bias)
-settings['mutate'] = 0.10       # mutation rate
-settings['mature'] = 200        # time for organism to mature (in total time steps)
-settings['lifespan_lower'] = 500      # starting lifespan lower bound (in total time steps)
-settings['lifespan_upper'] = 600      # starting lifespan upper bound (in total time steps)
-
-# Simulation Setitngs
-settings['gen_time'] = 50       # generation length         (seconds)
-settings['dt'] = 0.04           # simulation time step      (dt)
-
-settings['total_time_steps'] = int(settings['gen_time'] / settings['dt']) # total time steps of simulation (1250)
-
-settings['dr_max'] = 720        # max rotational speed      (degrees per second)
-settings['v_max'] = 0.5         # max velocity              (units per second)
-settings['dv_max'] =  0.25      # max acceleration (+/-)    (units per second^2)
-
-settings['x_min'] = -2.0        # experiment western border
-settings['x_max'] =  2.0        # experiment eastern border
-settings['y_min'] = -2.0        # experiment southern border
-settings['y_max'] =  2.0        # experiment northern border
+import argparse
+import json
+import sys
 
-# Organism Neural Net Settings
-settings['inner_nodes'] = 1          # number of input nodes
-settings['hidden_nodes'] = 5          # number of hidden nodes
-settings['outer_nodes'] = 2          # number of output nodes
+from config import make_settings
+from config import parse_overrides
+from config import settings     # defaults (also importable as main.settings)
 
 
-def main(settings: dict) -> None:
+def main(settings: dict, resume: str = None, live: bool = False) -> None:
     '''
     Run simulation which displays stats and saves the animation of the simulation.
+    :param settings: simulation configurations.
+    :param resume: checkpoint to continue the run from.
+    :param live: show the run in a live viewer instead (see viewer.py).
     '''
-    # init food to the environment
-    foods = []
-    for i in range(0,settings['food_num']):
-        foods.append(food(settings))
-
-    # init organisms to the environemnt
-    organisms = []
-    for i in range(0,settings['pop_size']):
-        wih_init = np.random.uniform(-1, 1, (settings['hidden_nodes'], settings['inner_nodes']))     # mlp weights (input -> hidden)
-        who_init = np.random.uniform(-1, 1, (settings['outer_nodes'], settings['hidden_nodes']))     # mlp weights (hidden -> output)
-
-        lifespan = randint(settings['lifespan_lower'], settings['lifespan_upper']) 
-        organisms.append(NEOS(settings, 'lightgreen', lifespan, None, None, wih_init, who_init, name='gen[0]-org['+str(i)+']', gen=0))
-
-    # Loop through each generation
-    for gen in range(0, settings['gens']):
+    if live:
+        from viewer import run_live
 
-        # simulation
-        print("SIMULATING GEN "+str(gen)+". PLEASE WAIT...")
+        run_live(settings, resume)
+        return
 
-        fig, ax = plt.subplots()
-        fig.set_size_inches(9.6, 5.4)
-        ax.set_facecolor(plt.cm.Blues(.2))
-        
-        organisms, old_organisms = simulate(settings, organisms, foods, gen, fig, ax)
+    from evo_sim import run_generations
 
-        
-        # print stats
-        stats = get_stats(organisms, old_organisms)
-        print('> GEN:',gen,'BEST:',stats['BEST'],'AVG:',stats['AVG'],'WORST:',stats['WORST'],'SURVIVED:',stats['SURVIVED'],'DIED:',stats['DIED'],'TOTAL NEOS:',stats['COUNT'],'FOOD EATEN:',stats['SUM'])
+    run_generations(settings, resume=resume)
 
-        # organisms died off
-        if len(organisms) == 0:
-            print("DONE SIMULATING GEN "+str(gen)+".\n")
-            break
 
-        # add next generation of organisms
-        organisms = evolve_gen(settings, organisms, gen)
-
-        print("DONE SIMULATING GEN "+str(gen)+".\n")
+def cli(argv: list = None) -> int:
+    '''
+    Command line entry point: resolve and validate the settings, then run.
+    matplotlib is only imported when a generation is rendered.
+    :param argv: arguments (defaults to sys.argv).
+    :returns: exit status.
+    '''
+    parser = argparse.ArgumentParser(description='NEOS evolution simulator.')
+    parser.add_argument('--config', default=None, help='settings file (.toml or .json)')
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='KEY=VALUE', help='override a setting (value read as JSON when possible); repeatable')
+    parser.add_argument('--headless', action='store_true', help='do not render animations')
+    parser.add_argument('--live', action='store_true', help='watch the run in a live viewer (no GIFs)')
+    parser.add_argument('--print-config', action='store_true', help='print the resolved settings as json and exit')
+    parser.add_argument('--resume', default=None, help='continue a run from a checkpoint file')
+    parser.add_argument('--checkpoint-every', type=int, default=None, help='save a checkpoint every k generations')
+    parser.add_argument('--checkpoint-path', default=None, help='checkpoint file')
+    parser.add_argument('--tiles', type=int, nargs=2, default=None, metavar=('TX', 'TY'), help='split the arena into TX x TY tiles run in parallel (headless)')
+    args = parser.parse_args(argv)
+
+    try:
+        overrides = parse_overrides(args.overrides)
+        if args.headless:
+            overrides['render'] = False
+        if args.checkpoint_every is not None:
+            overrides['checkpoint_every'] = args.checkpoint_every
+        if args.checkpoint_path is not None:
+            overrides['checkpoint_path'] = args.checkpoint_path
+        if args.tiles is not None:
+            overrides['tiles'] = tuple(args.tiles)
+        run_settings = make_settings(args.config, overrides)
+        if args.live and run_settings['tiles']:
+            raise ValueError('--live needs an untiled run')
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if args.print_config:
+        print(json.dumps(run_settings, indent=1))
+        return 0
+
+    main(run_settings, args.resume, args.live)
+    return 0
 
 
 if __name__ == "__main__":
-    main(settings)
+    sys.exit(cli())
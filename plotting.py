@@ -1,76 +1,140 @@
-from matplotlib.patches import Circle
-import matplotlib.lines as lines
+from matplotlib.collections import EllipseCollection
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba_array
 from matplotlib import pyplot as plt
+from PIL import Image
+import numpy as np
 
-from NEOS import *
+from utils import palette
 
-from math import sin
-from math import cos
-from math import radians
 
-def plot_organism(x1, y1, theta, color, ax):
+def new_figure():
     '''
-    Plot organisms on to the frame.
-    :param x1:
-    :param y1:
-    :param theta:
-    :param color:
-    :param ax:
-    :return: None
+    Create the figure a generation is rendered on.
+    :return: figure, ax
     '''
-    circle = Circle([x1,y1], 0.05, edgecolor = 'g', facecolor = color, zorder=8)
-    ax.add_artist(circle)
+    fig, ax = plt.subplots()
+    fig.set_size_inches(9.6, 5.4)
+    ax.set_facecolor(plt.cm.Blues(.2))
+    return fig, ax
 
-    edge = Circle([x1,y1], 0.05, facecolor='None', edgecolor = 'darkgreen', zorder=8)
-    ax.add_artist(edge)
 
-    tail_len = 0.075
-    
-    x2 = cos(radians(theta)) * tail_len + x1
-    y2 = sin(radians(theta)) * tail_len + y1
-
-    ax.add_line(lines.Line2D([x1,x2],[y1,y2], color='darkgreen', linewidth=1, zorder=10))
-
-
-
-def plot_food(x1, y1, ax):
+class Renderer():
     '''
-    Plot food particles on to the frame.
-    :param x1:
-    :param y1:
-    :param ax:
-    :return: None
+    Renders a generation into a GIF. Artists for bodies, heading tails and
+    food are created once; each frame only updates their offsets, colors
+    and segments and blits them over a cached background.
     '''
-    circle = Circle([x1,y1], 0.03, edgecolor = 'darkslateblue', facecolor = 'mediumslateblue', zorder=5)
-    ax.add_artist(circle)
-    
-
-
-
-def plot_frame(settings, organisms, foods, gen, ax):
-    '''
-    Plot frame.
-    :param settings:
-    :param organisms:
-    :param foods:
-    :param gen:
-    :param ax:
-    :return: None
-    '''
-    plt.xlim([settings['x_min'] + settings['x_min'] * 0.25, settings['x_max'] + settings['x_max'] * 0.25])
-    plt.ylim([settings['y_min'] + settings['y_min'] * 0.25, settings['y_max'] + settings['y_max'] * 0.25])
-
-    # Plot organisms
-    for organism in organisms:
-        plot_organism(organism.x, organism.y, organism.r, organism.color, ax)
-
-    # Plot food particles
-    for food in foods:
-        plot_food(food.x, food.y, ax)
-
-    ax.set_aspect('equal')
-    frame = plt.gca()
-    frame.axes.get_xaxis().set_ticks([])
-    frame.axes.get_yaxis().set_ticks([])
-
-    plt.title(r'GENERATION: '+str(gen))
+    def __init__(self, settings: dict, gen: int, fig=None, ax=None, path: str = None, fps: int = 15, dpi: int = 100, colors: list = None):
+        if fig is None:
+            fig, ax = new_figure()
+        fig.set_dpi(dpi)
+        self.fig = fig
+        self.ax = ax
+        self.path = path
+        self.fps = fps
+        self.frames = []
+        self.colors = palette if colors is None else colors     # color names by index
+        self.rgba = np.zeros((0, 4))                            # rgba by color index
+
+        ax.set_xlim([settings['x_min'] + settings['x_min'] * 0.25, settings['x_max'] + settings['x_max'] * 0.25])
+        ax.set_ylim([settings['y_min'] + settings['y_min'] * 0.25, settings['y_max'] + settings['y_max'] * 0.25])
+        ax.set_aspect('equal')
+        ax.get_xaxis().set_ticks([])
+        ax.get_yaxis().set_ticks([])
+        ax.set_title(r'GENERATION: '+str(gen))
+
+        empty = np.zeros((0, 2))
+        self.bodies = EllipseCollection(0.1, 0.1, 0, units='xy', offsets=empty, offset_transform=ax.transData,
+                                        edgecolor='darkgreen', zorder=8)
+        self.tails = LineCollection([], colors='darkgreen', linewidths=1, zorder=10)
+        self.food = EllipseCollection(0.06, 0.06, 0, units='xy', offsets=empty, offset_transform=ax.transData,
+                                      facecolor='mediumslateblue', edgecolor='darkslateblue', zorder=5)
+        for artist in (self.food, self.bodies, self.tails):
+            artist.set_animated(True)
+            ax.add_collection(artist)
+
+        fig.canvas.draw()
+        self.background = fig.canvas.copy_from_bbox(fig.bbox)
+
+
+    def frame(self, organisms, foods) -> None:
+        '''
+        Draw the current state of a simulation.
+        :param organisms: population of organisms.
+        :param foods: FoodField.
+        :return: None
+        '''
+        n = len(organisms)
+        self.draw(organisms.x[:n], organisms.y[:n], organisms.r[:n], organisms.color[:n], *foods.positions())
+
+
+    def update(self, x, y, r, color, food_x, food_y) -> tuple:
+        '''
+        Move the artists to a frame given as state arrays.
+        :param x: organism x positions.
+        :param y: organism y positions.
+        :param r: organism orientations.
+        :param color: organism color indices.
+        :param food_x: food x positions.
+        :param food_y: food y positions.
+        :return: the updated artists.
+        '''
+        if len(self.rgba) < len(self.colors):
+            self.rgba = to_rgba_array(self.colors)
+
+        tail_len = 0.075
+        theta = np.radians(r)
+        xy = np.column_stack([x, y])
+        tips = np.column_stack([x + np.cos(theta) * tail_len, y + np.sin(theta) * tail_len])
+
+        self.bodies.set_offsets(xy)
+        self.bodies.set_facecolor(self.rgba[color])
+        self.tails.set_segments(np.stack([xy, tips], axis=1))
+        self.food.set_offsets(np.column_stack([food_x, food_y]))
+        return self.food, self.bodies, self.tails
+
+
+    def draw(self, x, y, r, color, food_x, food_y) -> None:
+        '''
+        Draw one frame from state arrays and keep it for the GIF.
+        :param x: organism x positions.
+        :param y: organism y positions.
+        :param r: organism orientations.
+        :param color: organism color indices.
+        :param food_x: food x positions.
+        :param food_y: food y positions.
+        :return: None
+        '''
+        self.update(x, y, r, color, food_x, food_y)
+
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        self.ax.draw_artist(self.food)
+        self.ax.draw_artist(self.bodies)
+        self.ax.draw_artist(self.tails)
+
+        rgb = np.asarray(canvas.buffer_rgba())[:, :, :3]
+        self.frames.append(Image.fromarray(rgb.copy()))
+
+
+    def save(self, path: str) -> None:
+        '''
+        Compile the drawn frames into a GIF.
+        :param path: output file.
+        :return: None
+        '''
+        if self.frames:
+            self.frames[0].save(path, save_all=True, append_images=self.frames[1:],
+                                duration=int(1000 / self.fps), loop=0)
+        self.frames = []
+
+
+    def close(self) -> None:
+        '''
+        Save the GIF (if a path was given) and release the figure.
+        :return: None
+        '''
+        if self.path is not None:
+            self.save(self.path)
+        plt.close(self.fig)
@@ -0,0 +1,439 @@
+import numpy as np
+
+from math import floor
+
+from utils import color_index
+from utils import palette
+
+# settings['precision'] values (dtype of MLP weights and kinematics)
+PRECISIONS = ('float64', 'float32')
+
+
+def precision(settings: dict) -> np.dtype:
+    '''
+    Float dtype of weights and kinematic state.
+    :param settings: simulation configurations.
+    :returns: np.dtype
+    '''
+    if settings['precision'] not in PRECISIONS:
+        raise ValueError('precision must be one of '+str(PRECISIONS)+', not '+repr(settings['precision']))
+    return np.dtype(settings['precision'])
+
+
+def elite_threshold(fitness_counts: np.ndarray, n: int, elitism: float) -> int:
+    '''
+    Lowest fitness of the top elitism fraction of n organisms, from a
+    histogram of their fitness values.
+    :param fitness_counts: organisms per fitness value.
+    :param n: number of organisms.
+    :param elitism: elite fraction.
+    :returns: int
+    '''
+    if n == 0:
+        return 0
+
+    # rank counted from the fittest organism
+    rank = max(int(floor(n * elitism)), 1)
+    from_top = np.cumsum(fitness_counts[::-1])
+    return len(fitness_counts) - 1 - int(np.searchsorted(from_top, rank))
+
+
+class Column():
+    '''
+    Descriptor for NEOS state that lives in a Population array while
+    the organism is bound to one, and on the instance otherwise.
+    '''
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = '_' + name
+
+
+    def __get__(self, organism, objtype=None):
+        if organism is None:
+            return self
+        if organism._pop is None:
+            return getattr(organism, self.slot)
+        return getattr(organism._pop, self.name).item(organism._idx)
+
+
+    def __set__(self, organism, value) -> None:
+        if organism._pop is None:
+            setattr(organism, self.slot, value)
+        else:
+            getattr(organism._pop, self.name)[organism._idx] = value
+
+
+class ColorColumn(Column):
+    '''
+    Column storing a palette index, read and written as a color name.
+    '''
+    def __get__(self, organism, objtype=None):
+        if organism is None:
+            return self
+        return palette[super().__get__(organism)]
+
+
+    def __set__(self, organism, value) -> None:
+        super().__set__(organism, color_index(value))
+
+
+class GenomeColumn(Column):
+    '''
+    Column for MLP weights: a row of the population's weight arena while
+    the organism is bound (a view, so no per-organism array is kept), an
+    array of its own otherwise.
+    '''
+    def __get__(self, organism, objtype=None):
+        if organism is None:
+            return self
+        if organism._pop is None:
+            return getattr(organism, self.slot)
+        return getattr(organism._pop, self.name)[organism._idx]
+
+
+class FitnessColumn(Column):
+    '''
+    Fitness column that keeps the population's fitness histogram in step.
+    '''
+    def __set__(self, organism, value) -> None:
+        if organism._pop is None:
+            setattr(organism, self.slot, value)
+        else:
+            organism._pop.add_fitness(np.array([organism._idx]), np.array([value - self.__get__(organism)]))
+
+
+class Population():
+    '''
+    Struct-of-arrays store for the state of every live NEOS. Row i of each
+    array belongs to organisms[i]; the NEOS objects are thin views into it.
+    Live organisms are packed into rows [0, n) and rows [n, capacity) are
+    free: a birth takes row n, a death moves the last row into the hole.
+    Arrays (MLP weights included) are preallocated to the given capacity
+    and only grow (by doubling) when it is exceeded. The wih/who stacks are
+    the genome arena: a bound NEOS reads its weights as row views and
+    keeps no arrays of its own. Float state and weights use the given
+    dtype (see precision()).
+
+    A histogram of fitness values (non-negative integers) is maintained on
+    births, deaths and feeding, so the elite fitness threshold never needs
+    a sort. Change fitness through add_fitness() or the NEOS attribute.
+    '''
+    # per-organism state (name, dtype)
+    fields = (
+        ('x', np.float64),          # position (x)
+        ('y', np.float64),          # position (y)
+        ('r', np.float64),          # orientation   [0, 360]
+        ('v', np.float64),          # velocity      [0, v_max]
+        ('dv', np.float64),         # dv
+        ('d_food', np.float64),     # distance to nearest food
+        ('d_org', np.float64),      # distance to nearest mate
+        ('r_food', np.float64),     # orientation to nearest food
+        ('r_org', np.float64),      # orientation to nearest mate
+        ('nn_dv', np.float64),      # MLP response (velocity)
+        ('nn_dr', np.float64),      # MLP response (heading)
+        ('fitness', np.int64),      # fitness (food count)
+        ('age', np.int64),          # age
+        ('lifespan', np.int64),     # lifespan
+        ('gen', np.int64),          # generation of organism
+        ('color', np.int16),        # color (palette index)
+        ('id', np.int64),           # organism id, unique within the population
+        ('lineage', np.int64),      # record id in the lineage archive (-1 when not recorded)
+    )
+
+    def __init__(self, organisms=(), elitism: float = 0.20, capacity: int = None, dtype: np.dtype = np.float64):
+        self.organisms = []
+        self.n = 0
+        self.next_id = 0
+
+        # fitness histogram (count of organisms per fitness value)
+        self.elitism = elitism
+        self.fitness_counts = np.zeros(64, dtype=np.int64)
+        self._threshold = None
+
+        # stacked MLP weights (one row per organism), allocated on the first append
+        self.dtype = np.dtype(dtype)
+        self.wih = None
+        self.who = None
+
+        capacity = max(len(organisms), capacity or 0, 16)
+        for name, field_dtype in self.fields:
+            setattr(self, name, np.zeros(capacity, dtype=self.dtype if field_dtype is np.float64 else field_dtype))
+
+        for organism in organisms:
+            self.append(organism)
+
+
+    def __len__(self) -> int:
+        return self.n
+
+
+    def __iter__(self):
+        return iter(self.organisms)
+
+
+    def __getitem__(self, idx):
+        return self.organisms[idx]
+
+
+    @property
+    def capacity(self) -> int:
+        '''
+        Number of preallocated rows.
+        '''
+        return len(self.x)
+
+
+    def _grow(self) -> None:
+        '''
+        Double the capacity of every state array.
+        :returns: None
+        '''
+        for name in [name for name, _ in self.fields] + ['wih', 'who']:
+            old = getattr(self, name)
+            new = np.zeros((2 * len(old),) + old.shape[1:], dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+
+    def append(self, organism) -> None:
+        '''
+        Bind an organism to the next free row.
+        :param organism: NEOS to add.
+        :returns: None
+        '''
+        if organism._pop is not None:
+            organism._detach()
+        if self.wih is None:
+            self.wih = np.zeros((self.capacity,) + np.shape(organism.wih), dtype=self.dtype)
+            self.who = np.zeros((self.capacity,) + np.shape(organism.who), dtype=self.dtype)
+        if self.n == self.capacity:
+            self._grow()
+
+        # move the state into the arrays (the organism keeps no copy)
+        idx = self.n
+        for name, _ in self.fields:
+            getattr(self, name)[idx] = getattr(organism, '_' + name)
+            setattr(organism, '_' + name, None)
+        self.wih[idx] = organism._wih
+        self.who[idx] = organism._who
+        organism._wih = None
+        organism._who = None
+        if self.id[idx] < 0:
+            self.id[idx] = self.next_id
+            self.next_id += 1
+        self._count_fitness(self.fitness[idx:idx + 1], 1)
+        organism._pop = self
+        organism._idx = idx
+
+        self.organisms.append(organism)
+        self.n += 1
+
+
+    def remove(self, organism) -> None:
+        '''
+        Unbind an organism, moving the last row into its place.
+        :param organism: NEOS to remove.
+        :returns: None
+        '''
+        if organism._pop is not self:
+            raise ValueError('Population.remove(x): x not in population')
+
+        idx = organism._idx
+        self._count_fitness(self.fitness[idx:idx + 1], -1)
+        organism._detach()
+
+        last = self.n - 1
+        if idx != last:
+            for name in [name for name, _ in self.fields] + ['wih', 'who']:
+                arr = getattr(self, name)
+                arr[idx] = arr[last]
+            moved = self.organisms[last]
+            moved._idx = idx
+            self.organisms[idx] = moved
+
+        self.organisms.pop()
+        self.n -= 1
+
+
+    def _count_fitness(self, values: np.ndarray, delta: int) -> None:
+        '''
+        Add delta to the histogram bins of the given fitness values.
+        :param values: fitness values.
+        :param delta: +1 to count, -1 to uncount.
+        :returns: None
+        '''
+        if len(values) == 0:
+            return
+        top = int(values.max())
+        if top >= len(self.fitness_counts):
+            counts = np.zeros(max(2 * len(self.fitness_counts), top + 1), dtype=np.int64)
+            counts[:len(self.fitness_counts)] = self.fitness_counts
+            self.fitness_counts = counts
+        np.add.at(self.fitness_counts, values, delta)
+        self._threshold = None
+
+
+    def add_fitness(self, rows: np.ndarray, amounts: np.ndarray) -> None:
+        '''
+        Add to the fitness of organisms, keeping the histogram in step.
+        Rows may repeat.
+        :param rows: row numbers.
+        :param amounts: fitness to add for each row.
+        :returns: None
+        '''
+        changed = np.unique(rows)
+        self._count_fitness(self.fitness[changed], -1)
+        np.add.at(self.fitness, rows, amounts)
+        self._count_fitness(self.fitness[changed], 1)
+
+
+    @property
+    def fitness_threshold(self) -> int:
+        '''
+        Lowest fitness of the top elitism fraction of organisms, cached
+        until fitness or membership changes.
+        '''
+        if self._threshold is None:
+            self._threshold = elite_threshold(self.fitness_counts, self.n, self.elitism)
+        return self._threshold
+
+
+    def extend(self, organisms: list) -> None:
+        '''
+        Bind several organisms.
+        :param organisms: list of NEOS to add.
+        :returns: None
+        '''
+        for organism in organisms:
+            self.append(organism)
+
+
+    def remove_rows(self, rows: np.ndarray) -> list:
+        '''
+        Unbind the organisms at several rows at once. Rows end up exactly
+        as if they were removed one by one from the highest down.
+        :param rows: row numbers to remove (unique).
+        :returns: list of the removed NEOS, in row order.
+        '''
+        rows = np.sort(rows)
+        if len(rows) == 0:
+            return []
+        removed = [self.organisms[idx] for idx in rows.tolist()]
+        self._count_fitness(self.fitness[rows], -1)
+        for organism in removed:
+            organism._detach()
+
+        # replay the swaps on row numbers only, then move the data once
+        n = self.n
+        source = {}     # row -> row whose data ends up there
+        for row in reversed(rows.tolist()):
+            n -= 1
+            source[row] = source.get(n, n)
+        moves = [(hole, src) for hole, src in source.items() if hole < n]
+        holes = np.array([hole for hole, _ in moves], dtype=np.int64)
+        sources = np.array([src for _, src in moves], dtype=np.int64)
+
+        for name in [name for name, _ in self.fields] + ['wih', 'who']:
+            arr = getattr(self, name)
+            arr[holes] = arr[sources]
+        for hole, source in zip(holes.tolist(), sources.tolist()):
+            moved = self.organisms[source]
+            moved._idx = hole
+            self.organisms[hole] = moved
+
+        del self.organisms[n:]
+        self.n = n
+        return removed
+
+
+    def target(self) -> np.ndarray:
+        '''
+        Heading each NEOS steers by: r_org past 75% of its lifespan, else r_food.
+        :returns: array of headings.
+        '''
+        n = self.n
+        seek_mate = self.age[:n] > self.lifespan[:n] * 0.75
+        return np.where(seek_mate, self.r_org[:n], self.r_food[:n])
+
+
+    def think(self, inputs: np.ndarray = None) -> None:
+        '''
+        Neural network of every NEOS, evaluated as one batched forward pass.
+        :param inputs: (N, inner_nodes) input matrix (see sensors.py); None
+        for the single target() input.
+        :returns: None
+        '''
+        if self.n == 0:
+            return
+
+        n = self.n
+        if inputs is None:
+            inputs = self.target()[:, None]
+
+        # MLP
+        h1 = np.tanh(np.matmul(self.wih[:n], inputs[:, :, None]))      # hidden layer
+        out = np.tanh(np.matmul(self.who[:n], h1))                      # output layer
+
+        # Update dv and dr with MLP response
+        self.nn_dv[:n] = out[:, 0, 0]    # [-1, 1]  (accelerate=1, deaccelerate=-1)
+        self.nn_dr[:n] = out[:, 1, 0]    # [-1, 1]  (left=1, right=-1)
+
+
+    def update_r(self, settings: dict) -> None:
+        '''
+        Update the heading of every NEOS.
+        :param settings: simulation configurations.
+        :return: None
+        '''
+        r = self.r[:self.n]
+        r += self.nn_dr[:self.n] * settings['dr_max'] * settings['dt']
+        np.mod(r, 360, out=r)
+
+
+    def update_vel(self, settings: dict) -> None:
+        '''
+        Update the velocity of every NEOS.
+        :param settings: simulation configurations.
+        :return: None
+        '''
+        v = self.v[:self.n]
+        v += self.nn_dv[:self.n] * settings['dv_max'] * settings['dt']
+        np.clip(v, 0, settings['v_max'], out=v)
+
+
+    def update_pos(self, settings: dict) -> None:
+        '''
+        Update the position of every NEOS, clamped to the experiment borders.
+        :param settings: simulation configurations.
+        :return: None
+        '''
+        x = self.x[:self.n]
+        y = self.y[:self.n]
+        v = self.v[:self.n]
+        theta = np.radians(self.r[:self.n])
+
+        x += v * np.cos(theta) * settings['dt']
+        y += v * np.sin(theta) * settings['dt']
+        np.clip(x, settings['x_min'], settings['x_max'], out=x)
+        np.clip(y, settings['y_min'], settings['y_max'], out=y)
+
+
+    def update_age(self) -> None:
+        '''
+        Update the age of every NEOS.
+        :return: None
+        '''
+        self.age[:self.n] += 1
+
+
+    def integrate(self, settings: dict) -> None:
+        '''
+        Advance heading, velocity, position and age of the whole population
+        by one time step.
+        :param settings: simulation configurations.
+        :return: None
+        '''
+        self.update_r(settings)
+        self.update_vel(settings)
+        self.update_pos(settings)
+        self.update_age()
@@ -0,0 +1,81 @@
+# Offline renderer: turns trajectory logs recorded by simulate() into
+# gen_N.gif animations, one generation per worker process.
+#
+#   python render.py gen_*.traj --workers 8 --fps 15 --dpi 100
+
+import argparse
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+def render_trajectory(path: str, out: str = None, fps: int = 15, dpi: int = 100) -> str:
+    '''
+    Render one trajectory log into a GIF.
+    :param path: trajectory log directory.
+    :param out: output GIF (defaults to gen_N.gif next to the log).
+    :param fps: frames per second of the GIF.
+    :param dpi: resolution of the GIF.
+    :return: path of the GIF.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+
+    from plotting import Renderer
+    from trajectory import Trajectory
+
+    trajectory = Trajectory(path)
+    meta = trajectory.meta
+    if out is None:
+        out = os.path.join(os.path.dirname(os.path.abspath(path)), 'gen_'+str(meta['gen'])+'.gif')
+
+    renderer = Renderer(meta, meta['gen'], path=out, fps=fps, dpi=dpi, colors=meta['palette'])
+    for i in range(len(trajectory)):
+        organisms, food = trajectory.frame(i)
+        renderer.draw(organisms['x'], organisms['y'], organisms['r'], organisms['color'], food['x'], food['y'])
+    renderer.close()
+
+    return out
+
+
+def render_all(paths: list, out_dir: str = None, workers: int = None, fps: int = 15, dpi: int = 100) -> list:
+    '''
+    Render many trajectory logs in parallel.
+    :param paths: trajectory log directories.
+    :param out_dir: directory for the GIFs (defaults to next to each log).
+    :param workers: number of worker processes (defaults to CPU count).
+    :param fps: frames per second of the GIFs.
+    :param dpi: resolution of the GIFs.
+    :return: list of GIF paths.
+    '''
+    outs = []
+    for path in paths:
+        if out_dir is None:
+            outs.append(None)
+        else:
+            name = os.path.basename(os.path.normpath(path))
+            outs.append(os.path.join(out_dir, os.path.splitext(name)[0]+'.gif'))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(render_trajectory, path, out, fps, dpi) for path, out in zip(paths, outs)]
+        return [job.result() for job in jobs]
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='Render NEOS trajectory logs into GIFs.')
+    parser.add_argument('paths', nargs='+', help='trajectory log directories (gen_N.traj)')
+    parser.add_argument('--out-dir', default=None, help='directory for the GIFs')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--fps', type=int, default=15, help='frames per second')
+    parser.add_argument('--dpi', type=int, default=100, help='resolution')
+    args = parser.parse_args(argv)
+
+    if args.out_dir is not None:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    for out in render_all(args.paths, args.out_dir, args.workers, args.fps, args.dpi):
+        print('SAVED', out)
+
+
+if __name__ == "__main__":
+    main()
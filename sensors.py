@@ -0,0 +1,142 @@
+# Sensor stage: the inputs of the NEOS neural net, built for the whole
+# population at once as an (N, K) matrix (one row per organism, one column
+# per input node). settings['sensors'] lists the sensors in input order:
+#
+#   'target'    heading to the nearest food, or to the nearest mate past
+#               75% of the lifespan (the original single input)
+#   'food'      heading and distance of the settings['food_k'] nearest foods
+#   'mate'      heading and distance of the nearest organism ready to mate
+#               (fitness above the threshold and older than settings['mature'],
+#               as in mate(); the 'target' mate of sense() ignores age)
+#   'velocity'  own velocity over v_max
+#   'age'       own age over lifespan
+#
+# Headings are in [-1, 1] relative to the organism's orientation (see
+# calc_headings) and distances are divided by the arena diagonal. Missing
+# neighbours (fewer foods than food_k, no ready mate) read as heading 0 at
+# distance 1. settings['inner_nodes'] must equal sensor_count(settings).
+
+from math import hypot
+
+import numpy as np
+
+from spatial import UniformGrid
+from utils import calc_headings
+
+SENSORS = ('target', 'food', 'mate', 'velocity', 'age')
+
+# sensors that need no neighbour queries (the only ones in tiled runs)
+LOCAL_SENSORS = ('target', 'velocity', 'age')
+
+
+def sensor_columns(settings: dict) -> list:
+    '''
+    Names of the input columns, in order.
+    :param settings: simulation configurations.
+    :returns: list of column names.
+    '''
+    columns = []
+    for sensor in settings['sensors']:
+        if sensor == 'food':
+            for k in range(settings['food_k']):
+                columns += ['food'+str(k)+'_heading', 'food'+str(k)+'_distance']
+        elif sensor == 'mate':
+            columns += ['mate_heading', 'mate_distance']
+        else:
+            columns.append(sensor)
+    return columns
+
+
+def sensor_count(settings: dict) -> int:
+    '''
+    Number of input nodes the sensors feed.
+    :param settings: simulation configurations.
+    :returns: int
+    '''
+    return len(sensor_columns(settings))
+
+
+class SensorStage():
+    '''
+    Builds the input matrix of a population each time step. The matrix is a
+    view of a buffer reused between steps, valid until the next call.
+    '''
+    def __init__(self, settings: dict, grid: type = UniformGrid):
+        self.settings = settings
+        self.grid = grid                    # grid class (from the compute backend)
+        self.sensors = list(settings['sensors'])
+        self.food_k = settings['food_k']
+        self.diagonal = hypot(settings['x_max'] - settings['x_min'], settings['y_max'] - settings['y_min'])
+        self.width = sensor_count(settings)
+        self.buffer = None
+
+
+    def inputs(self, organisms, foods, threshold: int) -> np.ndarray:
+        '''
+        Input matrix of every organism.
+        :param organisms: Population.
+        :param foods: FoodField (unused without the 'food' sensor).
+        :param threshold: boundary fitness of elite organisms (for 'mate').
+        :returns: (N, K) array in the population's precision.
+        '''
+        n = len(organisms)
+        if self.buffer is None or len(self.buffer) < n or self.buffer.dtype != organisms.dtype:
+            self.buffer = np.empty((max(n, 2 * len(self.buffer) if self.buffer is not None else 0), self.width), dtype=organisms.dtype)
+        out = self.buffer[:n]
+        if n == 0:
+            return out
+
+        col = 0
+        for sensor in self.sensors:
+            if sensor == 'target':
+                out[:, col] = organisms.target()
+                col += 1
+            elif sensor == 'food':
+                self.food(organisms, foods, out[:, col:col + 2 * self.food_k])
+                col += 2 * self.food_k
+            elif sensor == 'mate':
+                self.mate(organisms, threshold, out[:, col:col + 2])
+                col += 2
+            elif sensor == 'velocity':
+                out[:, col] = organisms.v[:n] / self.settings['v_max']
+                col += 1
+            elif sensor == 'age':
+                out[:, col] = organisms.age[:n] / organisms.lifespan[:n]
+                col += 1
+        return out
+
+
+    def relative(self, organisms, d: np.ndarray, idx: np.ndarray, px: np.ndarray, py: np.ndarray, out: np.ndarray) -> None:
+        '''
+        Write heading and distance columns for neighbour query results.
+        :param organisms: Population.
+        :param d: (N, k) distances.
+        :param idx: (N, k) neighbour indices into px/py (-1 when missing).
+        :param px: x positions of the neighbours.
+        :param py: y positions of the neighbours.
+        :param out: (N, 2k) columns to fill (heading, distance pairs).
+        :returns: None
+        '''
+        n = len(organisms)
+        found = idx >= 0
+        rows = np.broadcast_to(np.arange(n)[:, None], idx.shape)[found]
+        headings = np.zeros(idx.shape)
+        headings[found] = calc_headings(organisms.x[rows], organisms.y[rows], organisms.r[rows], px[idx[found]], py[idx[found]])
+        out[:, 0::2] = headings
+        out[:, 1::2] = np.minimum(d / self.diagonal, 1)
+
+
+    def food(self, organisms, foods, out: np.ndarray) -> None:
+        n = len(organisms)
+        d, idx = foods.bins(self.grid).nearest_k(organisms.x[:n], organisms.y[:n], self.food_k)
+        self.relative(organisms, d, idx, foods.x, foods.y, out)
+
+
+    def mate(self, organisms, threshold: int, out: np.ndarray) -> None:
+        n = len(organisms)
+        x, y = organisms.x[:n], organisms.y[:n]
+        ready = np.flatnonzero((organisms.fitness[:n] > threshold) & (organisms.age[:n] > self.settings['mature']))
+        mate_grid = self.grid.for_points(self.settings, len(ready))
+        mate_grid.build(x[ready], y[ready], ready)
+        d, idx = mate_grid.nearest_k(x, y, 1, exclude=np.arange(n))
+        self.relative(organisms, d, idx, x, y, out)
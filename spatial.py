@@ -0,0 +1,270 @@
+import numpy as np
+
+from math import ceil
+from math import sqrt
+
+
+def ring_offsets(k: int) -> np.ndarray:
+    '''
+    Cell offsets at Chebyshev distance k from a cell.
+    :param k: ring number (0 is the cell itself).
+    :returns: (M, 2) array of (dx, dy) offsets.
+    '''
+    if k == 0:
+        return np.zeros((1, 2), dtype=np.int64)
+    side = np.arange(-k, k + 1)
+    top = np.stack([side, np.full_like(side, k)], axis=1)
+    bottom = np.stack([side, np.full_like(side, -k)], axis=1)
+    inner = np.arange(-k + 1, k)
+    left = np.stack([np.full_like(inner, -k), inner], axis=1)
+    right = np.stack([np.full_like(inner, k), inner], axis=1)
+    return np.concatenate([top, bottom, left, right])
+
+
+class UniformGrid():
+    '''
+    Uniform grid over the experiment area. Points are bucketed by cell
+    (sorted by cell key) so that all queries are answered with array ops.
+    Points and queries are expected to lie inside the area.
+    '''
+    def __init__(self, x_min: float, x_max: float, y_min: float, y_max: float, cell_size: float):
+        self.x_min = x_min
+        self.y_min = y_min
+        self.cell_size = cell_size
+        self.nx = max(int(ceil((x_max - x_min) / cell_size)), 1)
+        self.ny = max(int(ceil((y_max - y_min) / cell_size)), 1)
+        self.build(np.empty(0), np.empty(0))
+
+
+    @classmethod
+    def for_points(cls, settings: dict, n: int):
+        '''
+        Grid sized so that each cell holds about one of n uniformly spread points.
+        :param settings: simulation configurations.
+        :param n: expected number of points.
+        :returns: UniformGrid.
+        '''
+        width = settings['x_max'] - settings['x_min']
+        height = settings['y_max'] - settings['y_min']
+        cell_size = sqrt(width * height / max(n, 1))
+        return cls(settings['x_min'], settings['x_max'], settings['y_min'], settings['y_max'], cell_size)
+
+
+    def cells(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        '''
+        Cell coordinates of points, clipped to the grid.
+        :param x: x positions.
+        :param y: y positions.
+        :returns: cell column and row arrays.
+        '''
+        cx = np.floor((x - self.x_min) / self.cell_size).astype(np.int64)
+        cy = np.floor((y - self.y_min) / self.cell_size).astype(np.int64)
+        np.clip(cx, 0, self.nx - 1, out=cx)
+        np.clip(cy, 0, self.ny - 1, out=cy)
+        return cx, cy
+
+
+    def build(self, x: np.ndarray, y: np.ndarray, index: np.ndarray = None) -> None:
+        '''
+        Bucket points into the grid.
+        :param x: x positions.
+        :param y: y positions.
+        :param index: ids reported for the points (defaults to 0..n-1).
+        :returns: None
+        '''
+        if index is None:
+            index = np.arange(len(x))
+        cx, cy = self.cells(x, y)
+        keys = cy * self.nx + cx
+        order = np.argsort(keys, kind='stable')
+
+        self.keys = keys[order]
+        self.x = x[order]
+        self.y = y[order]
+        self.index = index[order]
+
+
+    def remove(self, ids: np.ndarray, x: np.ndarray, y: np.ndarray) -> None:
+        '''
+        Take points out of the grid without rebuilding it.
+        :param ids: ids of the points.
+        :param x: their x positions (as bucketed).
+        :param y: their y positions (as bucketed).
+        :returns: None
+        '''
+        cx, cy = self.cells(x, y)
+        owner, pos = self.candidates(cx, cy, ring_offsets(0))
+        keep = np.ones(len(self.keys), dtype=bool)
+        keep[pos[self.index[pos] == ids[owner]]] = False
+
+        self.keys = self.keys[keep]
+        self.x = self.x[keep]
+        self.y = self.y[keep]
+        self.index = self.index[keep]
+
+
+    def insert(self, ids: np.ndarray, x: np.ndarray, y: np.ndarray) -> None:
+        '''
+        Add points to the grid without rebuilding it: each goes in after
+        the points already in its cell.
+        :param ids: ids of the points.
+        :param x: x positions.
+        :param y: y positions.
+        :returns: None
+        '''
+        cx, cy = self.cells(x, y)
+        keys = cy * self.nx + cx
+        order = np.argsort(keys, kind='stable')
+        at = np.searchsorted(self.keys, keys[order], 'right')
+
+        self.keys = np.insert(self.keys, at, keys[order])
+        self.x = np.insert(self.x, at, x[order])
+        self.y = np.insert(self.y, at, y[order])
+        self.index = np.insert(self.index, at, ids[order])
+
+
+    def candidates(self, qcx: np.ndarray, qcy: np.ndarray, offsets: np.ndarray) -> tuple:
+        '''
+        All (query, point) pairs whose cells are at the given offsets.
+        :param qcx: cell column of each query.
+        :param qcy: cell row of each query.
+        :param offsets: (M, 2) cell offsets to visit.
+        :returns: query positions and sorted-point positions of every pair.
+        '''
+        cx = qcx[:, None] + offsets[:, 0]
+        cy = qcy[:, None] + offsets[:, 1]
+        valid = (cx >= 0) & (cx < self.nx) & (cy >= 0) & (cy < self.ny)
+        owner = np.broadcast_to(np.arange(len(qcx))[:, None], cx.shape)[valid]
+        keys = (cy * self.nx + cx)[valid]
+
+        start = np.searchsorted(self.keys, keys, 'left')
+        counts = np.searchsorted(self.keys, keys, 'right') - start
+        firsts = np.cumsum(counts) - counts
+
+        owner = np.repeat(owner, counts)
+        pos = np.arange(counts.sum()) + np.repeat(start - firsts, counts)
+        return owner, pos
+
+
+    def within(self, qx: np.ndarray, qy: np.ndarray, radius: float, exclude: np.ndarray = None) -> tuple:
+        '''
+        All (query, point) pairs at most radius apart, ordered by query
+        and then by point id.
+        :param qx: query x positions.
+        :param qy: query y positions.
+        :param radius: contact distance.
+        :param exclude: point id each query must skip (e.g. itself).
+        :returns: query positions, point ids and distances of every pair.
+        '''
+        reach = int(ceil(radius / self.cell_size))
+        side = np.arange(-reach, reach + 1)
+        offsets = np.stack(np.meshgrid(side, side), axis=-1).reshape(-1, 2)
+
+        qcx, qcy = self.cells(qx, qy)
+        q, pos = self.candidates(qcx, qcy, offsets)
+        ids = self.index[pos]
+        if exclude is not None:
+            keep = ids != exclude[q]
+            q, pos, ids = q[keep], pos[keep], ids[keep]
+
+        d = np.sqrt((self.x[pos] - qx[q])**2 + (self.y[pos] - qy[q])**2)
+        keep = d <= radius
+        q, ids, d = q[keep], ids[keep], d[keep]
+
+        order = np.lexsort((ids, q))
+        return q[order], ids[order], d[order]
+
+
+    def nearest(self, qx: np.ndarray, qy: np.ndarray, exclude: np.ndarray = None) -> tuple:
+        '''
+        Nearest point to every query, searching rings of cells outwards
+        until no unvisited cell can hold anything closer. Ties go to the
+        lowest point id.
+        :param qx: query x positions.
+        :param qy: query y positions.
+        :param exclude: point id each query must skip (e.g. itself).
+        :returns: distance (inf if none) and point id (-1 if none) per query.
+        '''
+        best_d = np.full(len(qx), np.inf)
+        best_i = np.full(len(qx), -1, dtype=np.int64)
+        if len(self.keys) == 0:
+            return best_d, best_i
+
+        qcx, qcy = self.cells(qx, qy)
+        active = np.arange(len(qx))
+        for k in range(0, max(self.nx, self.ny)):
+            owner, pos = self.candidates(qcx[active], qcy[active], ring_offsets(k))
+            q = active[owner]
+            ids = self.index[pos]
+            if exclude is not None:
+                keep = ids != exclude[q]
+                q, pos, ids = q[keep], pos[keep], ids[keep]
+
+            if len(q):
+                d = np.sqrt((self.x[pos] - qx[q])**2 + (self.y[pos] - qy[q])**2)
+
+                # closest candidate per query
+                order = np.lexsort((ids, d, q))
+                q, d, ids = q[order], d[order], ids[order]
+                first = np.ones(len(q), dtype=bool)
+                first[1:] = q[1:] != q[:-1]
+                q, d, ids = q[first], d[first], ids[first]
+
+                better = (d < best_d[q]) | ((d == best_d[q]) & (ids < best_i[q]))
+                best_d[q[better]] = d[better]
+                best_i[q[better]] = ids[better]
+
+            # anything beyond ring k is at least k cells away
+            active = active[best_d[active] >= k * self.cell_size * (1 - 1e-9)]
+            if len(active) == 0:
+                break
+
+        return best_d, best_i
+
+
+    def nearest_k(self, qx: np.ndarray, qy: np.ndarray, k: int, exclude: np.ndarray = None) -> tuple:
+        '''
+        The k nearest points to every query, closest first, searching rings
+        of cells like nearest(). Ties go to the lowest point id.
+        :param qx: query x positions.
+        :param qy: query y positions.
+        :param k: number of neighbours.
+        :param exclude: point id each query must skip (e.g. itself).
+        :returns: (Q, k) distances (inf where fewer than k points) and point ids (-1 there).
+        '''
+        best_d = np.full((len(qx), k), np.inf)
+        best_i = np.full((len(qx), k), -1, dtype=np.int64)
+        if len(self.keys) == 0 or k == 0:
+            return best_d, best_i
+
+        qcx, qcy = self.cells(qx, qy)
+        active = np.arange(len(qx))
+        for ring in range(0, max(self.nx, self.ny)):
+            owner, pos = self.candidates(qcx[active], qcy[active], ring_offsets(ring))
+            q = active[owner]
+            ids = self.index[pos]
+            if exclude is not None:
+                keep = ids != exclude[q]
+                q, pos, ids = q[keep], pos[keep], ids[keep]
+
+            if len(q):
+                d = np.sqrt((self.x[pos] - qx[q])**2 + (self.y[pos] - qy[q])**2)
+
+                # merge the candidates with the current best k of their queries
+                touched = np.unique(q)
+                q = np.concatenate([np.repeat(touched, k), q])
+                d = np.concatenate([best_d[touched].ravel(), d])
+                ids = np.concatenate([best_i[touched].ravel(), ids])
+                order = np.lexsort((ids, d, q))
+                q, d, ids = q[order], d[order], ids[order]
+                rank = np.arange(len(q)) - np.searchsorted(q, q)
+                keep = rank < k
+                best_d[q[keep], rank[keep]] = d[keep]
+                best_i[q[keep], rank[keep]] = ids[keep]
+
+            # anything beyond ring k is at least k cells away
+            active = active[best_d[active, k - 1] >= ring * self.cell_size * (1 - 1e-9)]
+            if len(active) == 0:
+                break
+
+        return best_d, best_i
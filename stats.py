@@ -0,0 +1,189 @@
+import csv
+import os
+
+import numpy as np
+
+
+class StatsAccumulator():
+    '''
+    Streaming fitness stats of one generation. Organisms are added once,
+    with their final fitness, when they die or survive the generation, so
+    nothing has to be kept alive to summarize it. Variance is merged batch
+    by batch (Chan et al. form of Welford's update).
+    '''
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0                                   # sum of squared deviations
+        self.histogram = np.zeros(64, dtype=np.int64)   # organisms per fitness value
+
+        self.born = 0
+        self.died = 0
+        self.survived = 0
+
+
+    def add(self, fitness: np.ndarray) -> None:
+        '''
+        Add the final fitness of a batch of organisms.
+        :param fitness: fitness values.
+        :returns: None
+        '''
+        fitness = np.asarray(fitness, dtype=np.int64)
+        n = len(fitness)
+        if n == 0:
+            return
+
+        mean = fitness.mean()
+        self._combine(n, mean, ((fitness - mean)**2).sum(), int(fitness.sum()), int(fitness.min()), int(fitness.max()),
+                      np.bincount(fitness))
+
+
+    def _combine(self, n: int, mean: float, m2: float, total: int, low: int, high: int, histogram: np.ndarray) -> None:
+        count = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / count
+        self.m2 += m2 + delta**2 * self.count * n / count
+        self.count = count
+
+        self.sum += total
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+        if len(histogram) > len(self.histogram):
+            histogram, self.histogram = self.histogram, histogram.copy()
+        self.histogram[:len(histogram)] += histogram
+
+
+    def merge(self, other) -> None:
+        '''
+        Add the organisms and event counts of another accumulator.
+        :param other: StatsAccumulator.
+        :returns: None
+        '''
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.sum, other.min, other.max, other.histogram)
+        self.born += other.born
+        self.died += other.died
+        self.survived += other.survived
+
+
+    def record_births(self, n: int) -> None:
+        '''
+        Count organisms born during the generation.
+        :param n: number of births.
+        :returns: None
+        '''
+        self.born += n
+
+
+    def record_deaths(self, fitness: np.ndarray) -> None:
+        '''
+        Add organisms that died.
+        :param fitness: final fitness of the dead organisms.
+        :returns: None
+        '''
+        self.died += len(fitness)
+        self.add(fitness)
+
+
+    def record_survivors(self, fitness: np.ndarray) -> None:
+        '''
+        Add organisms alive at the end of the generation.
+        :param fitness: final fitness of the survivors.
+        :returns: None
+        '''
+        self.survived += len(fitness)
+        self.add(fitness)
+
+
+    @property
+    def variance(self) -> float:
+        '''
+        Population variance of fitness.
+        '''
+        return self.m2 / self.count if self.count else 0.0
+
+
+    def summary(self) -> dict:
+        '''
+        Generation stats: SURVIVED, DIED, BEST, WORST, SUM, COUNT, AVG,
+        BORN and VAR. WORST is the lowest final fitness, 0 included.
+        :returns: dict
+        '''
+        return {
+            'SURVIVED': self.survived,
+            'DIED': self.died,
+            'BEST': self.max or 0,
+            'WORST': self.min or 0,
+            'SUM': self.sum,
+            'COUNT': self.count,
+            'AVG': self.sum / self.count if self.count else 0.0,
+            'BORN': self.born,
+            'VAR': float(self.variance),
+        }
+
+
+class MetricsLog():
+    '''
+    Append-only CSV logs of a run: steps.csv (one row per time step) and
+    generations.csv (one row per generation). Headers are written when a
+    file is created, so resumed runs keep appending to the same files.
+    '''
+    step_fields = ['gen', 'step', 'population', 'births', 'deaths', 'eaten', 'best', 'avg']
+    generation_fields = ['gen', 'SURVIVED', 'DIED', 'BEST', 'WORST', 'SUM', 'COUNT', 'AVG', 'BORN', 'VAR']
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.steps_file, self.steps = self._open(os.path.join(path, 'steps.csv'), self.step_fields)
+        self.generations_file, self.generations = self._open(os.path.join(path, 'generations.csv'), self.generation_fields)
+
+
+    def _open(self, path: str, fields: list) -> tuple:
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        f = open(path, 'a', newline='')
+        writer = csv.writer(f)
+        if new:
+            writer.writerow(fields)
+        return f, writer
+
+
+    def step(self, gen: int, step: int, organisms, births: int, deaths: int, eaten: int) -> None:
+        '''
+        Append the metrics of a time step.
+        :param gen: generation number.
+        :param step: time step number.
+        :param organisms: population after the step.
+        :param births: organisms born during the step.
+        :param deaths: organisms that died during the step.
+        :param eaten: food particles eaten during the step.
+        :returns: None
+        '''
+        n = len(organisms)
+        fitness = organisms.fitness[:n]
+        best = int(fitness.max()) if n else 0
+        avg = float(fitness.mean()) if n else 0.0
+        self.steps.writerow([gen, step, n, births, deaths, eaten, best, avg])
+
+
+    def generation(self, gen: int, stats: dict) -> None:
+        '''
+        Append the stats of a generation.
+        :param gen: generation number.
+        :param stats: generation stats (StatsAccumulator.summary()).
+        :returns: None
+        '''
+        self.generations.writerow([gen] + [stats[key] for key in self.generation_fields[1:]])
+        self.steps_file.flush()
+        self.generations_file.flush()
+
+
+    def close(self) -> None:
+        '''
+        Close the CSV files.
+        :returns: None
+        '''
+        self.steps_file.close()
+        self.generations_file.close()
@@ -0,0 +1,27 @@
+import importlib.util
+import warnings
+
+import pytest
+
+from backends import NumbaBackend
+from backends import compare_backends
+from backends import main
+from config import settings
+
+
+def test_kernels_match_numpy():
+    '''
+    The Numba kernels, run as plain Python, agree with the NumPy reference
+    along a seeded run: same queries, same state up to rounding.
+    '''
+    result = compare_backends(dict(settings), NumbaBackend(jit=lambda f: f), pop_size=60, steps=4, seed=3)
+    assert result['steps'] == 4
+    assert result['mismatches'] == 0
+    assert max(result['deviation'].values()) < 1e-12
+
+
+@pytest.mark.skipif(importlib.util.find_spec('numba') is not None, reason='numba is installed')
+def test_missing_numba_is_not_a_match():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        assert main(['--backend', 'numba', '--pop', '10', '--steps', '1']) != 0
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+
+from cache import ResultCache
+from config import settings
+from evo_sim import new_organism
+from evo_sim import run_generations
+from food import FoodField
+
+
+def short_run(**overrides) -> dict:
+    short = dict(settings, render=False, gens=3, total_time_steps=120, pop_size=20, food_num=40)
+    short.update(overrides)
+    return short
+
+
+def world(s: dict, seed: int) -> tuple:
+    rng = np.random.default_rng(seed)
+    organisms = [new_organism(s, i, rng) for i in range(s['pop_size'])]
+    foods = FoodField(s, rng)
+    return organisms, foods, rng
+
+
+def test_key_depends_only_on_the_inputs(tmp_path):
+    cache = ResultCache(str(tmp_path), 1)
+    s = short_run()
+    organisms, foods, rng = world(s, 0)
+    key = cache.key(s, 2, organisms, foods, rng)
+
+    assert cache.key(dict(s, render=True, gens=50, cache_size_mb=1), 2, organisms, foods, rng) == key
+    assert cache.key(dict(s, mutate=s['mutate'] / 2), 2, organisms, foods, rng) != key
+    assert cache.key(s, 3, organisms, foods, rng) != key
+    organisms[0].x += 1e-9
+    assert cache.key(s, 2, organisms, foods, rng) != key
+
+
+def test_hit_restores_foods_and_rng(tmp_path):
+    cache = ResultCache(str(tmp_path), 1)
+    s = short_run()
+    organisms, foods, rng = world(s, 1)
+    assert cache.get('missing', s, foods, rng) is None
+
+    key = cache.key(s, 0, organisms, foods, rng)
+    after = FoodField(s, rng)
+    after.energy[:3] = 0
+    cache.put(key, s, organisms[:5], after, rng, {'BEST': 4})
+
+    restored = FoodField(s, np.random.default_rng(9))
+    rng2 = np.random.default_rng(9)
+    survivors, stats = cache.get(key, s, restored, rng2)
+    assert stats == {'BEST': 4}
+    assert [o.name for o in survivors] == [o.name for o in organisms[:5]]
+    for name in ('x', 'y', 'energy'):
+        assert np.array_equal(getattr(restored, name), getattr(after, name))
+    assert np.array_equal(rng2.random(4), rng.random(4))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    s = short_run()
+    organisms, foods, rng = world(s, 2)
+    cache = ResultCache(str(tmp_path), 1)
+    cache.put('a', s, organisms, foods, rng, {})
+    size = os.path.getsize(cache.file('a'))
+
+    # room for two entries; 'a' is used again so 'b' is the oldest
+    cache.max_bytes = 2 * size + size // 2
+    cache.put('b', s, organisms, foods, rng, {})
+    os.utime(cache.file('b'), (1, 1))
+    assert cache.get('a', s, foods, rng) is not None
+    cache.put('c', s, organisms, foods, rng, {})
+    assert sorted(os.listdir(tmp_path)) == ['a.npz', 'c.npz']
+
+
+def test_cached_run_matches_and_adds_nothing(tmp_path):
+    '''
+    A repeated run is served from the cache: same history, no new entries.
+    '''
+    full = run_generations(short_run(), np.random.default_rng(7), verbose=False)
+    cached = short_run(cache_dir=str(tmp_path))
+    assert run_generations(cached, np.random.default_rng(7), verbose=False) == full
+    entries = sorted(os.listdir(tmp_path))
+    assert len(entries) == len(full)
+
+    # hits only touch the entries; a re-simulated generation would replace its file
+    inodes = [os.stat(os.path.join(tmp_path, e)).st_ino for e in entries]
+    assert run_generations(cached, np.random.default_rng(7), verbose=False) == full
+    assert sorted(os.listdir(tmp_path)) == entries
+    assert [os.stat(os.path.join(tmp_path, e)).st_ino for e in entries] == inodes
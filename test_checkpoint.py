@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from checkpoint import load_checkpoint
+from checkpoint import save_checkpoint
+from config import settings
+from evo_sim import new_organism
+from evo_sim import run_generations
+from food import FoodField
+from population import Population
+
+
+def short_run(**overrides) -> dict:
+    short = dict(settings, render=False, gens=2, total_time_steps=120, pop_size=20, food_num=40)
+    short.update(overrides)
+    return short
+
+
+def test_round_trip_keeps_the_state(tmp_path):
+    s = short_run()
+    rng = np.random.default_rng(2)
+    organisms = [new_organism(s, i, rng) for i in range(5)]
+    for i, organism in enumerate(organisms):
+        organism.fitness = 3 * i
+        organism.age = 10 + i
+    foods = FoodField(s, rng, 7)
+    path = str(tmp_path / 'run.npz')
+    save_checkpoint(path, s, organisms, foods, 4, rng, [{'BEST': 9}])
+    assert os.listdir(tmp_path) == ['run.npz']
+
+    state = load_checkpoint(path, s)
+    assert state['gen'] == 4
+    assert state['history'] == [{'BEST': 9}]
+    assert state['settings']['pop_size'] == s['pop_size']
+    for before, after in zip(organisms, state['organisms']):
+        for name, _ in Population.fields:
+            assert getattr(after, name) == getattr(before, name)
+        assert np.array_equal(after.wih, before.wih) and np.array_equal(after.who, before.who)
+        assert after.name == before.name
+    for name in ('x', 'y', 'energy'):
+        assert np.array_equal(getattr(state['foods'], name), getattr(foods, name))
+
+    # the restored stream continues where the saved one stopped
+    assert np.array_equal(state['rng'].random(4), rng.random(4))
+
+
+def test_rejects_a_different_network(tmp_path):
+    s = short_run()
+    rng = np.random.default_rng(2)
+    path = str(tmp_path / 'run.npz')
+    save_checkpoint(path, s, [new_organism(s, 0, rng)], FoodField(s, rng, 0), 1, rng)
+    with pytest.raises(ValueError):
+        load_checkpoint(path, dict(s, hidden_nodes=s['hidden_nodes'] + 1))
+
+
+def test_resume_continues_the_run(tmp_path):
+    '''
+    A checkpoint holds the next generation and the history so far, and
+    resuming from it finishes the run as if it was never stopped.
+    '''
+    path = str(tmp_path / 'run.npz')
+    full = run_generations(short_run(), np.random.default_rng(7), verbose=False)
+    run_generations(short_run(gens=1, checkpoint_every=1, checkpoint_path=path), np.random.default_rng(7), verbose=False)
+
+    state = load_checkpoint(path, short_run())
+    assert state['gen'] == 1
+    assert state['history'] == full[:1]
+    assert run_generations(short_run(), verbose=False, resume=path) == full
@@ -0,0 +1,93 @@
+import numpy as np
+
+from config import settings
+from domain import TiledSimulation
+from domain import simulate_tiled
+from domain import tile_bounds
+from domain import tile_of
+from evo_sim import CONTACT_RADIUS
+from evo_sim import new_organism
+from food import FoodField
+
+
+def tiled(**overrides) -> dict:
+    short = dict(settings, render=False, tiles=(2, 2), tile_processes=False, total_time_steps=60, pop_size=30,
+                 food_num=40, max_pop=None, lifespan_lower=1000, lifespan_upper=1000)
+    short.update(overrides)
+    return short
+
+
+def place(s: dict, positions: list, rng: np.random.Generator) -> list:
+    organisms = [new_organism(s, i, rng) for i in range(len(positions))]
+    for organism, (x, y) in zip(organisms, positions):
+        organism.x, organism.y = x, y
+    return organisms
+
+
+def foods_at(s: dict, positions: list, rng: np.random.Generator) -> FoodField:
+    foods = FoodField(s, rng, len(positions))
+    x, y = zip(*positions)
+    foods.set(x, y, np.ones(len(positions)))
+    return foods
+
+
+def test_tiles_partition_the_arena():
+    s = tiled(tiles=(3, 2))
+    rng = np.random.default_rng(0)
+    x = np.concatenate([rng.uniform(s['x_min'], s['x_max'], 500), [s['x_min'], s['x_max']]])
+    y = np.concatenate([rng.uniform(s['y_min'], s['y_max'], 500), [s['y_min'], s['y_max']]])
+    owner = tile_of(s, x, y)
+    assert set(owner.tolist()) == set(range(6))
+    for t in range(6):
+        x0, x1, y0, y1 = tile_bounds(s, t)
+        mine = owner == t
+        assert ((x[mine] >= x0) & (x[mine] <= x1) & (y[mine] >= y0) & (y[mine] <= y1)).all()
+
+
+def test_food_across_a_tile_border_is_eaten():
+    '''
+    Contacts are exact across borders: an organism eats food that lies in
+    the neighbouring tile.
+    '''
+    s = tiled(tiles=(2, 1))
+    rng = np.random.default_rng(1)
+    mid = (s['x_min'] + s['x_max']) / 2
+    organisms = place(s, [(mid - CONTACT_RADIUS / 3, 0.0), (s['x_min'] + 0.2, 1.5)], rng)
+    foods = foods_at(s, [(mid + CONTACT_RADIUS / 3, 0.0), (s['x_max'] - 0.1, -1.8)], rng)
+
+    sim = TiledSimulation(s, organisms, foods, 0, rng, processes=False)
+    sim.step()
+    survivors, stats = sim.finish()
+    assert [organism.fitness for organism in survivors] == [1, 0]
+    assert stats['SUM'] == 1
+    assert len(foods) == 2 and (foods.x[0], foods.y[0]) != (mid + CONTACT_RADIUS / 3, 0.0)
+
+
+def test_organisms_migrate_between_tiles():
+    s = tiled()
+    rng = np.random.default_rng(2)
+    organisms = [new_organism(s, i, rng) for i in range(s['pop_size'])]
+    names = sorted(organism.name for organism in organisms)
+    foods = FoodField(s, rng)
+
+    sim = TiledSimulation(s, organisms, foods, 0, rng, processes=False)
+    for step in range(s['total_time_steps']):
+        sim.step()
+        for t, tile in enumerate(sim.tiles):
+            n = len(tile.organisms)
+            assert (tile_of(s, tile.organisms.x[:n], tile.organisms.y[:n]) == t).all()
+    survivors, stats = sim.finish()
+    assert sorted(organism.name for organism in survivors) == names
+    assert stats['SURVIVED'] == s['pop_size'] and len(foods) == s['food_num']
+
+
+def test_worker_processes_match_in_process_tiles():
+    s = tiled(total_time_steps=40)
+    results = []
+    for processes in (False, True):
+        rng = np.random.default_rng(3)
+        organisms = [new_organism(s, i, rng) for i in range(s['pop_size'])]
+        foods = FoodField(s, rng)
+        survivors, stats = simulate_tiled(s, organisms, foods, 0, rng, processes)
+        results.append((stats, [(o.x, o.y, o.fitness) for o in survivors], (foods.x.tolist(), foods.y.tolist())))
+    assert results[0] == results[1]
@@ -0,0 +1,63 @@
+import numpy as np
+
+from config import settings
+from evo_sim import Simulation
+from evo_sim import new_organism
+from food import FoodField
+
+
+def crowd(cap_policy: str, max_pop: int, seed: int = 0) -> Simulation:
+    '''
+    Ten mature organisms on one spot with fitness 1..10. The four fittest
+    are above the threshold, so every step they breed 12 children.
+    '''
+    s = dict(settings, pop_size=10, food_num=1, elitism=0.5, mutate=1.0, mature=5,
+             max_pop=max_pop, cap_policy=cap_policy)
+    rng = np.random.default_rng(seed)
+    organisms = [new_organism(s, i, rng) for i in range(10)]
+    for i, organism in enumerate(organisms):
+        organism.x, organism.y, organism.v = 0.0, 0.0, 0.0
+        organism.fitness = i + 1
+        organism.age = 10
+        organism.lifespan = 1000
+    foods = FoodField(s, rng)
+    foods.set([1.9], [1.9], [1])
+    return Simulation(s, organisms, foods, 0, rng)
+
+
+def test_stop_ends_the_generation():
+    sim = crowd('stop', 15)
+    assert sim.step() is False
+    assert len(sim.organisms) == 22
+
+
+def test_block_drops_births_beyond_the_cap():
+    sim = crowd('block', 15)
+    for step in range(4):
+        assert sim.step() is True
+        assert len(sim.organisms) == 15
+    assert sim.finish()['BORN'] == 5
+
+
+def test_cull_removes_the_least_fit():
+    sim = crowd('cull', 15)
+    parents = list(sim.organisms)
+    assert sim.step() is True
+    assert len(sim.organisms) == 15
+
+    # all 12 children are in; of the parents only fitness 8, 9 and 10 are left
+    survivors = [organism for organism in sim.organisms if any(organism is parent for parent in parents)]
+    assert sorted(organism.fitness for organism in survivors) == [8, 9, 10]
+    assert sim.stats.summary()['BORN'] == 12
+
+    for step in range(3):
+        sim.step()
+        assert len(sim.organisms) <= 15
+
+
+def test_cull_admits_at_most_max_pop_births():
+    sim = crowd('cull', 5)
+    births = [new_organism(sim.settings, 100 + i, sim.rng) for i in range(8)]
+    admitted, deaths = sim.admit(births, np.array([2], dtype=np.int64))
+    assert admitted == births[:5]
+    assert sorted(deaths.tolist()) == list(range(10))
@@ -0,0 +1,62 @@
+import numpy as np
+
+from config import settings
+from food import FoodField
+from food import REGROWTH
+from spatial import UniformGrid
+
+
+def assert_bins_current(foods: FoodField) -> None:
+    '''
+    The incrementally updated grid holds the same particles per cell as one
+    rebuilt from the current state.
+    '''
+    grid = foods.bins(UniformGrid)
+    rebuilt = UniformGrid(settings['x_min'], settings['x_max'], settings['y_min'], settings['y_max'], grid.cell_size)
+    live = np.flatnonzero(foods.energy > 0)
+    rebuilt.build(foods.x[live], foods.y[live], live)
+    assert sorted(zip(grid.keys.tolist(), grid.index.tolist())) == sorted(zip(rebuilt.keys.tolist(), rebuilt.index.tolist()))
+    order = np.argsort(grid.index)
+    assert np.array_equal(grid.x[order], foods.x[live]) and np.array_equal(grid.y[order], foods.y[live])
+
+
+def test_bins_follow_consume_and_regrow():
+    for model in REGROWTH:
+        s = dict(settings, food_num=300, regrowth=model, regrowth_rate=400)
+        rng = np.random.default_rng(0)
+        foods = FoodField(s, rng)
+        foods.bins(UniformGrid)
+        for step in range(20):
+            eaten = np.flatnonzero((foods.energy > 0) & (rng.random(len(foods)) < 0.1))
+            foods.consume(eaten, rng)
+            assert_bins_current(foods)
+            foods.regrow(rng)
+            assert_bins_current(foods)
+
+
+def test_food_count_is_kept():
+    '''
+    Particles are never created or destroyed: eaten ones respawn at once,
+    or under 'fixed_rate' wait with energy 0 and regrow in place.
+    '''
+    for model in REGROWTH:
+        s = dict(settings, food_num=200, regrowth=model, regrowth_rate=50)
+        rng = np.random.default_rng(1)
+        foods = FoodField(s, rng)
+        for step in range(50):
+            foods.consume(np.flatnonzero((foods.energy > 0) & (rng.random(len(foods)) < 0.2)), rng)
+            foods.regrow(rng)
+            assert len(foods) == len(foods.x) == len(foods.y) == len(foods.energy) == 200
+            if model != 'fixed_rate':
+                assert (foods.energy == 1).all()
+        assert (foods.x >= s['x_min']).all() and (foods.x <= s['x_max']).all()
+        assert (foods.y >= s['y_min']).all() and (foods.y <= s['y_max']).all()
+
+    # under 'fixed_rate' eaten particles wait, then regrow
+    s = dict(settings, food_num=200, regrowth='fixed_rate', regrowth_rate=50)
+    foods = FoodField(s, rng)
+    foods.consume(np.arange(100), rng)
+    assert (foods.energy == 0).sum() == 100 and len(foods.positions()[0]) == 100
+    for step in range(200):
+        foods.regrow(rng)
+    assert (foods.energy == 1).all()
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from config import settings
+from evo_sim import run_generations
+from lineage import DIED
+from lineage import MATED
+from lineage import SURVIVED
+from lineage import Lineage
+from lineage import LineageArchive
+
+
+def short_run(**overrides) -> dict:
+    '''
+    Short headless runs with births and deaths in every generation.
+    '''
+    short = dict(settings, render=False, gens=3, total_time_steps=200, pop_size=40, food_num=200, max_pop=200,
+                 mature=30, lifespan_lower=120, lifespan_upper=260)
+    short.update(overrides)
+    return short
+
+
+def test_records_follow_the_run(tmp_path):
+    '''
+    Record ids are row numbers, and births, deaths and fitness add up to
+    the generation stats. Recording does not change the run.
+    '''
+    reference = run_generations(short_run(), np.random.default_rng(7), verbose=False)
+    s = short_run(lineage_dir=str(tmp_path), lineage_genomes=True)
+    history = run_generations(s, np.random.default_rng(7), verbose=False)
+    assert history == reference
+
+    lineage = Lineage(str(tmp_path))
+    records = lineage.records
+    assert np.array_equal(records['id'], np.arange(len(lineage)))
+    assert (records['parent1'] < records['id']).all() and (records['parent2'] < records['id']).all()
+    for gen, stats in enumerate(history):
+        mine = records[records['gen'] == gen]
+        assert (mine['kind'] == MATED).sum() == stats['BORN']
+        assert (mine['fate'] == DIED).sum() == stats['DIED']
+        assert (mine['fate'] == SURVIVED).sum() == stats['SURVIVED']
+        assert mine['fitness'].sum() == stats['SUM']
+
+    wih, who = lineage.genome(len(lineage) - 1)
+    assert wih.shape == (s['hidden_nodes'], s['inner_nodes'])
+    assert who.shape == (s['outer_nodes'], s['hidden_nodes'])
+
+
+def test_resume_rewinds_the_archive(tmp_path):
+    s = short_run(lineage_dir=str(tmp_path / 'full'))
+    run_generations(s, np.random.default_rng(7), verbose=False)
+    full = Lineage(s['lineage_dir']).records
+
+    # stop after gen 0, run past the checkpoint, then resume from it
+    path = str(tmp_path / 'run.npz')
+    resumed = dict(s, lineage_dir=str(tmp_path / 'resumed'))
+    run_generations(dict(resumed, gens=1, checkpoint_every=1, checkpoint_path=path), np.random.default_rng(7), verbose=False)
+    run_generations(dict(resumed, gens=2), verbose=False, resume=path)
+    run_generations(resumed, verbose=False, resume=path)
+
+    assert np.array_equal(Lineage(resumed['lineage_dir']).records, full)
+
+
+def test_genealogy_queries(tmp_path):
+    # 0, 1 founders; 2 = 0 x 1; 3 = 2 x 2; 4 = 1 x 3; 5 founder
+    archive = LineageArchive(str(tmp_path), chunk=2)
+    archive.born([-1, -1], [-1, -1], 0, 0, 0, [100, 100])
+    archive.born([0], [1], 0, MATED, 5, [100])
+    archive.born([2, 1, -1], [2, 3, -1], 0, MATED, 9, [100, 100, 100])
+    archive.died([0, 3, 4], 12, [4, 6, 1])
+    archive.died([1, 2, 5], 20, 3, SURVIVED)
+    archive.close()
+
+    lineage = Lineage(str(tmp_path))
+    assert lineage.ancestors(4).tolist() == [0, 1, 2, 3]
+    assert lineage.ancestors(4, depth=1).tolist() == [1, 3]
+    assert lineage.descendants(0).tolist() == [2, 3, 4]
+    assert lineage.descendants(1).tolist() == [2, 3, 4]
+    assert lineage.descendants(5).tolist() == []
+    assert lineage.records['fitness'].tolist() == [4, 3, 3, 6, 1, 3]
+
+    table = lineage.fitness_by_lineage()
+    assert table['founder'].tolist() == [0, 1, 5]
+    assert table['count'].tolist() == [3, 2, 1]
+    assert table['total'].tolist() == [13, 4, 3]
+    assert table['best'].tolist() == [6, 3, 3]
+
+    with pytest.raises(ValueError):
+        lineage.genome(0)
@@ -0,0 +1,77 @@
+import numpy as np
+
+from config import settings
+from evo_sim import new_organism
+from population import Population
+from population import elite_threshold
+
+
+def numbered(n: int, rng: np.random.Generator) -> Population:
+    organisms = Population([new_organism(settings, i, rng) for i in range(n)])
+    for i, organism in enumerate(organisms):
+        organism.fitness = i
+        organism.x = i / 10
+    return organisms
+
+
+def test_remove_rows():
+    '''
+    Removing rows 2, 3, 7 and 9 (adjacent rows and the last one) fills each
+    hole from the end, as removing them one by one from the highest down.
+    '''
+    rng = np.random.default_rng(0)
+    organisms = numbered(10, rng)
+    names = [organism.name for organism in organisms]
+    removed = organisms.remove_rows(np.array([9, 3, 7, 2]))
+
+    assert [organism.name for organism in removed] == [names[i] for i in (2, 3, 7, 9)]
+    assert [organism.name for organism in organisms] == [names[i] for i in (0, 1, 6, 8, 4, 5)]
+    assert organisms.fitness[:len(organisms)].tolist() == [0, 1, 6, 8, 4, 5]
+    assert np.allclose(organisms.x[:len(organisms)], [0, 0.1, 0.6, 0.8, 0.4, 0.5])
+    for row, organism in enumerate(organisms):
+        assert organism._idx == row and organism.fitness == organisms.fitness[row]
+        assert np.array_equal(organisms.wih[row], organism.wih)
+
+    # removed organisms keep their state off the population
+    assert [organism.fitness for organism in removed] == [2, 3, 7, 9]
+    assert np.bincount(organisms.fitness[:6], minlength=64).tolist() == organisms.fitness_counts.tolist()
+
+    # same rows as removing one by one from the highest down
+    one_by_one = numbered(10, np.random.default_rng(0))
+    for row in (9, 7, 3, 2):
+        one_by_one.remove(one_by_one[row])
+    assert [organism.name for organism in one_by_one] == [organism.name for organism in organisms]
+    assert organisms.remove_rows(np.array([], dtype=np.int64)) == [] and len(organisms) == 6
+
+
+def sorted_cut(fitness: np.ndarray, elitism: float) -> int:
+    '''
+    Threshold as a full sort finds it: the fitness of the floor(n * elitism)-th
+    fittest organism (at least the fittest).
+    '''
+    if len(fitness) == 0:
+        return 0
+    rank = max(int(np.floor(len(fitness) * elitism)), 1)
+    return int(np.sort(fitness)[len(fitness) - rank])
+
+
+def test_elite_threshold_matches_a_sort():
+    rng = np.random.default_rng(1)
+    cases = [np.array([], dtype=np.int64), np.array([0]), np.array([7]), np.array([3, 3, 3, 3]),
+             np.array([5, 1, 5, 2, 5, 0]), rng.integers(0, 4, 50), rng.integers(0, 200, 333)]
+    for fitness in cases:
+        counts = np.bincount(fitness, minlength=1)
+        for elitism in (0.0, 0.1, 0.2, 0.5, 0.99, 1.0):
+            assert elite_threshold(counts, len(fitness), elitism) == sorted_cut(fitness, elitism), (fitness, elitism)
+
+
+def test_fitness_threshold_follows_changes():
+    rng = np.random.default_rng(2)
+    organisms = numbered(20, rng)
+    organisms.elitism = 0.25
+    for step in range(30):
+        rows = rng.choice(len(organisms), 5, replace=False)
+        organisms.add_fitness(rows, rng.integers(0, 3, 5))
+        if step % 10 == 9:
+            organisms.remove_rows(rng.choice(len(organisms), 3, replace=False))
+        assert organisms.fitness_threshold == sorted_cut(organisms.fitness[:len(organisms)], 0.25)
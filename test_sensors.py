@@ -0,0 +1,60 @@
+import numpy as np
+
+from config import settings
+from evo_sim import new_organism
+from evo_sim import sense
+from food import FoodField
+from population import Population
+from sensors import SensorStage
+
+
+def population(s: dict, n: int, rng: np.random.Generator) -> Population:
+    organisms = Population([new_organism(s, i, rng) for i in range(n)])
+    organisms.lifespan[:n] = 100
+    organisms.age[:n] = rng.integers(0, 100, n)
+    organisms.fitness[:n] = rng.integers(0, 6, n)
+    return organisms
+
+
+def test_default_layout_is_the_sensed_target():
+    '''
+    The default sensors feed the net the heading sense() leaves for each
+    organism: to its nearest mate past 75% of its lifespan, else to its
+    nearest food.
+    '''
+    assert settings['sensors'] == ['target'] and settings['inner_nodes'] == 1
+    rng = np.random.default_rng(0)
+    organisms = population(settings, 120, rng)
+    foods = FoodField(settings, rng)
+    sense(settings, organisms, foods, 2)
+
+    n = len(organisms)
+    inputs = SensorStage(settings).inputs(organisms, foods, 2)
+    seek_mate = organisms.age[:n] > organisms.lifespan[:n] * 0.75
+    assert seek_mate.any() and not seek_mate.all()
+    assert np.array_equal(inputs[:, 0], np.where(seek_mate, organisms.r_org[:n], organisms.r_food[:n]))
+
+    organisms.think()
+    expected = organisms.nn_dv[:n].copy(), organisms.nn_dr[:n].copy()
+    organisms.think(inputs)
+    assert np.array_equal(organisms.nn_dv[:n], expected[0]) and np.array_equal(organisms.nn_dr[:n], expected[1])
+
+
+def test_mate_sensor_needs_mature_mates():
+    '''
+    Like mate(), the 'mate' sensor only sees mates older than
+    settings['mature']; sense() does not look at their age.
+    '''
+    s = dict(settings, sensors=['mate'], inner_nodes=2, mature=30)
+    rng = np.random.default_rng(1)
+    organisms = population(s, 3, rng)
+    organisms.x[:3] = [0.0, 0.5, -1.0]
+    organisms.y[:3] = [0.0, 0.0, 0.0]
+    organisms.fitness[:3] = [0, 5, 5]
+    organisms.age[:3] = [90, 10, 40]
+
+    inputs = SensorStage(s).inputs(organisms, FoodField(s, rng), 2)
+    assert np.isclose(inputs[0, 1] * np.hypot(4, 4), 1.0)
+
+    sense(s, organisms, FoodField(s, rng), 2)
+    assert organisms.d_org[0] == 0.5
@@ -0,0 +1,163 @@
+import numpy as np
+
+from math import atan2
+from math import degrees
+from math import sqrt
+
+from config import settings
+from evo_sim import new_organism
+from evo_sim import sense
+from food import FoodField
+from population import Population
+from spatial import UniformGrid
+
+
+def heading(x: float, y: float, r: float, x_target: float, y_target: float) -> float:
+    theta_d = degrees(atan2(y_target - y, x_target - x)) - r
+    if abs(theta_d) > 180:
+        theta_d += 360
+    return theta_d / 180
+
+
+def nearest(x: float, y: float, xs: list, ys: list, ids: list, skip: int = None) -> tuple:
+    '''
+    Brute-force nearest point, ties to the lowest id.
+    '''
+    best = (float('inf'), -1)
+    for px, py, i in zip(xs, ys, ids):
+        if i != skip:
+            best = min(best, (sqrt((px - x)**2 + (py - y)**2), i))
+    return best
+
+
+def reference(organisms: Population, foods: FoodField, threshold: int) -> dict:
+    '''
+    sense() as an O(N*F) loop over every organism, food particle and mate.
+    '''
+    n = len(organisms)
+    out = {name: getattr(organisms, name)[:n].copy() for name in ('d_food', 'r_food', 'd_org', 'r_org')}
+    out['d_food'][:] = 100
+    out['r_food'][:] = 0
+    if n < 2:
+        return out
+
+    x, y, r = organisms.x[:n], organisms.y[:n], organisms.r[:n]
+    live = np.flatnonzero(foods.energy > 0).tolist()
+    mates = np.flatnonzero(organisms.fitness[:n] > threshold).tolist()
+    for i in range(n):
+        d, j = nearest(x[i], y[i], foods.x[live], foods.y[live], live)
+        if d < out['d_food'][i]:
+            out['d_food'][i] = d
+            out['r_food'][i] = heading(x[i], y[i], r[i], foods.x[j], foods.y[j])
+
+        if organisms.age[i] > organisms.lifespan[i] * 0.75:
+            d, j = nearest(x[i], y[i], x[mates], y[mates], mates, skip=i)
+            if d < out['d_org'][i]:
+                out['d_org'][i] = d
+                out['r_org'][i] = heading(x[i], y[i], r[i], x[j], y[j])
+    return out
+
+
+def population(s: dict, n: int, rng: np.random.Generator) -> Population:
+    organisms = Population([new_organism(s, i, rng) for i in range(n)])
+    organisms.x[:n] = rng.uniform(s['x_min'], s['x_max'], n)
+    organisms.y[:n] = rng.uniform(s['y_min'], s['y_max'], n)
+    organisms.r[:n] = rng.uniform(0, 360, n)
+    organisms.lifespan[:n] = 100
+    organisms.age[:n] = rng.integers(0, 100, n)
+    organisms.fitness[:n] = rng.integers(0, 6, n)
+    organisms.d_org[:n] = rng.choice([100, 0.3], n)
+    return organisms
+
+
+def assert_sensed(organisms: Population, foods: FoodField, threshold: int) -> None:
+    expected = reference(organisms, foods, threshold)
+    sense(settings, organisms, foods, threshold)
+    for name, values in expected.items():
+        assert np.allclose(getattr(organisms, name)[:len(organisms)], values, rtol=0, atol=1e-12), name
+
+
+def test_sense_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for n, food_num, threshold in [(2, 1, 0), (30, 5, 2), (150, 400, 3), (80, 60, 5)]:
+        organisms = population(settings, n, rng)
+        foods = FoodField(dict(settings, food_num=food_num), rng)
+        foods.energy[rng.random(food_num) < 0.2] = 0
+        assert_sensed(organisms, foods, threshold)
+
+
+def test_sense_ties_and_self():
+    '''
+    Equidistant targets go to the lowest id, and a seeker that is also a
+    mate never senses itself.
+    '''
+    rng = np.random.default_rng(1)
+    organisms = population(settings, 4, rng)
+    organisms.x[:4] = [0.0, 0.5, -0.5, 1.5]
+    organisms.y[:4] = [0.0, 0.0, 0.0, 1.5]
+    organisms.age[:4] = 90
+    organisms.fitness[:4] = 3
+    organisms.d_org[:4] = 100
+    foods = FoodField(dict(settings, food_num=4), rng)
+    foods.set([1.0, 0.0, -1.0, 0.0], [0.0, -1.0, 0.0, 1.0], [1, 1, 1, 1])
+
+    assert_sensed(organisms, foods, 0)
+    assert organisms.d_org[0] == 0.5 and organisms.r_org[0] == heading(0, 0, organisms.r[0], 0.5, 0)
+    assert organisms.d_food[0] == 1.0 and organisms.r_food[0] == heading(0, 0, organisms.r[0], 1.0, 0)
+
+
+def test_sense_without_mates():
+    rng = np.random.default_rng(2)
+    organisms = population(settings, 40, rng)
+    before = organisms.d_org[:40].copy(), organisms.r_org[:40].copy()
+    assert_sensed(organisms, FoodField(settings, rng), 5)
+    assert np.array_equal(organisms.d_org[:40], before[0]) and np.array_equal(organisms.r_org[:40], before[1])
+
+
+def test_nearest_k_matches_brute_force():
+    rng = np.random.default_rng(3)
+    x, y = rng.uniform(-2, 2, (2, 300))
+    x[:20], y[:20] = 0.25, 0.25     # duplicates: ties go to the lowest id
+    grid = UniformGrid(-2, 2, -2, 2, 0.3)
+    grid.build(x, y)
+    qx, qy = rng.uniform(-2, 2, (2, 50))
+    qx[0], qy[0] = 0.25, 0.25
+
+    for k in (1, 4, 25):
+        d, ids = grid.nearest_k(qx, qy, k)
+        for q in range(len(qx)):
+            dq = np.sqrt((x - qx[q])**2 + (y - qy[q])**2)
+            order = np.lexsort((np.arange(len(x)), dq))[:k]
+            assert ids[q].tolist() == order.tolist()
+            assert np.allclose(d[q], dq[order])
+
+    # fewer points than k, and a query skipping its own point
+    d, ids = grid.nearest_k(x[:3], y[:3], 305, exclude=np.arange(3))
+    assert (ids[:, -6:] == -1).all() and np.isinf(d[:, -6:]).all()
+    assert all(i not in ids[i] for i in range(3))
+
+
+def test_insert_and_remove_match_a_rebuilt_grid():
+    rng = np.random.default_rng(4)
+    x, y = rng.uniform(-2, 2, (2, 200))
+    ids = np.arange(200)
+    grid = UniformGrid(-2, 2, -2, 2, 0.25)
+    grid.build(x, y)
+
+    gone = np.sort(rng.choice(200, 60, replace=False))
+    grid.remove(gone, x[gone], y[gone])
+    back = gone[::3]
+    x[back], y[back] = rng.uniform(-2, 2, (2, len(back)))
+    grid.insert(back, x[back], y[back])
+
+    kept = np.setdiff1d(ids, np.setdiff1d(gone, back))
+    rebuilt = UniformGrid(-2, 2, -2, 2, 0.25)
+    rebuilt.build(x[kept], y[kept], kept)
+    assert np.array_equal(grid.keys, rebuilt.keys)
+    assert sorted(zip(grid.keys.tolist(), grid.index.tolist())) == sorted(zip(rebuilt.keys.tolist(), rebuilt.index.tolist()))
+
+    qx, qy = rng.uniform(-2, 2, (2, 100))
+    for a, b in zip(grid.nearest(qx, qy), rebuilt.nearest(qx, qy)):
+        assert np.array_equal(a, b)
+    for a, b in zip(grid.within(qx, qy, 0.3), rebuilt.within(qx, qy, 0.3)):
+        assert np.array_equal(a, b)
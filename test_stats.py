@@ -0,0 +1,58 @@
+import numpy as np
+
+from stats import StatsAccumulator
+
+
+def test_batches_match_the_full_array():
+    '''
+    Stats merged batch by batch equal the stats of all values at once.
+    '''
+    rng = np.random.default_rng(0)
+    fitness = rng.integers(0, 90, 1000)
+    stats = StatsAccumulator()
+    for batch in np.split(fitness, [0, 1, 7, 300, 301, 650]):
+        stats.add(batch)
+
+    summary = stats.summary()
+    assert summary['COUNT'] == len(fitness)
+    assert summary['SUM'] == fitness.sum()
+    assert summary['BEST'] == fitness.max() and summary['WORST'] == fitness.min()
+    assert np.isclose(summary['AVG'], np.mean(fitness))
+    assert np.isclose(summary['VAR'], np.var(fitness))
+    assert np.array_equal(stats.histogram[:fitness.max() + 1], np.bincount(fitness))
+
+
+def test_counts_and_worst():
+    stats = StatsAccumulator()
+    stats.record_births(3)
+    stats.record_deaths(np.array([0, 5]))
+    stats.record_survivors(np.array([2, 7, 4]))
+
+    summary = stats.summary()
+    assert (summary['BORN'], summary['DIED'], summary['SURVIVED'], summary['COUNT']) == (3, 2, 3, 5)
+    assert summary['WORST'] == 0 and summary['BEST'] == 7
+
+
+def test_empty_generation():
+    summary = StatsAccumulator().summary()
+    assert summary['COUNT'] == 0 and summary['AVG'] == 0.0 and summary['VAR'] == 0.0
+
+
+def test_merged_tiles_match_the_full_array():
+    '''
+    Merging per-tile accumulators gives the same stats as one accumulator.
+    '''
+    rng = np.random.default_rng(1)
+    tiles = [rng.integers(0, 40, n) for n in (0, 1, 250, 33)]
+    merged = StatsAccumulator()
+    for fitness in tiles:
+        tile = StatsAccumulator()
+        tile.record_survivors(fitness)
+        merged.merge(tile)
+
+    fitness = np.concatenate(tiles)
+    summary = merged.summary()
+    assert summary['COUNT'] == summary['SURVIVED'] == len(fitness)
+    assert np.isclose(summary['AVG'], np.mean(fitness))
+    assert np.isclose(summary['VAR'], np.var(fitness))
+    assert np.array_equal(merged.histogram[:fitness.max() + 1], np.bincount(fitness))
@@ -0,0 +1,45 @@
+import numpy as np
+
+from config import settings
+from evo_sim import new_organism
+from food import FoodField
+from population import Population
+from trajectory import FLUSH_FRAMES
+from trajectory import Trajectory
+from trajectory import TrajectoryRecorder
+
+
+def world(n: int, rng: np.random.Generator) -> tuple:
+    organisms = Population([new_organism(settings, i, rng) for i in range(n)])
+    organisms.id[:n] = 2**40 + np.arange(n)
+    return organisms, FoodField(dict(settings, food_num=7), rng)
+
+
+def test_frames_read_back(tmp_path):
+    rng = np.random.default_rng(0)
+    organisms, foods = world(5, rng)
+    recorder = TrajectoryRecorder(settings, 0, str(tmp_path))
+    for i in range(3):
+        organisms.x[:5] += 0.01
+        recorder.frame(organisms, foods)
+    recorder.close()
+
+    log = Trajectory(str(tmp_path))
+    assert len(log) == 3
+    records, food = log.frame(2)
+    assert records['id'].tolist() == organisms.id[:5].tolist()
+    assert np.allclose(records['x'], organisms.x[:5]) and len(food) == 7
+
+
+def test_interrupted_log_is_readable(tmp_path):
+    rng = np.random.default_rng(1)
+    organisms, foods = world(5, rng)
+    recorder = TrajectoryRecorder(settings, 0, str(tmp_path))
+    for i in range(FLUSH_FRAMES + 8):
+        recorder.frame(organisms, foods)
+
+    # never closed: everything up to the last flush is there
+    log = Trajectory(str(tmp_path))
+    assert FLUSH_FRAMES <= len(log) <= FLUSH_FRAMES + 8
+    assert log.frame(len(log) - 1)[0]['id'].tolist() == organisms.id[:5].tolist()
+    recorder.close()
@@ -0,0 +1,141 @@
+import json
+import os
+
+import numpy as np
+
+from utils import palette
+
+# record layouts of the trajectory log
+ORGANISM_DTYPE = np.dtype([('id', '<i8'), ('x', '<f4'), ('y', '<f4'), ('r', '<f4'), ('color', '<u2')])
+FOOD_DTYPE = np.dtype([('x', '<f4'), ('y', '<f4')])
+
+# frames between flushes of the record files and the frame index
+FLUSH_FRAMES = 32
+
+
+class TrajectoryRecorder():
+    '''
+    Appends the per-frame state of a generation to a compact binary log.
+    The log is a directory holding two flat record files (organisms and
+    food), the per-frame record counts and a small json header. The header
+    is written up front and the files are flushed every FLUSH_FRAMES
+    frames, so the log of an interrupted run stays readable up to the
+    last flush.
+    '''
+    def __init__(self, settings: dict, gen: int, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.meta = {
+            'gen': gen,
+            'x_min': settings['x_min'],
+            'x_max': settings['x_max'],
+            'y_min': settings['y_min'],
+            'y_max': settings['y_max'],
+            'dt': settings['dt'],
+            'frame_stride': settings['frame_stride'],
+            'palette': list(palette),
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f)
+
+        self.frames = 0
+        self.organism_file = open(os.path.join(path, 'organisms.bin'), 'wb')
+        self.food_file = open(os.path.join(path, 'food.bin'), 'wb')
+        self.index_file = open(os.path.join(path, 'frames.bin'), 'wb')    # (organisms, food) records per frame
+
+
+    def frame(self, organisms, foods) -> None:
+        '''
+        Append the current state of a simulation.
+        :param organisms: population of organisms.
+        :param foods: FoodField.
+        :return: None
+        '''
+        n = len(organisms)
+        records = np.empty(n, dtype=ORGANISM_DTYPE)
+        records['id'] = organisms.id[:n]
+        records['x'] = organisms.x[:n]
+        records['y'] = organisms.y[:n]
+        records['r'] = organisms.r[:n]
+        records['color'] = organisms.color[:n]
+        records.tofile(self.organism_file)
+
+        food_x, food_y = foods.positions()
+        food_records = np.empty(len(food_x), dtype=FOOD_DTYPE)
+        food_records['x'] = food_x
+        food_records['y'] = food_y
+        food_records.tofile(self.food_file)
+
+        np.array([n, len(food_x)], dtype='<i8').tofile(self.index_file)
+        self.frames += 1
+        if self.frames % FLUSH_FRAMES == 0:
+            self.flush()
+
+
+    def flush(self) -> None:
+        '''
+        Flush the record files, then the frame index that points into them.
+        :return: None
+        '''
+        self.organism_file.flush()
+        self.food_file.flush()
+        self.index_file.flush()
+
+
+    def close(self) -> None:
+        '''
+        Flush and close the log.
+        :return: None
+        '''
+        self.flush()
+        self.organism_file.close()
+        self.food_file.close()
+        self.index_file.close()
+
+
+class Trajectory():
+    '''
+    Read-only, memory-mapped view of a trajectory log.
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        counts = self._counts()
+        self.organism_offsets = np.concatenate([[0], np.cumsum(counts[:, 0])])
+        self.food_offsets = np.concatenate([[0], np.cumsum(counts[:, 1])])
+        self.organisms = self._map('organisms.bin', ORGANISM_DTYPE, self.organism_offsets[-1])
+        self.food = self._map('food.bin', FOOD_DTYPE, self.food_offsets[-1])
+
+
+    def _counts(self) -> np.ndarray:
+        # per-frame record counts, cut to the frames fully on disk (the
+        # log of an interrupted run may end in a partial frame)
+        counts = np.fromfile(os.path.join(self.path, 'frames.bin'), dtype='<i8')
+        counts = counts[:len(counts) // 2 * 2].reshape(-1, 2)
+        sizes = [os.path.getsize(os.path.join(self.path, name)) // dtype.itemsize
+                 for name, dtype in (('organisms.bin', ORGANISM_DTYPE), ('food.bin', FOOD_DTYPE))]
+        complete = (np.cumsum(counts[:, 0]) <= sizes[0]) & (np.cumsum(counts[:, 1]) <= sizes[1])
+        return counts[:int(complete.sum())]
+
+
+    def _map(self, name: str, dtype: np.dtype, count: int) -> np.ndarray:
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode='r', shape=(int(count),))
+
+
+    def __len__(self) -> int:
+        return len(self.organism_offsets) - 1
+
+
+    def frame(self, i: int) -> tuple:
+        '''
+        Records of one frame.
+        :param i: frame number.
+        :return: organism records, food records
+        '''
+        organisms = self.organisms[self.organism_offsets[i]:self.organism_offsets[i + 1]]
+        food = self.food[self.food_offsets[i]:self.food_offsets[i + 1]]
+        return organisms, food
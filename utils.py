@@ -1,98 +1,91 @@
-from math import atan2
-from math import degrees
-from math import sqrt
-from math import floor
-from random import randint
+import numpy as np
 
-from collections import defaultdict
+# shared random stream used when no rng is passed
+default_rng = np.random.default_rng()
 
-def dist(x1: float, y1: float, x2: float, y2: float) -> float:
+
+def get_rng(rng: np.random.Generator = None) -> np.random.Generator:
     '''
-    Calculate distance.
-    :param x1: x position of target 1
-    :param y1: y position of target 1
-    :param x2: x position of target 2
-    :param y2: y position of target 2
-    :returns: distance in float.
+    Random stream to draw from.
+    :param rng: numpy Generator, or None for the shared default stream.
+    :returns: numpy Generator.
     '''
-    return sqrt((x2-x1)**2 + (y2-y1)**2)
+    if rng is None:
+        return default_rng
+    return rng
 
 
-def calc_heading(organism, food) -> float:
+def calc_headings(x: np.ndarray, y: np.ndarray, r: np.ndarray, x_target: np.ndarray, y_target: np.ndarray) -> np.ndarray:
     '''
-    Calculate the heading of organism to food
-    particle.
-    :param org: organism object.
-    :param food: food object.
-    :returns: heading in float.
+    Calculate the heading of organisms to their targets.
+    :param x: x positions of organisms.
+    :param y: y positions of organisms.
+    :param r: orientations of organisms.
+    :param x_target: x positions of targets.
+    :param y_target: y positions of targets.
+    :returns: array of headings.
     '''
-    d_x = food.x - organism.x
-    d_y = food.y - organism.y
-    theta_d = degrees(atan2(d_y, d_x)) - organism.r
-    if abs(theta_d) > 180: 
-        theta_d += 360
+    theta_d = np.degrees(np.arctan2(y_target - y, x_target - x)) - r
+    theta_d = np.where(np.abs(theta_d) > 180, theta_d + 360, theta_d)
     return theta_d / 180
 
 
-def pick_color(gen: int) -> str:
-    '''
-    Pick color for organism based on generation. Randomize color if generation exceeds mapping.
-    :param gen: int of generation.
-    :return: string of color picked.
-    '''
-    # colors map to 10 generations and an albino variant
-    color_mapping = {-1: 'mintcream', 0: 'lightgreen', 1: 'seagreen', 2: 'darkgreen', 3: 'darkolivegreen', 4: 'peru', 5: 'lightcoral', 6: 'orangered', 7: 'firebrick', 8: 'darkred', 9: 'black'}
+# colors map to 10 generations and an albino variant
+color_mapping = {-1: 'mintcream', 0: 'lightgreen', 1: 'seagreen', 2: 'darkgreen', 3: 'darkolivegreen', 4: 'peru', 5: 'lightcoral', 6: 'orangered', 7: 'firebrick', 8: 'darkred', 9: 'black'}
 
-    # chance of albino NEOS
-    random_num = randint(0, 1000)
-    if random_num == 5:
-        return color_mapping[-1]
+# color names by the integer index stored for each organism
+palette = list(color_mapping.values())
 
-    if not gen in color_mapping:
-        random_num = randint(0, 9)
-        return color_mapping[random_num]
-    return color_mapping[gen]
-    
 
-def boundary_fitness(organisms: list, percentage: float) -> int:
+def color_index(color: str) -> int:
     '''
-    Find boundary fitness rank for top percentile of organisms.
-    :param organisms: list of organisms.
-    :param percentage: the percentage of elite organisms.
-    :return: Lowest fitness level of top organisms
+    Find the palette index of a color, adding colors not seen before.
+    :param color: color name.
+    :return: int index into palette.
     '''
-    fitness_list = []
-    for organism in organisms:
-        fitness_list.append(organism.fitness)
-    fitness_list.sort(reverse=True)
-    idx = int(floor(len(fitness_list) * percentage)) - 1
-    if idx < 0:
-        return fitness_list[0]
-    return fitness_list[idx]
+    if color not in palette:
+        palette.append(color)
+    return palette.index(color)
 
 
-def get_stats(organisms: list, old_organisms: list) -> dict:
+def pick_colors(gens: np.ndarray, rng: np.random.Generator = None) -> list:
     '''
-    Get stats of simulation.
+    Pick colors for organisms based on generation. Randomize colors of
+    generations beyond the mapping.
+    :param gens: array of generations.
+    :param rng: random stream (defaults to the shared stream).
+    :return: list of colors picked.
     '''
-    # Get stats for current generation
-    stats = defaultdict(int)
-
-    stats['SURVIVED'] = len(organisms)
-    stats['DIED'] = len(old_organisms)
+    rng = get_rng(rng)
+    gens = np.asarray(gens)
 
-    all_organisms = organisms + old_organisms
-    for organism in all_organisms:
-        if organism.fitness > stats['BEST'] or stats['BEST'] == 0:
-            stats['BEST'] = organism.fitness
-
-        if organism.fitness < stats['WORST'] or stats['WORST'] == 0:
-            stats['WORST'] = organism.fitness
-
-        stats['SUM'] += organism.fitness
+    # chance of albino NEOS
+    albino = rng.integers(0, 1001, len(gens)) == 5
 
-    stats['COUNT'] = len(all_organisms)
+    # randomize generations beyond the mapping
+    keys = np.where((gens >= 0) & (gens <= 9), gens, rng.integers(0, 10, len(gens)))
+    keys[albino] = -1
+    return [color_mapping[key] for key in keys.tolist()]
 
-    stats['AVG'] = stats['SUM'] / stats['COUNT']
 
-    return stats
+def render_gen(settings: dict, gen: int) -> bool:
+    '''
+    Check whether a generation should be rendered to a GIF.
+    :param settings: simulation configurations.
+    :param gen: int of generation.
+    :return: True if the generation is rendered.
+    '''
+    if not settings['render']:
+        return False
+
+    render_gens = settings['render_gens']
+    last = settings['gens'] - 1
+    if render_gens == 'all':
+        return True
+    if render_gens == 'first':
+        return gen == 0
+    if render_gens == 'last':
+        return gen == last
+    if render_gens == 'first_last':
+        return gen == 0 or gen == last
+    return gen in render_gens
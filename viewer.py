@@ -0,0 +1,244 @@
+# Live viewer: watch a run while it simulates instead of waiting for
+# gen_N.gif. The simulation runs in its own process (or thread) and
+# publishes a snapshot of every settings['frame_stride']-th time step
+# (positions, headings, colors and food as arrays) into a small bounded
+# queue; when the queue is full the oldest snapshot is dropped, so the
+# simulation never waits for the display. A matplotlib animation redraws
+# the newest snapshot at display rate with blitting and shows the
+# simulation step rate, population and drawing FPS.
+#
+# Closing the window detaches the viewer; the run continues headless to
+# its end.
+#
+#   python main.py --live
+
+import time
+
+from queue import Empty
+from queue import Full
+
+import numpy as np
+
+# snapshots kept between the simulation and the viewer
+QUEUE_SIZE = 2
+
+
+def publish(queue, item) -> None:
+    '''
+    Put an item in a bounded queue without blocking, dropping the oldest
+    item when the queue is full.
+    :param queue: queue.Queue or multiprocessing.Queue.
+    :param item: item to put.
+    :returns: None
+    '''
+    try:
+        queue.put_nowait(item)
+    except Full:
+        try:
+            queue.get_nowait()
+        except Empty:
+            pass
+        try:
+            queue.put_nowait(item)
+        except Full:
+            pass
+
+
+class FramePublisher():
+    '''
+    Frame sink of one generation (see simulate()) that publishes snapshots
+    to the viewer. Does nothing once the viewer has detached.
+    '''
+    def __init__(self, queue, detached, settings: dict, gen: int):
+        self.queue = queue
+        self.detached = detached        # event set when the viewer window closes
+        self.gen = gen
+        self.stride = settings['frame_stride']
+        self.frames = 0
+        self.start = time.perf_counter()
+
+
+    def frame(self, organisms, foods) -> None:
+        '''
+        Publish the current state of a simulation.
+        :param organisms: population of organisms.
+        :param foods: FoodField.
+        :return: None
+        '''
+        if self.detached.is_set():
+            return
+        step = self.frames * self.stride
+        self.frames += 1
+        elapsed = time.perf_counter() - self.start
+
+        n = len(organisms)
+        food_x, food_y = foods.positions()
+        publish(self.queue, {
+            'gen': self.gen,
+            'step': step,
+            'rate': step / elapsed if elapsed > 0 else 0.0,
+            'x': organisms.x[:n].copy(),
+            'y': organisms.y[:n].copy(),
+            'r': organisms.r[:n].copy(),
+            'color': organisms.color[:n].copy(),
+            'food_x': food_x,
+            'food_y': food_y,
+        })
+
+
+    def close(self) -> None:
+        pass
+
+
+class LiveViewer():
+    '''
+    Draws the newest snapshot of a queue at display rate. Artists are the
+    ones of the GIF renderer (see plotting.Renderer); only they and the
+    counters are redrawn each frame.
+    '''
+    def __init__(self, settings: dict, queue, fps: int = 30):
+        from plotting import Renderer
+        from plotting import new_figure
+
+        self.queue = queue
+        self.fps = fps
+        self.fig, self.ax = new_figure()
+        self.renderer = Renderer(settings, 0, self.fig, self.ax)
+        self.ax.set_title('NEOS LIVE')
+        self.counters = self.ax.text(0.01, 0.99, '', transform=self.ax.transAxes, va='top', family='monospace',
+                                     fontsize=9, zorder=12, animated=True)
+        self.snapshot = None
+        self.finished = False
+        self.drawn = 0              # frames drawn
+        self.dropped = 0            # snapshots replaced before they were drawn
+        self.frame_rate = 0.0       # smoothed drawing FPS
+        self.last = None
+
+
+    def poll(self) -> bool:
+        '''
+        Take the newest snapshot from the queue, skipping stale ones.
+        :returns: True when there is a new snapshot.
+        '''
+        latest = None
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                break
+            if item is None:
+                self.finished = True
+            else:
+                if latest is not None:
+                    self.dropped += 1
+                latest = item
+        if latest is None:
+            return False
+        self.snapshot = latest
+        return True
+
+
+    def update(self, _frame=None) -> tuple:
+        '''
+        Animation callback: draw the newest snapshot and the counters.
+        :returns: the artists to blit.
+        '''
+        now = time.perf_counter()
+        if self.last is not None:
+            self.frame_rate = 0.9 * self.frame_rate + 0.1 / max(now - self.last, 1e-6)
+        self.last = now
+
+        artists = (self.renderer.food, self.renderer.bodies, self.renderer.tails)
+        if self.poll():
+            s = self.snapshot
+            artists = self.renderer.update(s['x'], s['y'], s['r'], s['color'], s['food_x'], s['food_y'])
+            self.drawn += 1
+
+        if self.snapshot is None:
+            text = 'WAITING FOR THE SIMULATION...'
+        else:
+            s = self.snapshot
+            text = ('GEN %d  STEP %d  NEOS %d\nSIM %.0f steps/s  VIEW %.0f fps'
+                    % (s['gen'], s['step'], len(s['x']), s['rate'], self.frame_rate))
+        if self.finished:
+            text += '\nRUN FINISHED'
+        self.counters.set_text(text)
+        return artists + (self.counters,)
+
+
+    def show(self) -> None:
+        '''
+        Animate until the window is closed.
+        :returns: None
+        '''
+        from matplotlib import pyplot as plt
+        from matplotlib.animation import FuncAnimation
+
+        self.animation = FuncAnimation(self.fig, self.update, interval=1000 / self.fps, blit=True,
+                                       cache_frame_data=False)
+        plt.show()
+
+
+def live_worker(settings: dict, queue, detached, resume: str = None) -> None:
+    '''
+    Simulation side of a live run (thread or process target).
+    :param settings: simulation configurations.
+    :param queue: snapshot queue.
+    :param detached: event set when the viewer window closes.
+    :param resume: checkpoint to continue the run from.
+    :returns: None
+    '''
+    from functools import partial
+
+    from evo_sim import run_generations
+
+    run_generations(settings, resume=resume, sinks=[partial(FramePublisher, queue, detached)])
+
+    # tell the viewer the run is over (unless it is gone)
+    while not detached.is_set():
+        try:
+            queue.put(None, timeout=0.1)
+            break
+        except Full:
+            pass
+
+
+def run_live(settings: dict, resume: str = None, processes: bool = True, fps: int = 30) -> None:
+    '''
+    Run the simulation while showing it live. GIF rendering is turned off.
+    :param settings: simulation configurations.
+    :param resume: checkpoint to continue the run from.
+    :param processes: simulate in a separate process (False for a thread,
+    which shares the interpreter with drawing).
+    :param fps: target drawing rate.
+    :returns: None
+    '''
+    if settings['tiles']:
+        raise ValueError('the live viewer needs an untiled run (tiles = null)')
+    settings = dict(settings, render=False)
+
+    if processes:
+        from multiprocessing import Event
+        from multiprocessing import Process
+        from multiprocessing import Queue
+        worker, make_queue = Process, Queue
+    else:
+        from queue import Queue
+        from threading import Event
+        from threading import Thread
+        worker, make_queue = Thread, Queue
+
+    queue = make_queue(QUEUE_SIZE)
+    detached = Event()
+    sim = worker(target=live_worker, args=(settings, queue, detached, resume), daemon=True)
+    sim.start()
+
+    # matplotlib is imported after the simulation process has started
+    viewer = LiveViewer(settings, queue, fps)
+    viewer.show()
+
+    # window closed: let the run finish headless, draining what is in flight
+    detached.set()
+    while sim.is_alive():
+        viewer.poll()
+        sim.join(0.1)